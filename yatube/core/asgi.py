@@ -0,0 +1,213 @@
+"""
+Запуск Django 2.2 под ASGI-сервером (uvicorn, daphne, hypercorn).
+
+В Django 2.2 нет асинхронных view, поэтому приложение остаётся
+WSGI-приложением, а адаптер выполняет его в пуле потоков. Сервер
+держит соединения в цикле событий: медленные клиенты и keep-alive
+не занимают воркер, а медленный запрос занимает только поток пула.
+
+Вызов приложения, итерация ответа и его закрытие идут в одном потоке
+пула: request_finished закрывает соединение с базой того же потока,
+что выполнял view. Ответ не собирается в памяти: каждые BUFFER_SIZE
+байт передаются в цикл событий через очередь и уходят серверу
+отдельным сообщением, так что FileResponse и StreamingHttpResponse
+отдаются потоком. Очередь ограничена: поток ждёт медленного клиента.
+"""
+import asyncio
+import sys
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from io import BytesIO
+
+# Сколько байт ответа набирать в потоке пула перед отправкой: меньше
+# переключений между потоком и циклом событий на мелких кусках
+BUFFER_SIZE = 64 * 1024
+# Сколько кусков ответа может ждать отправки
+QUEUE_SIZE = 4
+
+
+class Stopped(Exception):
+    """Клиент ушёл: дочитывать ответ незачем."""
+
+
+class WsgiToAsgi:
+    def __init__(self, wsgi_application, max_workers=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='wsgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive):
+        """Тело запроса; None — клиент ушёл, не дослав его."""
+        body = BytesIO()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        environ = self.build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        stopped = threading.Event()
+
+        def put(message):
+            if stopped.is_set():
+                raise Stopped
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    queue.put(message), loop
+                ).result()
+            except (RuntimeError, CancelledError):
+                # Цикл событий остановлен вместе с запросом
+                raise Stopped
+
+        worker = loop.run_in_executor(
+            self.executor, self.run_wsgi, environ, put
+        )
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                await send(message)
+            await worker
+        finally:
+            if not worker.done():
+                stopped.set()
+                # Освобождает место для put, который ждёт в потоке
+                while not queue.empty():
+                    queue.get_nowait()
+                worker.add_done_callback(lambda future: future.exception())
+
+    @staticmethod
+    def build_environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': (
+                scope.get('root_path', '').encode().decode('latin1')
+            ),
+            'PATH_INFO': scope['path'].encode().decode('latin1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+            environ['REMOTE_PORT'] = str(scope['client'][1])
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin1').upper().replace('-', '_')
+            value = value.decode('latin1')
+            if name in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+                key = name
+            else:
+                key = f'HTTP_{name}'
+            if key in environ:
+                value = f'{environ[key]},{value}'
+            environ[key] = value
+        return environ
+
+    def run_wsgi(self, environ, put):
+        """
+        Выполняет WSGI-приложение в потоке пула и передаёт в put
+        сообщения ASGI; None — ответ отправлен целиком.
+        """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in headers
+            ]
+
+        try:
+            result = self.wsgi_application(environ, start_response)
+            try:
+                self.send_result(result, response, put)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except Stopped:
+            pass
+        finally:
+            try:
+                put(None)
+            except Stopped:
+                pass
+
+    def send_result(self, result, response, put):
+        """Заголовки и тело ответа кусками по ~BUFFER_SIZE байт."""
+        started = False
+        data = []
+        size = 0
+        # Генератор вызывает start_response при первой итерации
+        for chunk in result:
+            if not started:
+                put(self.start(response))
+                started = True
+            data.append(chunk)
+            size += len(chunk)
+            if size >= BUFFER_SIZE:
+                put(self.body(b''.join(data)))
+                data = []
+                size = 0
+        if not started:
+            put(self.start(response))
+        if data:
+            put(self.body(b''.join(data)))
+        put(self.body(b'', more_body=False))
+
+    @staticmethod
+    def start(response):
+        return {
+            'type': 'http.response.start',
+            'status': response['status'],
+            'headers': response['headers'],
+        }
+
+    @staticmethod
+    def body(data, more_body=True):
+        return {
+            'type': 'http.response.body',
+            'body': data,
+            'more_body': more_body,
+        }
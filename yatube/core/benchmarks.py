@@ -0,0 +1,198 @@
+"""
+Сценарии нагрузочного теста для команды bench_views: по одному
+на каждый URL из posts.urls и users.urls (для форм — отдельно GET
+и POST).
+
+Сценарий описывает адрес через имя URL и ключи образца — реальных
+объектов базы (автор, группа, пост, поисковое слово), поэтому список
+не зависит от данных. Результаты прогона можно сохранить в JSON
+и сравнить с прогоном на другом коммите.
+"""
+import math
+import time
+from collections import namedtuple
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.test import Client
+from django.urls import reverse
+
+from core import db
+from core.middleware import QueryCounter
+
+PASSWORD = 'bench-Password-1'
+
+Scenario = namedtuple(
+    'Scenario',
+    'name method kwargs query data login relogin',
+    defaults=({}, '', None, False, False),
+)
+
+
+def _post(sample, i):
+    return {'text': f'Пост нагрузочного теста {i}', 'group': sample['group']}
+
+
+def _comment(sample, i):
+    return {'text': f'Комментарий нагрузочного теста {i}'}
+
+
+def _signup(sample, i):
+    return {
+        'first_name': 'Нагрузка',
+        'last_name': 'Тестовая',
+        'username': f'bench-signup-{sample["run"]}-{i}',
+        'email': f'bench-{sample["run"]}-{i}@example.com',
+        'password1': PASSWORD,
+        'password2': PASSWORD,
+    }
+
+
+def _login(sample, i):
+    return {'username': sample['user'], 'password': PASSWORD}
+
+
+SCENARIOS = (
+    Scenario('posts:index', 'GET'),
+    Scenario('posts:group_posts', 'GET', {'slug': 'group_slug'}),
+    Scenario('posts:profile', 'GET', {'username': 'author'}),
+    Scenario('posts:post_detail', 'GET', {'post_id': 'post'}),
+    Scenario('posts:follow_index', 'GET', login=True),
+    Scenario('posts:search', 'GET', query='q={word}'),
+    Scenario('posts:api_search', 'GET', query='q={word}'),
+    Scenario('posts:api-root', 'GET'),
+    Scenario('posts:post-list', 'GET'),
+    Scenario('posts:post-detail', 'GET', {'pk': 'post'}),
+    Scenario('posts:post-comments', 'GET', {'pk': 'post'}),
+    Scenario('posts:post_create', 'GET', login=True),
+    Scenario('posts:post_create', 'POST', data=_post, login=True),
+    Scenario('posts:post_edit', 'GET', {'post_id': 'own_post'}, login=True),
+    Scenario(
+        'posts:post_edit', 'POST', {'post_id': 'own_post'}, data=_post,
+        login=True,
+    ),
+    Scenario(
+        'posts:add_comment', 'POST', {'post_id': 'post'}, data=_comment,
+        login=True,
+    ),
+    Scenario(
+        'posts:profile_follow', 'GET', {'username': 'author'}, login=True
+    ),
+    Scenario(
+        'posts:profile_unfollow', 'GET', {'username': 'author'}, login=True
+    ),
+    Scenario('users:signup', 'GET'),
+    Scenario('users:signup', 'POST', data=_signup),
+    Scenario('users:login', 'GET'),
+    Scenario('users:login', 'POST', data=_login),
+    Scenario('users:logout', 'GET', login=True, relogin=True),
+    Scenario('users:password_change', 'GET', login=True),
+    Scenario('users:password_change_done', 'GET', login=True),
+    Scenario('users:password_reset_form', 'GET'),
+    Scenario('users:password_reset_done', 'GET'),
+    Scenario('users:password_reset_confirm', 'GET'),
+    Scenario('users:password_reset_complete', 'GET'),
+)
+
+
+def label(scenario):
+    return f'{scenario.method} {scenario.name}'
+
+
+def url(scenario, sample):
+    path = reverse(scenario.name, kwargs={
+        key: sample[field] for key, field in scenario.kwargs.items()
+    })
+    if scenario.query:
+        path += '?' + scenario.query.format(**sample)
+    return path
+
+
+def percentile(values, q):
+    """Значение, не меньше которого доля q выборки (nearest rank)."""
+    values = sorted(values)
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+class CacheKeys:
+    """
+    Ключи кеша, к которым обращался прогон. Кеш общий с работающим
+    сайтом, поэтому вместо clear удаляются только они (delete).
+    Запросы клиента идут в том же потоке, а значит, через тот же
+    объект кеша.
+    """
+
+    def __init__(self):
+        self.cache = caches[DEFAULT_CACHE_ALIAS]
+        self.keys = set()
+        self._make_key = self.cache.make_key
+
+    def make_key(self, key, version=None):
+        self.keys.add((key, version))
+        return self._make_key(key, version=version)
+
+    def __enter__(self):
+        self.cache.make_key = self.make_key
+        return self
+
+    def __exit__(self, *exc_info):
+        del self.cache.make_key
+
+    def delete(self):
+        versions = {}
+        for key, version in self.keys:
+            versions.setdefault(version, []).append(key)
+        self.keys = set()
+        for version, keys in versions.items():
+            self.cache.delete_many(keys, version=version)
+
+
+def run(scenario, sample, user, requests, warmup=1, cold=None):
+    """
+    Выполняет сценарий `warmup + requests` раз одним клиентом
+    и возвращает сводку по последним `requests`. `cold` — CacheKeys
+    прогона: они удаляются перед каждым запросом.
+    """
+    client = Client()
+    path = url(scenario, sample)
+    method = getattr(client, scenario.method.lower())
+    latencies = []
+    queries = 0
+    errors = 0
+    for i in range(warmup + requests):
+        if scenario.login and (i == 0 or scenario.relogin):
+            client.force_login(user)
+        if cold is not None:
+            cold.delete()
+        data = scenario.data(sample, i) if scenario.data else None
+        counter = QueryCounter()
+        started = time.perf_counter()
+        try:
+            with db.execute_wrapper(counter):
+                response = method(path, data)
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        queries += counter.count
+        errors += failed
+    total = sum(latencies)
+    return {
+        'path': path,
+        'requests': requests,
+        'errors': errors,
+        'rps': requests / total if total else None,
+        'p50': percentile(latencies, 0.5) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'queries': queries / requests,
+    }
+
+
+def change(new, old):
+    """Изменение в процентах или None, если сравнивать не с чем."""
+    if new is None or not old:
+        return None
+    return (new - old) / old * 100
@@ -0,0 +1,349 @@
+"""
+Двухуровневый кеш: небольшой LRU в памяти процесса (L1) перед общим
+сервером с протоколом Redis (L2).
+
+L1 снимает сетевые запросы к часто читаемым ключам (например,
+счётчикам версий лент), L2 общий для всех воркеров. Запись или
+удаление ключа публикуется в канал, и остальные воркеры выбрасывают
+ключ из своего L1; если сообщение потерялось, копия в L1 всё равно
+живёт не дольше L1_TIMEOUT секунд.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.backends.TwoTierCache',
+            'LOCATION': 'localhost:6379',
+            'OPTIONS': {'DB': 0, 'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5},
+        }
+    }
+"""
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.cache.resp import RespConnection
+
+logger = logging.getLogger(__name__)
+
+CLEAR_ALL = b'*'
+
+# INCRBY, но только для существующего ключа: nil, если ключа нет
+INCR_EXISTING = (
+    "if redis.call('EXISTS', KEYS[1]) == 1 then "
+    "return redis.call('INCRBY', KEYS[1], ARGV[1]) end"
+)
+
+
+class LocalLRU:
+    """Потокобезопасный LRU с временем жизни записей."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает (найдено, значение)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        host, _, port = location.partition(':')
+        self._connection_kwargs = {
+            'host': host or 'localhost',
+            'port': int(port or 6379),
+            'db': options.get('DB', 0),
+            'password': options.get('PASSWORD'),
+        }
+        self._socket_timeout = options.get('SOCKET_TIMEOUT', 1)
+        self.channel = options.get('CHANNEL', 'yatube:cache-invalidation')
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.l1 = LocalLRU(options.get('L1_MAX_ENTRIES', 1000))
+        self.origin = uuid.uuid4().hex.encode()
+        self._local = threading.local()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._closed = threading.Event()
+
+    # Соединения
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = RespConnection(
+                socket_timeout=self._socket_timeout,
+                **self._connection_kwargs
+            )
+            self._local.connection = connection
+        self._ensure_listener()
+        return connection
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._closed.clear()
+            self._listener = threading.Thread(
+                target=self._listen,
+                name='cache-invalidation',
+                daemon=True,
+            )
+            self._listener.start()
+
+    def _listen(self):
+        """Получает сообщения об изменённых ключах от других воркеров."""
+        delay = 0.1
+        while not self._closed.is_set():
+            subscriber = RespConnection(**self._connection_kwargs)
+            self._subscriber = subscriber
+            try:
+                subscriber.subscribe(self.channel)
+                # Пока подписки не было, сообщения могли потеряться
+                self.l1.clear()
+                delay = 0.1
+                for message in subscriber.listen():
+                    self._invalidate(message)
+            except Exception:
+                if self._closed.is_set():
+                    break
+                logger.warning(
+                    'Подписка на инвалидацию кеша прервана', exc_info=True
+                )
+                self.l1.clear()
+                self._closed.wait(delay)
+                delay = min(delay * 2, 5)
+            finally:
+                subscriber.close()
+
+    def _invalidate(self, message):
+        origin, _, key = message.partition(b' ')
+        if origin == self.origin:
+            return
+        if key == CLEAR_ALL:
+            self.l1.clear()
+        else:
+            self.l1.delete(key.decode())
+
+    def _publish(self, keys):
+        return [
+            ('PUBLISH', self.channel, self.origin + b' ' + key.encode())
+            for key in keys
+        ]
+
+    def close(self, **kwargs):
+        # Django вызывает close после каждого запроса (request_finished);
+        # соединение потока переиспользуется, как у memcached-бэкендов
+        pass
+
+    def shutdown(self):
+        """Останавливает подписку (нужно тестам и при остановке воркера)."""
+        self._closed.set()
+        subscriber = getattr(self, '_subscriber', None)
+        if subscriber is not None and subscriber._sock is not None:
+            try:
+                subscriber._sock.shutdown(2)
+            except OSError:
+                pass
+        if self._listener is not None:
+            self._listener.join(timeout=1)
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+
+    # Сериализация
+
+    @staticmethod
+    def _encode(value):
+        # Целые числа храним строкой, чтобы работал INCRBY на сервере
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(data):
+        try:
+            return int(data)
+        except ValueError:
+            return pickle.loads(data)
+
+    def _ttl(self, timeout):
+        """Время жизни в миллисекундах; None — бессрочно."""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return int(timeout * 1000)
+
+    def _l1_ttl(self, ttl_ms):
+        if ttl_ms is None:
+            return self.l1_timeout
+        return min(self.l1_timeout, ttl_ms / 1000)
+
+    def _set_command(self, key, data, ttl_ms, only_new=False):
+        command = ['SET', key, data]
+        if ttl_ms is not None:
+            command += ['PX', ttl_ms]
+        if only_new:
+            command.append('NX')
+        return command
+
+    # API кеша Django
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        found, value = self.l1.get(key)
+        if found:
+            return value
+        data = self._connection().execute('GET', key)
+        if data is None:
+            return default
+        value = self._decode(data)
+        self.l1.set(key, value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = {}
+        missing = {}
+        for key in keys:
+            made = self.make_key(key, version=version)
+            self.validate_key(made)
+            found, value = self.l1.get(made)
+            if found:
+                result[key] = value
+            else:
+                missing[made] = key
+        if missing:
+            made_keys = list(missing)
+            values = self._connection().execute('MGET', *made_keys)
+            for made, data in zip(made_keys, values):
+                if data is None:
+                    continue
+                value = self._decode(data)
+                self.l1.set(made, value, self.l1_timeout)
+                result[missing[made]] = value
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        ttl_ms = self._ttl(timeout)
+        made = {}
+        for key, value in data.items():
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = value
+        if ttl_ms is not None and ttl_ms <= 0:
+            self.delete_many(data, version=version)
+            return []
+        commands = [
+            self._set_command(key, self._encode(value), ttl_ms)
+            for key, value in made.items()
+        ]
+        self._connection().pipeline(commands + self._publish(made))
+        for key, value in made.items():
+            self.l1.set(key, value, self._l1_ttl(ttl_ms))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        ttl_ms = self._ttl(timeout)
+        if ttl_ms is not None and ttl_ms <= 0:
+            return False
+        command = self._set_command(
+            key, self._encode(value), ttl_ms, only_new=True
+        )
+        added = self._connection().execute(*command) is not None
+        if added:
+            self.l1.set(key, value, self._l1_ttl(ttl_ms))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        ttl_ms = self._ttl(timeout)
+        if ttl_ms is None:
+            return bool(self._connection().execute('PERSIST', key)) or (
+                self._connection().execute('EXISTS', key) == 1
+            )
+        return self._connection().execute('PEXPIRE', key, ttl_ms) == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        if not made:
+            return
+        for key in made:
+            self.validate_key(key)
+            self.l1.delete(key)
+        self._connection().pipeline(
+            [['DEL', *made]] + self._publish(made)
+        )
+
+    def has_key(self, key, version=None):
+        made = self.make_key(key, version=version)
+        self.validate_key(made)
+        found, _ = self.l1.get(made)
+        return found or self._connection().execute('EXISTS', made) == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        # Проверка и увеличение — один скрипт: ключ не может истечь
+        # или удалиться между ними
+        value = self._connection().pipeline(
+            [['EVAL', INCR_EXISTING, 1, key, delta]] + self._publish([key])
+        )[0]
+        self.l1.delete(key)
+        if value is None:
+            raise ValueError("Key '%s' not found" % key)
+        return value
+
+    def clear(self):
+        self.l1.clear()
+        self._connection().pipeline([
+            ['FLUSHDB'],
+            ['PUBLISH', self.channel, self.origin + b' ' + CLEAR_ALL],
+        ])
@@ -0,0 +1,125 @@
+"""
+Минимальный клиент протокола RESP (Redis и совместимые серверы).
+Нужен только кеш-бэкенду core.cache.backends, поэтому поддерживает
+обычные команды, конвейер и подписку на канал.
+"""
+import socket
+
+
+class RespError(Exception):
+    """Сервер ответил ошибкой."""
+
+
+def encode_command(args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+class RespConnection:
+    def __init__(self, host='localhost', port=6379, db=0, password=None,
+                 socket_timeout=None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.socket_timeout = socket_timeout
+        self._sock = None
+        self._file = None
+
+    def connect(self):
+        if self._sock is not None:
+            return
+        self._sock = socket.create_connection(
+            (self.host, self.port), timeout=self.socket_timeout
+        )
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        try:
+            if self.password:
+                self._call('AUTH', self.password)
+            if self.db:
+                self._call('SELECT', self.db)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is None:
+            return
+        try:
+            self._file.close()
+            self._sock.close()
+        finally:
+            self._sock = None
+            self._file = None
+
+    def _call(self, *args):
+        self._sock.sendall(encode_command(args))
+        return self.read_reply()
+
+    def execute(self, *args):
+        """Выполняет команду; при сетевой ошибке соединение закрывается."""
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands):
+        """Отправляет команды одним пакетом и читает все ответы."""
+        self.connect()
+        try:
+            self._sock.sendall(b''.join(
+                encode_command(args) for args in commands
+            ))
+            replies = [self.read_reply() for _ in commands]
+        except (OSError, EOFError):
+            self.close()
+            raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def read_reply(self):
+        line = self._file.readline()
+        if not line.endswith(b'\r\n'):
+            raise EOFError('Соединение с сервером кеша закрыто')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            return RespError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._file.read(length + 2)
+            if len(data) != length + 2:
+                raise EOFError('Соединение с сервером кеша закрыто')
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise RespError(f'Неизвестный ответ сервера: {line!r}')
+
+    def subscribe(self, channel):
+        """Подписывается на канал; сообщения читает `listen`."""
+        self.connect()
+        self._sock.sendall(encode_command(('SUBSCRIBE', channel)))
+        reply = self.read_reply()
+        if isinstance(reply, RespError):
+            raise reply
+
+    def listen(self):
+        """Блокирующий генератор данных сообщений из подписки."""
+        while True:
+            reply = self.read_reply()
+            if isinstance(reply, list) and reply[0] == b'message':
+                yield reply[2]
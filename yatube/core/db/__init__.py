@@ -0,0 +1,12 @@
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """connection.execute_wrapper сразу для всех баз, включая реплики."""
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield
@@ -0,0 +1,30 @@
+"""
+Проверка постоянных соединений с базой перед запросом.
+
+Django 2.2 закрывает постоянное соединение только по возрасту
+(CONN_MAX_AGE) или после ошибки в нём, поэтому соединение, которое
+оборвала база или балансировщик, обнаруживается уже в запросе
+пользователя. Обработчик request_started раз в
+DB_HEALTH_CHECK_INTERVAL секунд проверяет соединение потока и закрывает
+мёртвое — view откроет новое.
+"""
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is None or conn.in_atomic_block:
+            continue
+        checked = getattr(conn, '_health_checked_at', None)
+        if (
+            checked is not None
+            and now - checked < settings.DB_HEALTH_CHECK_INTERVAL
+        ):
+            continue
+        conn._health_checked_at = now
+        if not conn.is_usable():
+            conn.close()
@@ -0,0 +1,223 @@
+"""
+Пул соединений с базой, общий для потоков процесса.
+
+В Django 2.2 у каждого потока своё соединение, и многопоточный сервер
+с N потоками держит N соединений, даже если запросов к базе мало.
+Бэкенды core.db.backends.* берут соединение из пула при первом
+запросе к базе и возвращают его, когда Django закрывает соединение
+в конце запроса. Пул ограничивает число соединений процесса
+(DB_POOL_SIZE); поток, которому не хватило соединения, ждёт не дольше
+DB_POOL_TIMEOUT секунд. Соединение, пролежавшее без дела дольше
+DB_HEALTH_CHECK_INTERVAL, перед выдачей проверяется запросом SELECT 1.
+
+Время ожидания попадает в метрики запроса (core.metrics), состояние
+пулов — на страницу /metrics/.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from core import metrics
+
+
+def ping(connection):
+    """Отвечает ли соединение DB-API."""
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class Pool:
+    def __init__(self, alias, max_size, timeout, check_interval):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.idle = []
+        self.in_use = 0
+        self.condition = threading.Condition()
+        self.stats = dict.fromkeys(
+            ('created', 'discarded', 'waits', 'timeouts', 'max_in_use'), 0
+        )
+        self.stats['wait_seconds'] = 0.0
+
+    def acquire(self, connect):
+        """
+        Свободное соединение или новое, созданное `connect`, если пул
+        ещё не заполнен. Если заполнен — ждёт освобождения.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        connection = last_used = None
+        blocked = False
+        with self.condition:
+            while not self.idle and self.in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Нет свободного соединения с базой {self.alias} '
+                        f'за {self.timeout} с (DB_POOL_SIZE={self.max_size})'
+                    )
+                blocked = True
+                self.condition.wait(remaining)
+            if self.idle:
+                connection, last_used = self.idle.pop()
+            self.in_use += 1
+            self.stats['max_in_use'] = max(
+                self.stats['max_in_use'], self.in_use
+            )
+            waited = time.monotonic() - started
+            self.stats['waits'] += blocked
+            self.stats['wait_seconds'] += waited
+        metrics.record('db_pool_wait_seconds', waited)
+        try:
+            if connection is not None and (
+                time.monotonic() - last_used >= self.check_interval
+                and not ping(connection)
+            ):
+                self._discard(connection)
+                connection = None
+            if connection is None:
+                connection = connect()
+                with self.condition:
+                    self.stats['created'] += 1
+        except BaseException:
+            self._return(None)
+            raise
+        return connection
+
+    def release(self, connection, reuse=True):
+        """Возвращает соединение; незавершённая транзакция откатывается."""
+        if reuse:
+            try:
+                connection.rollback()
+            except Exception:
+                reuse = False
+        if not reuse:
+            self._discard(connection)
+            connection = None
+        self._return(connection)
+
+    def _discard(self, connection):
+        _close_quietly(connection)
+        with self.condition:
+            self.stats['discarded'] += 1
+
+    def _return(self, connection):
+        with self.condition:
+            self.in_use -= 1
+            if connection is not None:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def close_idle(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            _close_quietly(connection)
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                **self.stats,
+                'size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = Pool(
+                alias,
+                max_size=settings.DB_POOL_SIZE,
+                timeout=settings.DB_POOL_TIMEOUT,
+                check_interval=settings.DB_HEALTH_CHECK_INTERVAL,
+            )
+        return _pools[alias]
+
+
+class PooledDatabaseWrapper:
+    """Примесь к DatabaseWrapper бэкенда: соединения берутся из пула."""
+
+    @property
+    def pool(self):
+        return get_pool(self.alias)
+
+    def get_new_connection(self, conn_params):
+        parent = super()
+        try:
+            return self.pool.acquire(
+                lambda: parent.get_new_connection(conn_params)
+            )
+        except PoolTimeout as error:
+            # wrap_database_errors превратит её в django.db.OperationalError
+            raise self.Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        if self.connection is not None:
+            usable = not self.errors_occurred or ping(self.connection)
+            self.pool.release(self.connection, reuse=usable)
+
+
+# Описание: (имя метрики, тип, ключ снимка пула)
+GAUGES = (
+    ('yatube_db_pool_size', 'gauge', 'size'),
+    ('yatube_db_pool_in_use', 'gauge', 'in_use'),
+    ('yatube_db_pool_idle', 'gauge', 'idle'),
+    ('yatube_db_pool_max_in_use', 'gauge', 'max_in_use'),
+    ('yatube_db_pool_created_total', 'counter', 'created'),
+    ('yatube_db_pool_discarded_total', 'counter', 'discarded'),
+    ('yatube_db_pool_waits_total', 'counter', 'waits'),
+    ('yatube_db_pool_timeouts_total', 'counter', 'timeouts'),
+    ('yatube_db_pool_wait_seconds_total', 'counter', 'wait_seconds'),
+)
+
+
+def render_metrics():
+    """Состояние пулов в текстовом формате Prometheus."""
+    with _pools_lock:
+        snapshots = {
+            alias: pool.snapshot() for alias, pool in sorted(_pools.items())
+        }
+    if not snapshots:
+        return []
+    lines = []
+    for name, kind, key in GAUGES:
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, snapshot in snapshots.items():
+            lines.append(f'{name}{{alias="{alias}"}} {snapshot[key]}')
+    lines.append('# TYPE yatube_db_pool_saturation gauge')
+    for alias, snapshot in snapshots.items():
+        saturation = snapshot['in_use'] / snapshot['size']
+        lines.append(
+            f'yatube_db_pool_saturation{{alias="{alias}"}} {saturation}'
+        )
+    return lines
+
+
+metrics.registry.collectors.append(render_metrics)
@@ -0,0 +1,153 @@
+"""
+Чтение лент с реплик базы.
+
+ReplicaMiddleware разрешает чтение с реплики GET- и HEAD-запросам
+к view из DB_REPLICA_VIEWS (ленты, пост, API списка и поста);
+ReplicaRouter направляет на реплику все чтения такого запроса,
+а запись и остальные запросы — на основную базу.
+
+Чтобы пользователь сразу видел свои изменения (read-your-writes),
+запрос, записавший что-то в базу, ставит cookie DB_REPLICA_PIN_COOKIE
+на DB_REPLICA_PIN_SECONDS секунд, и пока она есть, все чтения этого
+браузера идут в основную базу. Реплика, отставшая больше чем
+на DB_REPLICA_MAX_LAG секунд или недоступная, не используется;
+отставание проверяется раз в DB_REPLICA_LAG_CHECK_INTERVAL секунд.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Отставание реплики в секундах по вендору базы. В PostgreSQL время
+# последней применённой транзакции растёт и без отставания, если
+# основная база ничего не пишет, поэтому догнавшая реплика — это 0
+LAG_QUERIES = {
+    'postgresql': (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = '
+        'pg_last_wal_replay_lsn() THEN 0 ELSE EXTRACT(EPOCH FROM '
+        'now() - pg_last_xact_replay_timestamp()) END'
+    ),
+}
+
+# Состояние текущего запроса: {'replica': алиас или None, 'wrote': bool}
+_state = ContextVar('replica_state', default=None)
+
+_lag = {}
+_lag_lock = threading.Lock()
+
+
+def measure_lag(alias):
+    """
+    Отставание реплики в секундах или None, если реплика недоступна.
+    Для баз без запроса в LAG_QUERIES (SQLite) отставание — 0.
+    """
+    conn = connections[alias]
+    sql = LAG_QUERIES.get(conn.vendor)
+    if sql is None:
+        return 0
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            return float(cursor.fetchone()[0] or 0)
+    except DatabaseError:
+        return None
+
+
+def replica_lag(alias):
+    """Отставание реплики, не чаще раза в DB_REPLICA_LAG_CHECK_INTERVAL."""
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag.get(alias)
+    if checked is not None and (
+        now - checked[0] < settings.DB_REPLICA_LAG_CHECK_INTERVAL
+    ):
+        return checked[1]
+    lag = measure_lag(alias)
+    with _lag_lock:
+        _lag[alias] = (now, lag)
+    return lag
+
+
+def reset_lag():
+    with _lag_lock:
+        _lag.clear()
+
+
+def choose_replica():
+    """Случайная реплика из успевающих за основной базой или None."""
+    healthy = []
+    for alias in settings.DB_REPLICAS:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.DB_REPLICA_MAX_LAG:
+            healthy.append(alias)
+    return random.choice(healthy) if healthy else None
+
+
+@contextmanager
+def request_state():
+    """Состояние маршрутизации на время запроса."""
+    state = {'replica': None, 'wrote': False}
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def current_replica():
+    """Реплика, с которой читает текущий запрос, или None."""
+    state = _state.get()
+    return state['replica'] if state is not None else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Явно основная база: иначе Django читал бы связанные объекты
+        # с базы, из которой загружен экземпляр
+        return current_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DB_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Включает чтение с реплики для запросов к DB_REPLICA_VIEWS
+    и закрепляет за основной базой браузер, который что-то записал.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_state() as state:
+            response = self.get_response(request)
+        if state['wrote']:
+            response.set_cookie(
+                settings.DB_REPLICA_PIN_COOKIE, '1',
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            settings.DB_REPLICAS
+            and request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in settings.DB_REPLICA_VIEWS
+            and settings.DB_REPLICA_PIN_COOKIE not in request.COOKIES
+        ):
+            _state.get()['replica'] = choose_replica()
@@ -0,0 +1,9 @@
+def query_budget(max_queries):
+    """
+    Объявляет, сколько запросов к базе может сделать view.
+    Проверяется в core.middleware.QueryBudgetMiddleware.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
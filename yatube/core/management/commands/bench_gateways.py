@@ -0,0 +1,109 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import WsgiToAsgi
+
+
+def scope_for(url):
+    path, _, query = url.partition('?')
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность WSGI и ASGI при одинаковой '
+        'конкурентности (запросы выполняются в процессе, без сети)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        url = options['url']
+        concurrency = options['concurrency']
+        total = options['requests']
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'localhost']
+        wsgi = get_wsgi_application()
+        asgi = WsgiToAsgi(wsgi, max_workers=settings.ASGI_THREADS)
+        # Прогрев и проверка, что страница вообще отдаётся
+        response = {}
+        result = wsgi(
+            WsgiToAsgi.build_environ(scope_for(url), BytesIO()),
+            lambda status, headers, exc_info=None: response.update(
+                status=int(status.split(' ', 1)[0])
+            ),
+        )
+        b''.join(result)
+        result.close()
+        status = response['status']
+        if status != 200:
+            raise CommandError(f'{url} отвечает статусом {status}')
+        runs = (('WSGI', wsgi, self.run_wsgi), ('ASGI', asgi, self.run_asgi))
+        for name, app, run in runs:
+            started = time.perf_counter()
+            latencies = run(app, scope_for(url), concurrency, total)
+            elapsed = time.perf_counter() - started
+            self.report(name, latencies, elapsed)
+
+    def run_wsgi(self, app, scope, concurrency, total):
+        """Как многопоточный WSGI-сервер с `concurrency` потоками."""
+        def request(_):
+            environ = WsgiToAsgi.build_environ(scope, BytesIO())
+            started = time.perf_counter()
+            result = app(environ, lambda status, headers, exc_info=None: None)
+            b''.join(result)
+            result.close()
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(request, range(total)))
+
+    def run_asgi(self, app, scope, concurrency, total):
+        """`concurrency` клиентов в одном цикле событий."""
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            pass
+
+        async def client(remaining, latencies):
+            while remaining:
+                remaining.pop()
+                started = time.perf_counter()
+                await app(scope, receive, send)
+                latencies.append(time.perf_counter() - started)
+
+        async def main():
+            remaining = list(range(total))
+            latencies = []
+            await asyncio.gather(*(
+                client(remaining, latencies) for _ in range(concurrency)
+            ))
+            return latencies
+
+        return asyncio.run(main())
+
+    def report(self, name, latencies, elapsed):
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f'{name}: {len(latencies) / elapsed:.1f} запросов/с, '
+            f'p50 {statistics.median(latencies) * 1000:.1f} мс, '
+            f'p95 {p95 * 1000:.1f} мс'
+        )
@@ -0,0 +1,92 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.utils.http import http_date
+from django.views.static import serve as static_serve
+
+from core import media
+
+KIB = 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает отдачу медиафайлов core.media и django.views.static '
+        '(запросы выполняются в процессе, без сети)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--size', type=int, default=4096,
+            help='Размер большого файла, КиБ',
+        )
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        with tempfile.TemporaryDirectory() as root:
+            files = {
+                'small.jpg': 16 * KIB,
+                'large.mp4': options['size'] * KIB,
+            }
+            for name, size in files.items():
+                with open(os.path.join(root, name), 'wb') as stream:
+                    stream.write(os.urandom(size))
+            modified = http_date(
+                os.stat(os.path.join(root, 'large.mp4')).st_mtime
+            )
+            cases = (
+                ('маленький файл', 'small.jpg', {}),
+                ('большой файл', 'large.mp4', {}),
+                ('первые 64 КиБ большого', 'large.mp4',
+                 {'HTTP_RANGE': f'bytes=0-{64 * KIB - 1}'}),
+                ('не изменился', 'large.mp4',
+                 {'HTTP_IF_MODIFIED_SINCE': modified}),
+            )
+            # (название, view, MEDIA_SERVE)
+            views = (
+                ('static', lambda request, path: static_serve(
+                    request, path, document_root=root
+                ), ''),
+                ('core.media', media.serve, ''),
+                ('core.media, x-accel', media.serve, 'x-accel'),
+            )
+            for label, path, headers in cases:
+                self.stdout.write(f'{label}:')
+                for name, view, mode in views:
+                    with override_settings(MEDIA_ROOT=root, MEDIA_SERVE=mode):
+                        self.report(name, *self.run(
+                            view, path, headers, total
+                        ))
+
+    def run(self, view, path, headers, total):
+        factory = RequestFactory()
+        latencies = []
+        sent = 0
+        status = None
+        for _ in range(total):
+            request = factory.get(f'/media/{path}', **headers)
+            started = time.perf_counter()
+            response = view(request, path)
+            # Тело читается целиком, как его читал бы сервер
+            body = b''.join(response) if response.streaming else (
+                response.content
+            )
+            response.close()
+            latencies.append(time.perf_counter() - started)
+            sent += len(body)
+            status = response.status_code
+        return status, latencies, sent / total
+
+    def report(self, name, status, latencies, sent):
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f'  {name}: {status}, {len(latencies) / sum(latencies):.1f} '
+            f'запросов/с, p50 {statistics.median(latencies) * 1000:.2f} мс, '
+            f'p95 {p95 * 1000:.2f} мс, {sent / KIB:.0f} КиБ на ответ'
+        )
@@ -0,0 +1,156 @@
+import json
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import benchmarks
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет сценарии по всем адресам posts и users и выводит '
+        'запросы/с, p50/p95/p99 и число запросов к базе. Данные для '
+        'прогона создаёт generate_data; всё, что пишут сценарии, '
+        'откатывается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Запросов на сценарий после прогрева',
+        )
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Удалять ключи кеша прогона перед каждым запросом',
+        )
+        parser.add_argument(
+            '--only', action='append',
+            help='Только сценарии с этим именем URL, например posts:index',
+        )
+        parser.add_argument('--save', help='Сохранить результаты в JSON')
+        parser.add_argument(
+            '--baseline',
+            help='JSON прогона на другом коммите для сравнения',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as stream:
+                baseline = json.load(stream)
+        scenarios = [
+            scenario for scenario in benchmarks.SCENARIOS
+            if not options['only'] or scenario.name in options['only']
+        ]
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        report = {
+            'commit': self.commit(),
+            'database': connection.vendor,
+            'data': {
+                model.__name__: model.objects.count()
+                for model in (User, Group, Post, Comment, Follow)
+            },
+            'scenarios': {},
+        }
+        # Сценарии записи откатываются вместе с транзакцией; колбэки
+        # on_commit (например, миниатюры) при этом не выполняются
+        keys = benchmarks.CacheKeys()
+        try:
+            with keys, transaction.atomic():
+                sample, user = self.sample()
+                for scenario in scenarios:
+                    result = benchmarks.run(
+                        scenario, sample, user, options['requests'],
+                        warmup=options['warmup'],
+                        cold=keys if options['cold'] else None,
+                    )
+                    report['scenarios'][benchmarks.label(scenario)] = result
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            # Страницы в кеше могли увидеть откаченные записи; кеш общий
+            # с сайтом, поэтому удаляются только ключи прогона
+            keys.delete()
+        self.report(report, baseline)
+        if options['save']:
+            with open(options['save'], 'w') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2)
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, cwd=settings.BASE_DIR,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def sample(self):
+        """Объекты базы для адресов сценариев и пользователь прогона."""
+        post = Post.objects.exclude(group=None).select_related(
+            'author', 'group'
+        ).order_by('-pub_date', '-pk').first()
+        if post is None:
+            raise CommandError(
+                'Нет постов с группой, сначала выполните generate_data'
+            )
+        user = User.objects.create_user(
+            username='bench-runner', password=benchmarks.PASSWORD
+        )
+        Follow.objects.create(user=user, author=post.author)
+        own_post = Post.objects.create(author=user, text='Пост для правки')
+        sample = {
+            'run': int(time.time()),
+            'user': user.username,
+            'author': post.author.username,
+            'group': post.group_id,
+            'group_slug': post.group.slug,
+            'post': post.pk,
+            'own_post': own_post.pk,
+            'word': post.text.split()[0],
+        }
+        return sample, user
+
+    def report(self, report, baseline):
+        self.stdout.write(
+            f'Коммит {report["commit"] or "?"}, база {report["database"]}, '
+            + ', '.join(f'{k}: {v}' for k, v in report['data'].items())
+        )
+        old = baseline['scenarios'] if baseline else {}
+        if baseline:
+            self.stdout.write(
+                f'Сравнение с коммитом {baseline.get("commit") or "?"}'
+            )
+        self.stdout.write(
+            f'{"сценарий":<42}{"запр/с":>9}{"p50 мс":>9}{"p95 мс":>9}'
+            f'{"p99 мс":>9}{"SQL":>7}{"ошибки":>8}'
+        )
+        for name, result in report['scenarios'].items():
+            rps = result['rps']
+            line = (
+                f'{name:<42}{rps or 0:>9.1f}{result["p50"]:>9.1f}'
+                f'{result["p95"]:>9.1f}{result["p99"]:>9.1f}'
+                f'{result["queries"]:>7.1f}{result["errors"]:>8}'
+            )
+            if name in old:
+                p95 = benchmarks.change(result['p95'], old[name]['p95'])
+                queries = result['queries'] - old[name]['queries']
+                line += f'   p95 {p95:+.0f}%' if p95 is not None else ''
+                line += f', SQL {queries:+.1f}' if queries else ''
+            self.stdout.write(line)
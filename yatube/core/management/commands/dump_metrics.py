@@ -0,0 +1,65 @@
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import metrics
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит p50/p95/p99 метрик по view из страницы /metrics/ '
+        'запущенного сервера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source', nargs='?', default='http://127.0.0.1:8000/metrics/',
+            help='Адрес страницы метрик или file:// с её сохранённым текстом',
+        )
+        parser.add_argument(
+            '--view', help='Показать только view с этим именем',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with urlopen(options['source']) as response:
+                text = response.read().decode()
+        except (URLError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать метрики: {error}')
+        histograms = metrics.parse(text)
+        views = sorted({view for _, view in histograms})
+        if options['view']:
+            views = [view for view in views if view == options['view']]
+        if not views:
+            self.stdout.write('Метрик пока нет')
+            return
+        header = ['метрика', *(f'p{round(q * 100)}' for q in QUANTILES), 'n']
+        for view in views:
+            self.stdout.write(self.style.MIGRATE_HEADING(view))
+            self.stdout.write(self.row(header))
+            for name in metrics.METRICS:
+                cumulative = histograms.get((name, view))
+                if not cumulative:
+                    continue
+                values = [
+                    self.format(name, metrics.quantile(q, cumulative))
+                    for q in QUANTILES
+                ]
+                count = int(cumulative[-1][1])
+                self.stdout.write(self.row([name, *values, count]))
+
+    @staticmethod
+    def format(name, value):
+        if value is None:
+            return '-'
+        if name.endswith('seconds'):
+            return f'{value * 1000:.1f} мс'
+        return f'{value:.1f}'
+
+    @staticmethod
+    def row(cells):
+        first, *rest = cells
+        return f'  {first:<18}' + ''.join(f'{cell:>11}' for cell in rest)
@@ -0,0 +1,161 @@
+"""
+Отдача медиафайлов из MEDIA_ROOT.
+
+Если перед приложением стоит nginx (MEDIA_SERVE = 'x-accel') или
+Apache и lighttpd (MEDIA_SERVE = 'x-sendfile'), view только проверяет
+путь и условные заголовки, а сам файл по X-Accel-Redirect или
+X-Sendfile отдаёт веб-сервер. Иначе файл читается блоками прямо
+из view, с ETag и Last-Modified (ответ 304 без чтения файла)
+и запросами части файла по Range (ответ 206: перемотка, докачка).
+
+ETag файла, названного по содержимому (core.storage), — его хеш,
+остальных — время изменения и размер, как у nginx.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import (
+    ImproperlyConfigured, SuspiciousFileOperation,
+)
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from core.storage import IMMUTABLE_CACHE_CONTROL, is_immutable
+
+# Один диапазон: bytes=0-99, bytes=100- или bytes=-100 (последние 100).
+# Несколько диапазонов сразу не поддерживаются: отдаётся весь файл,
+# это разрешено RFC 7233
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+def byte_range(header, size):
+    """
+    (первый, последний байт) из заголовка Range; None — заголовок
+    не разобран и отдаётся весь файл, False — диапазон вне файла.
+    """
+    match = RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        if not int(last):
+            return False
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    if first >= size:
+        return False
+    last = min(int(last), size - 1) if last else size - 1
+    if last < first:
+        return None
+    return first, last
+
+
+def read(file_, length):
+    """`length` байт файла блоками; файл закрывается в конце."""
+    try:
+        while length > 0:
+            chunk = file_.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file_.close()
+
+
+def handoff(path, full_path, content_type):
+    """Пустой ответ, тело которого отдаст веб-сервер."""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SERVE == 'x-accel':
+        response['X-Accel-Redirect'] = quote(
+            posixpath.join(settings.MEDIA_ACCEL_PREFIX, path)
+        )
+    elif settings.MEDIA_SERVE == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        raise ImproperlyConfigured(
+            f'MEDIA_SERVE: неизвестный способ {settings.MEDIA_SERVE!r}'
+        )
+    return response
+
+
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_ = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(stat_.st_mode):
+        raise Http404('Файл не найден')
+    size = stat_.st_size
+    modified = int(stat_.st_mtime)
+    immutable = is_immutable(path)
+    if immutable:
+        digest = posixpath.splitext(posixpath.basename(path))[0]
+        etag = f'"{digest}"'
+    else:
+        etag = f'"{modified:x}-{size:x}"'
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified
+    )
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if settings.MEDIA_SERVE:
+            response = handoff(path, full_path, content_type)
+        else:
+            response = stream(
+                request, full_path, content_type, size, etag, modified
+            )
+        if encoding and response.status_code != 416:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    if immutable:
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def stream(request, full_path, content_type, size, etag, modified):
+    response_range = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # If-Range: часть — только если у клиента та же версия файла
+    if header and (not if_range or if_range in (etag, http_date(modified))):
+        response_range = byte_range(header, size)
+    if response_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+    elif response_range is None:
+        # FileResponse отдаёт файл через wsgi.file_wrapper (sendfile)
+        response = FileResponse(
+            open(full_path, 'rb'), content_type=content_type
+        )
+    else:
+        first, last = response_range
+        file_ = open(full_path, 'rb')
+        file_.seek(first)
+        response = StreamingHttpResponse(
+            read(file_, last - first + 1), status=206,
+            content_type=content_type,
+        )
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,263 @@
+"""
+Метрики запросов по view: время ответа, число и время запросов
+к базе, попадания и промахи кеша, время отрисовки шаблонов и поиска
+вариантов картинок.
+
+MetricsMiddleware открывает для запроса набор счётчиков, а код
+приложения дописывает в него через record и timer. По окончании
+запроса значения попадают в гистограммы процесса (registry) с меткой
+view, например posts:index. Страница /metrics/ отдаёт гистограммы
+в текстовом формате Prometheus, команда dump_metrics считает по ним
+p50/p95/p99.
+"""
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.backends import django as django_backend
+
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+# Имя метрики: (границы корзин, описание)
+METRICS = {
+    'seconds': (TIME_BUCKETS, 'Время ответа view'),
+    'db_queries': (COUNT_BUCKETS, 'Число запросов к базе'),
+    'db_seconds': (TIME_BUCKETS, 'Время запросов к базе'),
+    'cache_hits': (COUNT_BUCKETS, 'Попадания в кеш'),
+    'cache_misses': (COUNT_BUCKETS, 'Промахи кеша'),
+    'template_seconds': (TIME_BUCKETS, 'Время отрисовки шаблонов'),
+    'thumbnail_seconds': (TIME_BUCKETS, 'Время поиска вариантов картинок'),
+    'db_pool_wait_seconds': (
+        TIME_BUCKETS, 'Ожидание соединения из пула базы',
+    ),
+}
+PREFIX = 'yatube_view_'
+
+_current = ContextVar('metrics', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Пары (граница, число значений не больше неё), с +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def quantile(q, cumulative):
+    """
+    Квантиль по накопленным корзинам с линейной интерполяцией внутри
+    корзины, как histogram_quantile в Prometheus.
+    """
+    if not cumulative or cumulative[-1][1] == 0:
+        return None
+    rank = q * cumulative[-1][1]
+    lower, below = 0, 0
+    for bound, total in cumulative:
+        if total >= rank:
+            if math.isinf(bound):
+                # Выше последней конечной границы оценки нет
+                return lower
+            if total == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (total - below)
+        lower, below = bound, total
+    return lower
+
+
+class Registry:
+    """
+    Гистограммы процесса: {(метрика, view): Histogram}. В collectors
+    модули добавляют функции, которые возвращают свои строки для
+    render, например состояние пула соединений.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def observe(self, view, values):
+        with self.lock:
+            for name, value in values.items():
+                key = (name, view)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(METRICS[name][0])
+                self.histograms[key].observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render(self):
+        """Гистограммы в текстовом формате Prometheus."""
+        with self.lock:
+            snapshot = {
+                key: (histogram.cumulative(), histogram.sum, histogram.count)
+                for key, histogram in self.histograms.items()
+            }
+        lines = []
+        for name, (_, description) in METRICS.items():
+            metric = PREFIX + name
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} histogram')
+            for (key, view), (cumulative, total, count) in sorted(
+                snapshot.items()
+            ):
+                if key != name:
+                    continue
+                label = view.replace('\\', r'\\').replace('"', r'\"')
+                for bound, below in cumulative:
+                    le = '+Inf' if math.isinf(bound) else repr(float(bound))
+                    lines.append(
+                        f'{metric}_bucket{{view="{label}",le="{le}"}} {below}'
+                    )
+                lines.append(f'{metric}_sum{{view="{label}"}} {total!r}')
+                lines.append(f'{metric}_count{{view="{label}"}} {count}')
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+SAMPLE = re.compile(
+    r'^' + PREFIX + r'(?P<name>\w+)_bucket'
+    r'\{view="(?P<view>(?:[^"\\]|\\.)*)",le="(?P<le>[^"]+)"\} (?P<value>\S+)$'
+)
+
+
+def parse(text):
+    """
+    Накопленные корзины из текста render: {(метрика, view): [(граница,
+    число)]}.
+    """
+    result = {}
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if match is None:
+            continue
+        view = re.sub(r'\\(.)', r'\1', match['view'])
+        bound = math.inf if match['le'] == '+Inf' else float(match['le'])
+        result.setdefault((match['name'], view), []).append(
+            (bound, float(match['value']))
+        )
+    return result
+
+
+def record(name, value):
+    """Добавляет значение к метрике текущего запроса, если он измеряется."""
+    values = _current.get()
+    if values is not None:
+        values[name] = values.get(name, 0) + value
+
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect():
+    """Счётчики текущего запроса: словарь, который заполняет record."""
+    values = dict.fromkeys(METRICS, 0)
+    token = _current.set(values)
+    try:
+        yield values
+    finally:
+        _current.reset(token)
+
+
+class QueryTimer:
+    """execute_wrapper: число и время запросов к базе."""
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            record('db_queries', 1)
+            record('db_seconds', time.perf_counter() - start)
+
+
+_MISSING = object()
+
+
+def instrument_cache(cache):
+    """
+    Считает попадания и промахи get/get_many экземпляра кеша.
+    Экземпляры кешей свои у каждого потока, поэтому обёртка ставится
+    на каждый один раз.
+    """
+    if getattr(cache, '_metrics_instrumented', False):
+        return
+    get, get_many = cache.get, cache.get_many
+
+    def instrumented_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        if value is _MISSING:
+            record('cache_misses', 1)
+            return default
+        record('cache_hits', 1)
+        return value
+
+    def instrumented_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        record('cache_hits', len(found))
+        record('cache_misses', len(keys) - len(found))
+        return found
+
+    cache.get = instrumented_get
+    cache.get_many = instrumented_get_many
+    cache._metrics_instrumented = True
+
+
+class Template(django_backend.Template):
+    """Шаблон, который замеряет время своей отрисовки."""
+
+    def render(self, context=None, request=None):
+        with timer('template_seconds'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    Бэкенд шаблонов Django с замером времени. Вложенные {% include %}
+    идут мимо бэкенда, поэтому время не считается дважды.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
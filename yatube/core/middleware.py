@@ -0,0 +1,94 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core import db, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    # Управление транзакцией не считаем: точки сохранения появляются
+    # только при вложенных atomic, например внутри TestCase
+    IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(self.IGNORED):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_query_budget(view_func):
+    """Бюджет запросов view-функции или класса DRF."""
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает запросы к базе за время обработки запроса и сравнивает
+    с бюджетом, объявленным через core.decorators.query_budget.
+    При QUERY_BUDGET_STRICT превышение бюджета — ошибка, иначе
+    только предупреждение в лог.
+    """
+    # Наибольшее число запросов по имени view, например 'posts:index'
+    stats = {}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with db.execute_wrapper(counter):
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            return response
+        view_name = match.view_name
+        self.stats[view_name] = max(
+            self.stats.get(view_name, 0), counter.count
+        )
+        budget = get_query_budget(match.func)
+        if budget is not None and counter.count > budget:
+            message = (
+                f'{view_name}: {counter.count} запросов к базе '
+                f'при бюджете {budget}'
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запроса (core.metrics) и записывает их
+    в гистограммы по имени view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for alias in settings.CACHES:
+            metrics.instrument_cache(caches[alias])
+        start = time.perf_counter()
+        with metrics.collect() as values, \
+                db.execute_wrapper(metrics.QueryTimer()):
+            response = self.get_response(request)
+        values['seconds'] = time.perf_counter() - start
+        match = request.resolver_match
+        if match is not None:
+            metrics.registry.observe(match.view_name, values)
+        return response
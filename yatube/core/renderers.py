@@ -0,0 +1,43 @@
+"""
+JSON-рендерер DRF на orjson.
+
+Вывод совпадает с rest_framework.renderers.JSONRenderer байт в байт:
+компактные разделители, UTF-8 без экранирования, \\u2028 и \\u2029
+экранированы. Даты, Decimal и ленивые строки кодирует encoder_class
+DRF. Отличается только запись float с большим порядком (1e16
+вместо 1e+16) и NaN (null вместо ошибки). Без orjson, с отступами
+и для того, что orjson не кодирует, работает обычный JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    if orjson is not None:
+        options = (
+            orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+            | orjson.OPT_NON_STR_KEYS
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (
+            orjson is None or data is None or indent is not None
+            or not self.compact or self.ensure_ascii or not self.strict
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=self.options,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
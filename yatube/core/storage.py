@@ -0,0 +1,78 @@
+"""
+Хранилище файлов по содержимому.
+
+Имя файла — SHA-256 содержимого, разложенный по подкаталогам из первых
+символов хеша, чтобы в одном каталоге не копились сотни тысяч файлов:
+posts/photo.jpg сохраняется как posts/3a/7b/3a7b…e1.jpg. Одинаковые
+загрузки получают одно имя и хранятся один раз, а файл по имени никогда
+не меняется, поэтому его адрес можно отдавать с заголовками вечного
+кеширования (immutable).
+
+Несколько записей в базе могут ссылаться на один файл, поэтому
+удалять его можно, только когда ссылок не осталось; для картинок
+постов это делает posts.thumbnails.release. Повторная загрузка того
+же файла обновляет его время изменения: так release видит загрузку,
+которая ещё не закоммичена.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Заголовок для файлов, названных по содержимому: год без перепроверки
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+HASHED_NAME = re.compile(
+    r'(?:^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/'
+    r'(?P=a)(?P=b)[0-9a-f]{60}(?:\.\w+)?$'
+)
+
+
+def is_immutable(name):
+    """Имя выдано ContentAddressedStorage и не меняет содержимого."""
+    return HASHED_NAME.search(name) is not None
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, digest):
+        """Каталог из `name`, имя — хеш, расширение — как у `name`."""
+        directory, basename = posixpath.split(name)
+        extension = posixpath.splitext(basename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content))
+        if self.exists(name):
+            # Файл используют снова: свежее время изменения не даёт
+            # posts.thumbnails.release удалить его, пока загрузка
+            # не закоммичена
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Файл как раз удаляют: пишем заново
+                pass
+        # При одновременной загрузке одного файла второй поток получит
+        # от FileSystemStorage имя с суффиксом: лишняя копия, но не ошибка
+        return self._save(name, content)
+
+
+content_storage = ContentAddressedStorage()
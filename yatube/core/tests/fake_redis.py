@@ -0,0 +1,188 @@
+"""
+Небольшой сервер с протоколом RESP для тестов кеша: хранит данные
+в памяти и поддерживает только команды, которые использует
+core.cache.backends.
+"""
+import socketserver
+import threading
+import time
+
+from core.cache.backends import INCR_EXISTING
+from core.cache.resp import encode_command
+
+
+def bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def integer(value):
+    return b':%d\r\n' % value
+
+
+OK = b'+OK\r\n'
+
+
+class Handler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        server = self.server
+        while True:
+            args = self.read_command()
+            if args is None:
+                break
+            name = args[0].upper().decode()
+            server.commands.append(name)
+            if name == 'SUBSCRIBE':
+                with server.lock:
+                    server.subscribers.append(self)
+                self.send(encode_command((b'subscribe', args[1], 1)))
+                continue
+            with server.lock:
+                reply = getattr(self, 'do_' + name.lower())(*args[1:])
+            self.send(reply)
+
+    def send(self, data):
+        with self.server.write_lock:
+            try:
+                self.wfile.write(data)
+            except OSError:
+                pass
+
+    def finish(self):
+        with self.server.lock:
+            if self in self.server.subscribers:
+                self.server.subscribers.remove(self)
+        super().finish()
+
+    def alive(self, key):
+        data = self.server.data
+        if key in data:
+            value, expires = data[key]
+            if expires is None or expires > time.monotonic():
+                return value
+            del data[key]
+        return None
+
+    def do_ping(self):
+        return b'+PONG\r\n'
+
+    def do_auth(self, password):
+        return OK
+
+    def do_select(self, db):
+        return OK
+
+    def do_get(self, key):
+        return bulk(self.alive(key))
+
+    def do_mget(self, *keys):
+        return b'*%d\r\n' % len(keys) + b''.join(
+            bulk(self.alive(key)) for key in keys
+        )
+
+    def do_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        expires = None
+        if b'PX' in options:
+            ttl = int(options[options.index(b'PX') + 1])
+            expires = time.monotonic() + ttl / 1000
+        if b'NX' in options and self.alive(key) is not None:
+            return bulk(None)
+        self.server.data[key] = (value, expires)
+        return OK
+
+    def do_del(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self.alive(key) is not None:
+                del self.server.data[key]
+                deleted += 1
+        return integer(deleted)
+
+    def do_exists(self, key):
+        return integer(self.alive(key) is not None)
+
+    def do_incrby(self, key, delta):
+        value = self.alive(key)
+        try:
+            value = int(value or 0) + int(delta)
+        except ValueError:
+            return b'-ERR value is not an integer\r\n'
+        expires = self.server.data.get(key, (None, None))[1]
+        self.server.data[key] = (str(value).encode(), expires)
+        return integer(value)
+
+    def do_eval(self, script, numkeys, key, delta):
+        # Lua не выполняется: известен только скрипт incr
+        if script.decode() != INCR_EXISTING:
+            return b'-ERR unknown script\r\n'
+        if self.alive(key) is None:
+            return bulk(None)
+        return self.do_incrby(key, delta)
+
+    def do_pexpire(self, key, ttl):
+        value = self.alive(key)
+        if value is None:
+            return integer(0)
+        expires = time.monotonic() + int(ttl) / 1000
+        self.server.data[key] = (value, expires)
+        return integer(1)
+
+    def do_persist(self, key):
+        value = self.alive(key)
+        if value is None:
+            return integer(0)
+        self.server.data[key] = (value, None)
+        return integer(1)
+
+    def do_flushdb(self):
+        self.server.data.clear()
+        return OK
+
+    def do_publish(self, channel, message):
+        subscribers = list(self.server.subscribers)
+        for subscriber in subscribers:
+            subscriber.send(encode_command((b'message', channel, message)))
+        return integer(len(subscribers))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.data = {}
+        self.commands = []
+        self.subscribers = []
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self.serve_forever, daemon=True
+        )
+
+    @property
+    def location(self):
+        return '%s:%d' % self.server_address
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,186 @@
+import asyncio
+import threading
+
+from django.core.wsgi import get_wsgi_application
+from django.test import SimpleTestCase
+
+from core import asgi
+from core.asgi import WsgiToAsgi
+
+
+def echo(environ, start_response):
+    start_response('201 Created', [
+        ('Content-Type', 'text/plain'),
+        ('X-Thread', threading.current_thread().name),
+    ])
+    body = environ['wsgi.input'].read()
+    return [
+        environ['REQUEST_METHOD'].encode(), b' ',
+        environ['PATH_INFO'].encode('latin1'), b'?',
+        environ['QUERY_STRING'].encode(), b' ',
+        environ.get('HTTP_X_TEST', '').encode(), b' ', body,
+    ]
+
+
+def call(app, scope, body_chunks=(b'',)):
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': True}
+        for chunk in body_chunks
+    ]
+    messages[-1]['more_body'] = False
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def response_body(messages):
+    return b''.join(message['body'] for message in messages)
+
+
+class WsgiToAsgiTest(SimpleTestCase):
+    def test_request_and_response(self):
+        """
+        Метод, путь, строка запроса, заголовки и тело доходят до
+        WSGI-приложения, ответ уходит ASGI-серверу.
+        """
+        start, *body = call(WsgiToAsgi(echo), {
+            'type': 'http',
+            'method': 'POST',
+            'path': '/путь/',
+            'query_string': b'a=1',
+            'headers': [(b'x-test', b'value')],
+        }, body_chunks=(b'part1-', b'part2'))
+        self.assertEqual(start['status'], 201)
+        headers = dict(start['headers'])
+        self.assertEqual(headers[b'content-type'], b'text/plain')
+        self.assertTrue(headers[b'x-thread'].startswith(b'wsgi'))
+        self.assertEqual(
+            response_body(body),
+            'POST /путь/?a=1 value part1-part2'.encode()
+        )
+
+    def test_streaming_response(self):
+        """
+        Тело уходит кусками по мере итерации, ответ закрывается.
+        """
+        closed = []
+        chunk = b'x' * asgi.BUFFER_SIZE
+
+        class Result:
+            def __iter__(self):
+                yield chunk
+                yield chunk
+
+            def close(self):
+                closed.append(True)
+
+        def app(environ, start_response):
+            start_response('200 OK', [])
+            return Result()
+
+        start, *body = call(WsgiToAsgi(app), {
+            'type': 'http', 'method': 'GET', 'path': '/',
+        })
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(
+            [(len(message['body']), message.get('more_body', False))
+             for message in body],
+            [(len(chunk), True), (len(chunk), True), (0, False)],
+        )
+        self.assertEqual(closed, [True])
+
+    def test_one_thread_per_request(self):
+        """
+        Приложение, итерация ответа и его закрытие — в одном потоке:
+        request_finished закрывает соединение с базой этого потока.
+        """
+        threads = []
+
+        class Result:
+            def __iter__(self):
+                for _ in range(3):
+                    threads.append(threading.current_thread())
+                    yield b'x' * asgi.BUFFER_SIZE
+
+            def close(self):
+                threads.append(threading.current_thread())
+
+        def app(environ, start_response):
+            threads.append(threading.current_thread())
+            start_response('200 OK', [])
+            return Result()
+
+        call(WsgiToAsgi(app, max_workers=4), {
+            'type': 'http', 'method': 'GET', 'path': '/',
+        })
+        self.assertEqual(len(threads), 5)
+        self.assertEqual(len(set(threads)), 1)
+
+    def test_client_gone(self):
+        """Если отправить ответ нельзя, поток бросает его и закрывает."""
+        closed = threading.Event()
+
+        class Result:
+            def __iter__(self):
+                while True:
+                    yield b'x' * asgi.BUFFER_SIZE
+
+            def close(self):
+                closed.set()
+
+        def app(environ, start_response):
+            start_response('200 OK', [])
+            return Result()
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                raise OSError('клиент ушёл')
+
+        with self.assertRaises(OSError):
+            asyncio.run(WsgiToAsgi(app)(
+                {'type': 'http', 'method': 'GET', 'path': '/'},
+                receive, send,
+            ))
+        self.assertTrue(closed.wait(5))
+
+    def test_lifespan(self):
+        messages = [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(WsgiToAsgi(echo)({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent,
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
+
+    def test_django_application(self):
+        """
+        Страницы проекта отдаются через адаптер.
+        """
+        start, *body = call(WsgiToAsgi(get_wsgi_application()), {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/about/author/',
+            'headers': [(b'host', b'testserver')],
+        })
+        self.assertEqual(start['status'], 200)
+        self.assertIn(b'<html', response_body(body))
@@ -0,0 +1,90 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import URLPattern
+from django.test import TestCase, override_settings
+
+from core import benchmarks
+from posts import urls as posts_urls
+from posts.models import Post, TimelineEntry
+from users import urls as users_urls
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def url_names(patterns, namespace):
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            if pattern.name:
+                yield f'{namespace}:{pattern.name}'
+        else:
+            yield from url_names(pattern.url_patterns, namespace)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarksTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_every_url_has_scenario(self):
+        """Для каждого адреса posts и users есть сценарий."""
+        names = {
+            *url_names(posts_urls.urlpatterns, posts_urls.app_name),
+            *url_names(users_urls.urlpatterns, users_urls.app_name),
+        }
+        self.assertEqual(
+            names, {scenario.name for scenario in benchmarks.SCENARIOS}
+        )
+
+    def test_generate_and_bench(self):
+        """
+        generate_data создаёт заданные объёмы, bench_views проходит
+        все сценарии, откатывает их записи и сравнивает с прошлым
+        прогоном.
+        """
+        call_command(
+            'generate_data', users=5, groups=2, posts=20, comments=10,
+            follows=5, images=2, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(Post.objects.exclude(image='').count(), 2)
+        self.assertTrue(TimelineEntry.objects.exists())
+        posts = Post.objects.count()
+        cache.set('не-ключ-прогона', 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp, 'bench.json')
+            call_command(
+                'bench_views', requests=2, cold=True, save=str(path),
+                stdout=StringIO(),
+            )
+            report = json.loads(path.read_text())
+            out = StringIO()
+            call_command(
+                'bench_views', requests=1, only=['posts:index'],
+                baseline=str(path), stdout=out,
+            )
+        self.assertEqual(
+            set(report['scenarios']),
+            {benchmarks.label(scenario) for scenario in benchmarks.SCENARIOS},
+        )
+        failed = {
+            name for name, result in report['scenarios'].items()
+            if result['errors']
+        }
+        # Адрес без uidb64 и токена существует, но открыть его нельзя
+        self.assertEqual(failed, {'GET users:password_reset_confirm'})
+        self.assertEqual(report['data']['Post'], 20)
+        self.assertEqual(Post.objects.count(), posts)
+        # Кеш общий с сайтом: прогон удаляет только свои ключи
+        self.assertEqual(cache.get('не-ключ-прогона'), 1)
+        self.assertIn('p95', out.getvalue())
+        self.assertIn('GET posts:index', out.getvalue())
@@ -0,0 +1,126 @@
+import time
+
+from django.test import SimpleTestCase
+
+from core.cache.backends import TwoTierCache
+from core.tests.fake_redis import FakeRedisServer
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Условие не выполнилось за %s с' % timeout)
+        time.sleep(0.01)
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeRedisServer().start()
+        self.addCleanup(self.server.stop)
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+
+    def make_cache(self, **options):
+        cache = TwoTierCache(self.server.location, {
+            'OPTIONS': {'L1_TIMEOUT': 60, **options},
+        })
+        self.addCleanup(cache.shutdown)
+        count = len(self.server.subscribers) + 1
+        cache.has_key('warmup')
+        wait_for(lambda: len(self.server.subscribers) >= count)
+        return cache
+
+    def test_shared_values(self):
+        """
+        Значения, записанные одним воркером, видны другому.
+        """
+        self.first.set('key', {'value': 1})
+        self.first.set('number', 5)
+        self.assertEqual(self.second.get('key'), {'value': 1})
+        self.assertEqual(
+            self.second.get_many(['key', 'number', 'missing']),
+            {'key': {'value': 1}, 'number': 5},
+        )
+        self.assertTrue(self.second.add('new', 'value'))
+        self.assertFalse(self.first.add('new', 'other'))
+        self.assertEqual(self.first.get('new'), 'value')
+
+    def test_reads_are_served_from_l1(self):
+        """
+        Повторное чтение не обращается к серверу.
+        """
+        self.first.set('key', 'value')
+        self.second.get('key')
+        self.server.commands.clear()
+        for _ in range(3):
+            self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.server.commands, [])
+
+    def test_writes_invalidate_other_l1(self):
+        """
+        Запись, удаление, incr и clear вытесняют копии из L1 других
+        воркеров.
+        """
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+
+        self.first.set('key', 'new')
+        wait_for(lambda: self.second.get('key') == 'new')
+
+        self.first.delete('key')
+        wait_for(lambda: self.second.get('key') is None)
+
+        self.first.set('counter', 1)
+        self.assertEqual(self.second.get('counter'), 1)
+        self.assertEqual(self.first.incr('counter'), 2)
+        wait_for(lambda: self.second.get('counter') == 2)
+
+        self.second.get('counter')
+        self.first.clear()
+        wait_for(lambda: self.second.get('counter') is None)
+
+    def test_incr_missing_key(self):
+        """
+        incr отсутствующего ключа — ValueError, как у встроенных
+        бэкендов; ключ не создаётся, проверка и увеличение — одна
+        команда.
+        """
+        self.server.commands.clear()
+        with self.assertRaises(ValueError):
+            self.first.incr('missing')
+        self.assertNotIn('EXISTS', self.server.commands)
+        self.assertIsNone(self.first.get('missing'))
+
+    def test_close_keeps_connection(self):
+        """
+        close после запроса не рвёт соединение: следующий запрос
+        идёт по тому же сокету.
+        """
+        self.first.get('key')
+        connection = self.first._local.connection
+        sock = connection._sock
+        self.first.close()
+        self.first.get('key')
+        self.assertIs(connection._sock, sock)
+
+    def test_lru_eviction(self):
+        """
+        L1 хранит не больше L1_MAX_ENTRIES последних ключей.
+        """
+        cache = self.make_cache(L1_MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(len(cache.l1), 2)
+        self.assertEqual(cache.l1.get('a'), (False, None))
+        self.assertEqual(cache.get('a'), 'a')
+
+    def test_timeout(self):
+        """
+        Истёкшие ключи не возвращаются ни из L1, ни с сервера.
+        """
+        self.first.set('key', 'value', timeout=0.05)
+        self.assertEqual(self.first.get('key'), 'value')
+        time.sleep(0.1)
+        self.assertIsNone(self.first.get('key'))
+        self.assertIsNone(self.second.get('key'))
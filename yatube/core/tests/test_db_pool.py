@@ -0,0 +1,164 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import metrics
+from core.db import health, pool
+from core.db.backends.sqlite3.base import DatabaseWrapper
+
+
+@override_settings(
+    DB_POOL_SIZE=2, DB_POOL_TIMEOUT=0.2, DB_HEALTH_CHECK_INTERVAL=0
+)
+class PoolTest(SimpleTestCase):
+    """Пул на файловой базе SQLite вместо PostgreSQL."""
+
+    alias = 'pool-test'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'pool.sqlite3')
+        self.addCleanup(self.close_pool)
+
+    def close_pool(self):
+        closed = pool._pools.pop(self.alias, None)
+        if closed is not None:
+            closed.close_idle()
+
+    def wrapper(self):
+        return DatabaseWrapper({
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': self.path,
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+            'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False,
+        }, self.alias)
+
+    def query(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0]
+
+    def test_connection_is_reused(self):
+        """Закрытое соединение возвращается в пул и выдаётся снова."""
+        first = self.wrapper()
+        self.query(first)
+        raw = first.connection
+        first.close()
+        second = self.wrapper()
+        self.assertEqual(self.query(second), 1)
+        self.assertIs(second.connection, raw)
+        second.close()
+        stats = pool.get_pool(self.alias).snapshot()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual((stats['in_use'], stats['idle']), (0, 1))
+
+    def test_rollback_on_release(self):
+        """Незавершённая транзакция не переходит к следующему потоку."""
+        first = self.wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute("INSERT INTO note VALUES ('черновик')")
+        first.close()
+        second = self.wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM note')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        second.close()
+
+    def test_waits_for_free_connection(self):
+        """Третий поток ждёт, пока один из двух не вернёт соединение."""
+        holders = [self.wrapper(), self.wrapper()]
+        for holder in holders:
+            self.query(holder)
+        results = []
+
+        def third():
+            wrapper = self.wrapper()
+            results.append(self.query(wrapper))
+            wrapper.close()
+
+        thread = threading.Thread(target=third)
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(results, [])
+        self.assertEqual(pool.get_pool(self.alias).snapshot()['in_use'], 2)
+        holders[0].close()
+        thread.join()
+        holders[1].close()
+        self.assertEqual(results, [1])
+        stats = pool.get_pool(self.alias).snapshot()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['max_in_use'], 2)
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_seconds'], 0.04)
+
+    def test_timeout(self):
+        """Без свободного соединения за DB_POOL_TIMEOUT — OperationalError."""
+        holders = [self.wrapper(), self.wrapper()]
+        for holder in holders:
+            self.query(holder)
+        with self.assertRaises(OperationalError):
+            self.query(self.wrapper())
+        stats = pool.get_pool(self.alias).snapshot()
+        self.assertEqual((stats['timeouts'], stats['in_use']), (1, 2))
+        for holder in holders:
+            holder.close()
+
+    def test_dead_connection_is_replaced(self):
+        """Соединение, не ответившее на SELECT 1, заменяется новым."""
+        first = self.wrapper()
+        self.query(first)
+        raw = first.connection
+        first.close()
+        raw.close()
+        second = self.wrapper()
+        self.assertEqual(self.query(second), 1)
+        self.assertIsNot(second.connection, raw)
+        second.close()
+        stats = pool.get_pool(self.alias).snapshot()
+        self.assertEqual((stats['created'], stats['discarded']), (2, 1))
+
+    def test_metrics(self):
+        """Состояние пула и ожидание попадают в метрики."""
+        wrapper = self.wrapper()
+        with metrics.collect() as values:
+            self.query(wrapper)
+        self.assertIn('db_pool_wait_seconds', values)
+        text = metrics.registry.render()
+        self.assertIn(f'yatube_db_pool_in_use{{alias="{self.alias}"}} 1', text)
+        self.assertIn(
+            f'yatube_db_pool_saturation{{alias="{self.alias}"}} 0.5', text
+        )
+        wrapper.close()
+        self.assertIn(
+            f'yatube_db_pool_idle{{alias="{self.alias}"}} 1',
+            metrics.registry.render(),
+        )
+
+
+class HealthCheckTest(TestCase):
+    def test_unusable_connection_is_closed(self):
+        """Перед запросом мёртвое постоянное соединение закрывается."""
+        connection.ensure_connection()
+        self.addCleanup(vars(connection).pop, '_health_checked_at', None)
+        unusable = mock.patch.object(
+            connection, 'is_usable', return_value=False
+        )
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                unusable, mock.patch.object(connection, 'close') as close:
+            health.check_connections()
+            close.assert_called_once_with()
+            # Следующая проверка — не раньше DB_HEALTH_CHECK_INTERVAL
+            health.check_connections()
+            close.assert_called_once_with()
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, override_settings
+
+from core import media
+from core.storage import IMMUTABLE_CACHE_CONTROL, ContentAddressedStorage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SERVE='')
+class MediaTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        path = os.path.join(TEMP_MEDIA_ROOT, 'posts/clip.mp4')
+        with open(path, 'wb') as stream:
+            stream.write(CONTENT)
+        cls.url = f'{settings.MEDIA_URL}posts/clip.mp4'
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_byte_range(self):
+        """Один диапазон разбирается, остальное — весь файл."""
+        cases = (
+            ('bytes=0-99', (0, 99)),
+            ('bytes=1000-', (1000, 1023)),
+            ('bytes=1000-5000', (1000, 1023)),
+            ('bytes=-24', (1000, 1023)),
+            ('bytes=-5000', (0, 1023)),
+            ('bytes=1024-', False),
+            ('bytes=-0', False),
+            ('bytes=10-5', None),
+            ('bytes=0-1,5-9', None),
+            ('items=0-9', None),
+            ('bytes=-', None),
+        )
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(media.byte_range(header, 1024), expected)
+
+    def test_full_file(self):
+        """Весь файл с валидаторами и поддержкой Range."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertFalse(response.has_header('Cache-Control'))
+
+        response = self.client.head(self.url)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response.content, b'')
+
+    def test_range(self):
+        """Часть файла — 206, диапазон вне файла — 416."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            b''.join(response.streaming_content), CONTENT[100:200]
+        )
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_conditional(self):
+        """
+        Неизменившийся файл — 304; Range с устаревшим If-Range
+        отдаёт весь файл.
+        """
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag
+        )
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_hashed_file(self):
+        """Файл по хешу: ETag — хеш, кеширование навсегда."""
+        name = ContentAddressedStorage().save(
+            'posts/a.jpg', ContentFile(b'picture')
+        )
+        response = self.client.get(f'{settings.MEDIA_URL}{name}')
+        digest = hashlib.sha256(b'picture').hexdigest()
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_handoff(self):
+        """При MEDIA_SERVE файл отдаёт веб-сервер."""
+        with override_settings(MEDIA_SERVE='x-accel'):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/clip.mp4'
+        )
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_SERVE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(TEMP_MEDIA_ROOT, 'posts/clip.mp4'),
+        )
+
+    def test_not_found(self):
+        """Каталоги, файлы вне MEDIA_ROOT и отсутствующие — 404."""
+        for path in ('posts', 'posts/missing.jpg', '../settings.py'):
+            with self.subTest(path=path):
+                response = self.client.get(f'{settings.MEDIA_URL}{path}')
+                self.assertEqual(response.status_code, 404)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 405)
+
+    def test_bench_media(self):
+        """bench_media сравнивает обе отдачи."""
+        out = StringIO()
+        call_command('bench_media', requests=2, size=128, stdout=out)
+        self.assertIn('core.media: 206', out.getvalue())
+        self.assertIn('static: 200', out.getvalue())
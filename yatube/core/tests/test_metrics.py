@@ -0,0 +1,113 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+    def histogram(self, name, view='posts:index'):
+        return metrics.registry.histograms[name, view]
+
+    def test_views_are_measured(self):
+        """
+        Время, запросы к базе, кеш и шаблоны записываются по имени
+        view; повторная страница берётся из кеша.
+        """
+        self.client.get(reverse('posts:index'))
+        self.assertGreater(self.histogram('cache_misses').sum, 0)
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.histogram('seconds').count, 2)
+        self.assertGreater(self.histogram('db_queries').sum, 0)
+        self.assertGreater(self.histogram('cache_hits').sum, 0)
+        self.assertGreater(self.histogram('template_seconds').sum, 0)
+        self.assertGreater(
+            self.histogram('seconds').sum,
+            self.histogram('template_seconds').sum,
+        )
+        # Вне запроса ничего не копится
+        metrics.record('db_queries', 1)
+        self.assertEqual(self.histogram('db_queries').count, 2)
+
+    def test_quantile(self):
+        """Квантили интерполируются внутри корзины."""
+        histogram = metrics.Histogram((10, 20, 30))
+        for value in range(1, 31):
+            histogram.observe(value)
+        cumulative = histogram.cumulative()
+        self.assertEqual(metrics.quantile(0.5, cumulative), 15)
+        self.assertEqual(metrics.quantile(0.9, cumulative), 27)
+        self.assertIsNone(metrics.quantile(0.5, [(10, 0), (20, 0)]))
+        histogram.observe(100)
+        self.assertEqual(metrics.quantile(1, histogram.cumulative()), 30)
+
+    def test_endpoint_and_dump(self):
+        """
+        /metrics/ отдаётся только разрешённым адресам и по токену,
+        а dump_metrics считает квантили по её тексту.
+        """
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            for header, status in (
+                ('Bearer secret', 200),
+                ('Bearer wrong', 403),
+                ('Basic secret', 403),
+            ):
+                with self.subTest(header=header):
+                    response = self.client.get(
+                        reverse('metrics'), HTTP_AUTHORIZATION=header
+                    )
+                    self.assertEqual(response.status_code, status)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            response = self.client.get(
+                reverse('metrics'), REMOTE_ADDR='10.0.0.2'
+            )
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(
+                reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+            )
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_view_seconds_count{view="posts:index"} 1', text
+        )
+        parsed = metrics.parse(text)
+        self.assertEqual(
+            parsed['db_queries', 'posts:index'],
+            [
+                (float(bound), float(count)) for bound, count
+                in self.histogram('db_queries').cumulative()
+            ],
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp, 'metrics.txt')
+            path.write_text(text)
+            out = StringIO()
+            call_command('dump_metrics', path.as_uri(), stdout=out)
+        output = out.getvalue()
+        self.assertIn('posts:index', output)
+        self.assertIn('p95', output)
+        self.assertIn('template_seconds', output)
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.db import routers
+from posts.models import Post
+
+User = get_user_model()
+
+REPLICAS = ['replica-a', 'replica-b']
+
+
+@override_settings(DB_REPLICAS=REPLICAS, DB_REPLICA_LAG_CHECK_INTERVAL=0)
+class ReplicaTest(TransactionTestCase):
+    """Реплики — отдельные файлы SQLite, «репликация» — их копирование."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        for alias in REPLICAS:
+            connections.databases[alias] = {
+                **connections.databases[DEFAULT_DB_ALIAS],
+                'NAME': os.path.join(cls.directory.name, f'{alias}.sqlite3'),
+            }
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in REPLICAS:
+            connections[alias].close()
+            del connections.databases[alias]
+            delattr(connections._connections, alias)
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(author=self.author, text='Старый')
+        cache.clear()
+        routers.reset_lag()
+        self.client = Client()
+
+    def replicate(self):
+        """Копирует основную базу в файлы реплик."""
+        connection.ensure_connection()
+        for alias in REPLICAS:
+            connections[alias].close()
+            target = sqlite3.connect(connections.databases[alias]['NAME'])
+            connection.connection.backup(target)
+            target.close()
+
+    def texts(self, response):
+        return [post.text for post in response.context['page_obj']]
+
+    def test_feeds_are_read_from_replica(self):
+        """Ленты читаются с реплики: запись после копирования не видна."""
+        self.replicate()
+        Post.objects.create(author=self.author, text='Новый')
+        for name, kwargs in (
+            ('posts:index', {}),
+            ('posts:profile', {'username': self.author.username}),
+        ):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name, kwargs=kwargs))
+                self.assertEqual(self.texts(response), ['Старый'])
+        response = self.client.get(reverse('posts:post-list'))
+        self.assertEqual(
+            [post['text'] for post in response.json()['results']],
+            ['Старый'],
+        )
+
+    def test_other_views_read_primary(self):
+        """Адреса не из DB_REPLICA_VIEWS читают основную базу."""
+        self.replicate()
+        post = Post.objects.create(author=self.author, text='Новый')
+        response = self.client.get(
+            reverse('posts:post-detail', kwargs={'pk': post.pk})
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('posts:post-comments', kwargs={'pk': post.pk})
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_read_your_writes(self):
+        """После записи браузер видит её, пока действует cookie."""
+        user = User.objects.create_user(username='writer')
+        self.client.force_login(user)
+        self.replicate()
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Свой пост'}
+        )
+        self.assertIn(settings.DB_REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.texts(response), ['Свой пост', 'Старый'])
+
+        # Страница, собранная по основной базе, уже в кеше
+        cache.clear()
+        stranger = Client()
+        response = stranger.get(reverse('posts:index'))
+        self.assertEqual(self.texts(response), ['Старый'])
+        self.assertNotIn(settings.DB_REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_lagging_replica_is_skipped(self):
+        """Отставшая или недоступная реплика не используется."""
+        self.replicate()
+        Post.objects.create(author=self.author, text='Новый')
+        lags = {'replica-a': 60, 'replica-b': None}
+        with mock.patch.object(routers, 'measure_lag', lags.get):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.texts(response), ['Новый', 'Старый'])
+
+        lags['replica-b'] = 0
+        routers.reset_lag()
+        with mock.patch.object(routers, 'measure_lag', lags.get), \
+                mock.patch.object(routers.random, 'choice') as choice:
+            choice.side_effect = lambda aliases: aliases[0]
+            self.client.get(reverse('posts:index'))
+        choice.assert_called_once_with(['replica-b'])
+
+    def test_router(self):
+        """Запись всегда в основную базу, чтение — вне запроса тоже."""
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+        with routers.request_state() as state:
+            state['replica'] = 'replica-b'
+            self.assertEqual(router.db_for_read(Post), 'replica-b')
+            self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+            self.assertTrue(state['wrote'])
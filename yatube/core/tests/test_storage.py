@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.storage import (
+    IMMUTABLE_CACHE_CONTROL, ContentAddressedStorage, is_immutable,
+)
+from core.views import media
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+
+    def test_same_content_same_file(self):
+        """Одинаковое содержимое хранится один раз под именем-хешем."""
+        first = self.storage.save('posts/a.JPG', ContentFile(b'picture'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        other = self.storage.save('posts/a.jpg', ContentFile(b'another'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        # sha256(b'picture')
+        digest = (
+            '2cea274d0bedc39ec4ab6ba9e59ec889e3ed6fb56a1cf088a64d9b383378dc97'
+        )
+        self.assertEqual(first, f'posts/2c/ea/{digest}.jpg')
+        self.assertEqual(self.storage.listdir('posts/2c/ea')[1], [
+            f'{digest}.jpg'
+        ])
+        self.assertTrue(is_immutable(first))
+        self.assertFalse(is_immutable('posts/a.jpg'))
+        self.assertFalse(is_immutable(f'posts/2c/eb/{digest}.jpg'))
+
+    def test_media_view_cache_headers(self):
+        """Файлы по хешу отдаются с вечным кешированием, прочие — без."""
+        hashed = self.storage.save('posts/a.jpg', ContentFile(b'picture'))
+        with open(f'{TEMP_MEDIA_ROOT}/plain.txt', 'w') as stream:
+            stream.write('текст')
+        request = RequestFactory().get('/')
+        response = media(request, hashed)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        response = media(request, 'plain.txt')
+        self.assertFalse(response.has_header('Cache-Control'))
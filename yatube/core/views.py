@@ -1,4 +1,12 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+from core import media as media_files
+from core.metrics import registry
 
 
 def page_not_found(request, exception):
@@ -17,3 +25,33 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics_allowed(request):
+    """Адрес из METRICS_ALLOWED_IPS или токен METRICS_TOKEN."""
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    scheme, _, token = request.META.get(
+        'HTTP_AUTHORIZATION', ''
+    ).partition(' ')
+    return bool(
+        settings.METRICS_TOKEN
+        and scheme.lower() == 'bearer'
+        and constant_time_compare(token, settings.METRICS_TOKEN)
+    )
+
+
+def metrics(request):
+    # Адрес и токен проверяются первыми, чтобы опрос Prometheus
+    # не читал сессию
+    if not metrics_allowed(request) and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
+
+
+@require_safe
+def media(request, path):
+    """Медиафайлы, если их не отдаёт веб-сервер; см. core.media."""
+    return media_files.serve(request, path)
@@ -0,0 +1,143 @@
+"""
+Условные запросы (ETag, Last-Modified) для лент, постов и API.
+
+Валидаторы считаются без отрисовки страницы. ETag — хеш версий лент
+(posts.feed_cache), из которых собрана страница, и сессии: HTML
+зависит от пользователя. У API в ETag входит ещё и тип ответа: JSON
+и браузерный HTML по одному адресу — разные представления
+(и ответ API содержит Vary: Accept). Last-Modified — дата последнего поста или
+комментария (один запрос по индексу) либо, если позже, время
+последнего изменения лент: так учитываются правки и удаления.
+Неизменившаяся страница стоит этого запроса и обращения к кешу
+и отдаётся ответом 304.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from posts import feed_cache
+from posts.models import Comment, Group, Post, User
+
+
+def _representation(request):
+    """
+    Тип ответа API, выбранный по Accept и ?format= (JSON или HTML
+    браузерного API); у страниц сайта — пустая строка.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is None:
+        return ''
+    return renderer.media_type
+
+
+def _validators(get_state, per_user):
+    def compute(request, *args, **kwargs):
+        # condition() спрашивает ETag и Last-Modified по отдельности
+        if not hasattr(request, '_conditional'):
+            state = get_state(*args, **kwargs)
+            if state is None:
+                request._conditional = None
+            else:
+                scopes, latest = state
+                version, modified = feed_cache.validators(*scopes)
+                representation = _representation(request)
+                session = ''
+                if per_user or representation.startswith('text/html'):
+                    session = request.COOKIES.get(
+                        settings.SESSION_COOKIE_NAME, ''
+                    )
+                etag = hashlib.md5(
+                    f'{version}:{session}:{representation}'.encode()
+                )
+                dates = [date for date in (latest, modified) if date]
+                request._conditional = (
+                    etag.hexdigest(), max(dates) if dates else None
+                )
+        return request._conditional
+
+    def etag(request, *args, **kwargs):
+        state = compute(request, *args, **kwargs)
+        return state and state[0]
+
+    def last_modified(request, *args, **kwargs):
+        state = compute(request, *args, **kwargs)
+        return state and state[1]
+
+    return etag, last_modified
+
+
+def conditional(get_state, per_user=True):
+    """
+    Декоратор view. get_state(*args, **kwargs) получает аргументы
+    view и возвращает (ленты страницы, дата последнего изменения)
+    или None, если объекта нет: тогда view отвечает как обычно.
+    per_user=False — ответ не зависит от пользователя (API).
+    """
+    etag, last_modified = _validators(get_state, per_user)
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _latest(queryset, field):
+    return Subquery(
+        queryset.order_by(f'-{field}').values(field)[:1]
+    )
+
+
+def index_state():
+    latest = Post.objects.order_by('-pub_date', '-id').values_list(
+        'pub_date', flat=True
+    ).first()
+    return (feed_cache.GLOBAL,), latest
+
+
+def group_state(slug):
+    group = Group.objects.filter(slug=slug).values_list(
+        'pk',
+        _latest(Post.objects.filter(group=OuterRef('pk')), 'pub_date'),
+    ).first()
+    if group is None:
+        return None
+    pk, latest = group
+    return ((feed_cache.GROUP, pk),), latest
+
+
+def profile_state(username):
+    author = User.objects.filter(username=username).values_list(
+        'pk',
+        _latest(Post.objects.filter(author=OuterRef('pk')), 'pub_date'),
+    ).first()
+    if author is None:
+        return None
+    pk, latest = author
+    return ((feed_cache.AUTHOR, pk), (feed_cache.FOLLOWS, pk)), latest
+
+
+def post_state(post_id):
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author', 'group', 'pub_date',
+        _latest(Comment.objects.filter(post=OuterRef('pk')), 'created'),
+    ).first()
+    if post is None:
+        return None
+    author_id, group_id, pub_date, commented = post
+    scopes = [(feed_cache.POST, post_id), (feed_cache.AUTHOR, author_id)]
+    if group_id is not None:
+        scopes.append((feed_cache.GROUP, group_id))
+    return scopes, max(filter(None, (pub_date, commented)))
+
+
+def api_post_state(pk):
+    if not str(pk).isdigit():
+        return None
+    post = Post.objects.filter(pk=pk).values_list(
+        'group', 'pub_date'
+    ).first()
+    if post is None:
+        return None
+    group_id, pub_date = post
+    scopes = [(feed_cache.POST, pk)]
+    if group_id is not None:
+        scopes.append((feed_cache.GROUP, group_id))
+    return scopes, pub_date
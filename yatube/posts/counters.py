@@ -0,0 +1,88 @@
+"""
+Денормализованные счётчики: посты и подписки пользователя, посты
+группы, комментарии поста.
+
+Счётчики меняются из сигналов моделей (posts.signals) в той же
+транзакции, что и сама запись, поэтому страницы не считают COUNT(*)
+при каждом показе. Если счётчики всё же разошлись с данными
+(bulk-операции, правки в обход ORM), их пересчитывает команда
+reconcile_counters.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+
+# (модель счётчика, поле, модель-источник, поле связи в источнике)
+COUNTERS = (
+    (AuthorStats, 'posts_count', Post, 'author'),
+    (AuthorStats, 'followers_count', Follow, 'author'),
+    (AuthorStats, 'following_count', Follow, 'user'),
+    (Group, 'posts_count', Post, 'group'),
+    (Post, 'comments_count', Comment, 'post'),
+)
+
+
+def _add(queryset, **deltas):
+    return queryset.update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def add_to_author(user_id, **deltas):
+    """Меняет счётчики пользователя, при первом изменении заводит их."""
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if _add(stats, **deltas) or min(deltas.values()) < 0:
+        return
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=user_id)], ignore_conflicts=True
+    )
+    _add(stats, **deltas)
+
+
+def add_to_group(group_id, delta):
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def add_to_post(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def author_stats(user):
+    """Счётчики пользователя; у новых пользователей они нулевые."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=user)
+
+
+def _actual(source, lookup):
+    counts = source.objects.filter(
+        **{lookup: OuterRef('pk')}
+    ).order_by().values(lookup).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def reconcile():
+    """
+    Пересчитывает все счётчики по данным.
+    Возвращает число исправленных строк для каждого счётчика.
+    """
+    missing = User.objects.filter(
+        stats__isnull=True
+    ).values_list('pk', flat=True)
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    fixed = {}
+    for model, field, source, lookup in COUNTERS:
+        actual = _actual(source, lookup)
+        name = f'{model._meta.model_name}.{field}'
+        fixed[name] = model.objects.exclude(
+            **{field: actual}
+        ).update(**{field: actual})
+    return fixed
@@ -0,0 +1,123 @@
+"""
+Версии (поколения) лент для кеша отрисованных страниц.
+
+Каждая лента — общая, группы, автора, подписок пользователя — имеет
+счётчик в кеше. Сигналы Post, Comment и Follow увеличивают счётчики
+затронутых лент, а ключи кеша страниц содержат текущие значения
+счётчиков, поэтому закешированную страницу можно хранить долго:
+после изменения она просто перестаёт находиться по новому ключу.
+"""
+import time
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.db.routers import current_replica
+
+GLOBAL = 'global'
+GROUP = 'group'
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+POST = 'post'
+# Подписки и подписчики пользователя: счётчики и кнопка на профиле
+FOLLOWS = 'follows'
+
+
+def generation_key(scope):
+    """`scope` — имя ленты или пара (имя, pk)."""
+    if isinstance(scope, tuple):
+        return 'feed-generation:{}:{}'.format(*scope)
+    return f'feed-generation:{scope}'
+
+
+def modified_key(scope):
+    return 'feed-modified:' + generation_key(scope).split(':', 1)[1]
+
+
+def _initial():
+    # Счётчик, вытесненный из кеша, не должен вернуться к старому
+    # значению, иначе снова найдутся устаревшие страницы
+    return int(time.time() * 1000)
+
+
+def get_generations(keys, found=None):
+    """
+    Текущие значения счётчиков; недостающие заводятся заново.
+    `found` — уже прочитанные из кеша значения.
+    """
+    generations = cache.get_many(keys) if found is None else found
+    for key in keys:
+        if key not in generations:
+            cache.add(key, _initial(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def feed_version(*scopes):
+    """Строка версии для ключа кеша ленты."""
+    # Тег {% cache %} сам хеширует значения, длина строки не важна
+    keys = [generation_key(scope) for scope in scopes]
+    return '.'.join(str(generation) for generation in get_generations(keys))
+
+
+def validators(*scopes):
+    """
+    Версия лент и время их последнего изменения (None, если оно
+    неизвестно) — за одно обращение к кешу.
+    """
+    keys = [generation_key(scope) for scope in scopes]
+    modified_keys = [modified_key(scope) for scope in scopes]
+    found = cache.get_many(keys + modified_keys)
+    version = '.'.join(
+        str(generation) for generation in get_generations(keys, found)
+    )
+    times = [found[key] for key in modified_keys if key in found]
+    if not times:
+        return version, None
+    return version, datetime.fromtimestamp(max(times), timezone.utc)
+
+
+def bump(*scopes):
+    """Увеличивает счётчики: ленты с этими версиями устарели."""
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial(), None)
+    now = time.time()
+    cache.set_many({modified_key(scope): now for scope in scopes}, None)
+
+
+def bump_on_commit(*scopes):
+    """
+    bump после коммита текущей транзакции. Иначе параллельный запрос
+    успеет прочитать новую версию и ещё старые строки и закешировать
+    устаревшую страницу под новым ключом.
+    """
+    transaction.on_commit(partial(bump, *scopes))
+
+
+def timeout():
+    """
+    Срок хранения страницы. Прочитанная с реплики страница могла
+    не увидеть запись, которая уже сменила версию ленты, поэтому
+    хранится недолго.
+    """
+    if current_replica() is not None:
+        return min(
+            settings.FEED_CACHE_TIMEOUT, settings.DB_REPLICA_CACHE_TIMEOUT
+        )
+    return settings.FEED_CACHE_TIMEOUT
+
+
+def cache_context(*scopes):
+    """Переменные для тега {% cache %} в шаблонах лент."""
+    return {
+        'feed_version': feed_version(*scopes),
+        'feed_cache_timeout': timeout(),
+    }
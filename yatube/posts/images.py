@@ -0,0 +1,290 @@
+"""
+Варианты картинок постов, создаваемые при загрузке.
+
+Загруженный файл хранится как есть, а в пуле процессов
+(posts.thumbnails) из него делается набор вариантов: картинка
+поворачивается по EXIF, теряет метаданные (в том числе координаты
+съёмки), уменьшается до IMAGE_MAX_SIZE по большей стороне
+и сохраняется в каждой ширине из IMAGE_VARIANT_WIDTHS и каждом формате
+из IMAGE_VARIANT_FORMATS. Сведения о вариантах хранятся в ImageVariant
+и в кеше; шаблоны и API выбирают через choose наименьший вариант,
+которого хватает для нужной ширины.
+
+Исходный файл наружу не отдаётся: в нём остаются EXIF с координатами
+съёмки и полный размер. Пока вариантов нет, вместо него отдаётся копия
+без метаданных, не больше IMAGE_MAX_SIZE (capped_url).
+
+Размеры картинки и крошечная размытая заглушка (measure) записываются
+в пост ещё при загрузке, чтобы шаблоны задавали у <img> width и height
+и фон до загрузки картинки, не открывая файл.
+"""
+import base64
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from core import metrics
+from core.storage import content_storage
+
+VARIANT_DIR = 'variants'
+
+# Формат: (имя в Pillow, расширение, MIME-тип)
+FORMATS = {
+    'avif': ('AVIF', 'avif', 'image/avif'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+# Формат, который понимают все браузеры и клиенты API
+FALLBACK = 'jpeg'
+
+Variant = namedtuple('Variant', 'name format width height size')
+
+ORIENTATION = 0x0112
+# Значения ORIENTATION, при которых картинка поворачивается на 90°
+ROTATED = (5, 6, 7, 8)
+# Заглушка — PNG такого размера по большей стороне, растянутый
+# браузером: получается размытое пятно цветов картинки (~200 байт)
+PLACEHOLDER_SIZE = 8
+
+
+def formats():
+    """Форматы из IMAGE_VARIANT_FORMATS, которые Pillow умеет писать."""
+    Image.init()
+    return [
+        name for name in settings.IMAGE_VARIANT_FORMATS
+        if FORMATS[name][0] in Image.SAVE
+    ]
+
+
+def mime_type(format):
+    return FORMATS[format][2]
+
+
+def variant_name(width, format):
+    """Имя для хранилища; в нём останутся только каталог и расширение."""
+    return f'{VARIANT_DIR}/{width}w.{FORMATS[format][1]}'
+
+
+def normalize(image):
+    """Поворот по EXIF и ограничение размера; метаданные не переносятся."""
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(
+        (settings.IMAGE_MAX_SIZE, settings.IMAGE_MAX_SIZE), Image.LANCZOS
+    )
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert(
+            'RGBA' if 'transparency' in image.info else 'RGB'
+        )
+    return image
+
+
+def measure(file_):
+    """
+    Ширина и высота с учётом поворота по EXIF и заглушка — data: URI.
+    Для JPEG декодируется только уменьшенная в 8 раз копия.
+    """
+    file_.seek(0)
+    image = Image.open(file_)
+    width, height = image.size
+    if image.getexif().get(ORIENTATION) in ROTATED:
+        width, height = height, width
+    image.draft('RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    image = flatten(image.convert('RGBA'))
+    buffer = BytesIO()
+    image.save(buffer, 'PNG', optimize=True)
+    file_.seek(0)
+    placeholder = base64.b64encode(buffer.getvalue()).decode()
+    return width, height, f'data:image/png;base64,{placeholder}'
+
+
+def flatten(image):
+    """RGBA на белом фоне."""
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def encode(image, format):
+    if format == 'jpeg':
+        # У JPEG нет прозрачности
+        image = flatten(image)
+    buffer = BytesIO()
+    image.save(
+        buffer, FORMATS[format][0],
+        quality=settings.IMAGE_QUALITY, optimize=format == 'jpeg',
+    )
+    return buffer.getvalue()
+
+
+def render(name):
+    """
+    Создаёт все варианты картинки. Выполняется в процессе пула,
+    поэтому не обращается к базе и кешу.
+    """
+    with content_storage.open(name) as file_:
+        image = Image.open(file_)
+        image.load()
+    image = normalize(image)
+    widths = sorted({
+        min(width, image.width) for width in settings.IMAGE_VARIANT_WIDTHS
+    })
+    variants = []
+    for width in widths:
+        height = max(round(image.height * width / image.width), 1)
+        resized = image
+        if width != image.width:
+            resized = image.resize((width, height), Image.LANCZOS)
+        for format in formats():
+            content = encode(resized, format)
+            # Хранилище по содержимому: повторная обработка той же
+            # картинки не создаёт копий
+            path = content_storage.save(
+                variant_name(width, format), ContentFile(content)
+            )
+            variants.append(
+                Variant(path, format, width, height, len(content))
+            )
+    return variants
+
+
+def cache_key(source):
+    return f'image-variants:{source}'
+
+
+def store(source, variants):
+    """Записывает созданные варианты в базу и кеш."""
+    # Модуль импортируется в процессах пула до django.setup(), поэтому
+    # модели — только внутри функций
+    from posts.models import ImageVariant
+
+    ImageVariant.objects.filter(source=source).delete()
+    ImageVariant.objects.bulk_create(
+        ImageVariant(
+            source=source,
+            file=variant.name,
+            format=variant.format,
+            width=variant.width,
+            height=variant.height,
+            size=variant.size,
+        )
+        for variant in variants
+    )
+    cache.set(cache_key(source), list(variants), None)
+
+
+def lookup(sources):
+    """
+    Варианты картинок: {исходный файл: [Variant]}, за одно обращение
+    к кешу и не больше одного запроса к базе. Картинки, для которых
+    вариантов ещё нет, в словарь не попадают.
+    """
+    with metrics.timer('thumbnail_seconds'):
+        return _lookup(sources)
+
+
+def _lookup(sources):
+    keys = {cache_key(source): source for source in sources if source}
+    found = {
+        keys[key]: variants
+        for key, variants in cache.get_many(keys).items()
+    }
+    missing = [source for source in keys.values() if source not in found]
+    if missing:
+        from posts.models import ImageVariant
+
+        loaded = {}
+        for row in ImageVariant.objects.filter(
+            source__in=missing
+        ).order_by('source', 'width', 'format'):
+            loaded.setdefault(row.source, []).append(Variant(
+                row.file, row.format, row.width, row.height, row.size
+            ))
+        cache.set_many(
+            {cache_key(source): variants
+             for source, variants in loaded.items()},
+            None,
+        )
+        found.update(loaded)
+    return found
+
+
+def choose(variants, width, format=FALLBACK):
+    """
+    Наименьший вариант формата, не уже `width`; если таких нет —
+    самый широкий. None, если вариантов этого формата нет.
+    """
+    candidates = sorted(
+        (variant for variant in variants or () if variant.format == format),
+        key=lambda variant: (variant.width, variant.size),
+    )
+    for variant in candidates:
+        if variant.width >= width:
+            return variant
+    return candidates[-1] if candidates else None
+
+
+def url(variant):
+    return content_storage.url(variant.name)
+
+
+def capped_url(image):
+    """
+    Адрес копии картинки (FieldFile), сделанной sorl: повёрнута
+    по EXIF, без метаданных, не больше IMAGE_MAX_SIZE. Создаётся один
+    раз, дальше sorl находит её по своему хранилищу ключей.
+    """
+    from sorl.thumbnail import get_thumbnail
+
+    size = settings.IMAGE_MAX_SIZE
+    return get_thumbnail(
+        image, f'{size}x{size}', upscale=False, quality=settings.IMAGE_QUALITY
+    ).url
+
+
+def public_url(image, variants, width, format=FALLBACK):
+    """Адрес варианта (choose) или, пока вариантов нет, capped_url."""
+    variant = choose(variants, width, format)
+    if variant is None:
+        return capped_url(image)
+    return url(variant)
+
+
+def srcset(variants, format):
+    """Значение srcset: все ширины формата, от узкой к широкой."""
+    return ', '.join(
+        f'{url(variant)} {variant.width}w'
+        for variant in sorted(variants, key=lambda variant: variant.width)
+        if variant.format == format
+    )
+
+
+def picture(post, variants):
+    """
+    Всё, что нужно шаблону для картинки поста: адреса вариантов
+    по форматам, размеры и заглушка; пока вариантов нет — копия
+    без метаданных (capped_url).
+    """
+    variants = variants or ()
+    sources = []
+    for format in settings.IMAGE_VARIANT_FORMATS:
+        srcset_ = srcset(variants, format)
+        if srcset_ and format != FALLBACK:
+            sources.append({'type': mime_type(format), 'srcset': srcset_})
+    return {
+        'url': public_url(
+            post.image, variants, max(settings.IMAGE_VARIANT_WIDTHS)
+        ),
+        'srcset': srcset(variants, FALLBACK),
+        'sources': sources,
+        'width': post.image_width,
+        'height': post.image_height,
+        'placeholder': post.image_placeholder,
+    }
@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post, Tag, TagPost
+
+User = get_user_model()
+
+
+@contextmanager
+def bench_posts(count, tags):
+    """
+    Автор с `count` постами по `tags` тегов; после выхода всё
+    созданное удаляется.
+    """
+    author = User.objects.create_user(username='bench-api-posts')
+    tag_rows = Tag.objects.filter(name__startswith='bench-api-')
+    try:
+        Tag.objects.bulk_create(
+            [Tag(name=f'bench-api-{i}') for i in range(tags)]
+        )
+        # Без сигналов: лентам и счётчикам эти посты не нужны
+        Post.objects.bulk_create(
+            [Post(author=author, text=f'Пост {i}') for i in range(count)]
+        )
+        posts = Post.objects.filter(author=author)
+        TagPost.objects.bulk_create(
+            TagPost(post=post, tag=tag) for post in posts for tag in tag_rows
+        )
+        yield posts
+    finally:
+        Post.objects.filter(author=author).delete()
+        tag_rows.delete()
+        author.delete()
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает запросы и время ответа /api/v1/posts/ на страницу '
+        'из --posts постов с разными ?fields=. Созданные пользователь, '
+        'посты и теги удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=3)
+        parser.add_argument(
+            '--fields', action='append',
+            help='Наборы полей; по умолчанию — все и id,text,author,pub_date',
+        )
+
+    def handle(self, *args, **options):
+        count = options['posts']
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        with bench_posts(count, options['tags']):
+            client = Client()
+            for fields in options['fields'] or ('', 'id,text,author,pub_date'):
+                url = f'/api/v1/posts/?page_size={count}&fields={fields}'
+                client.get(url)
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'fields={fields or "все"}: '
+                    f'постов: {len(response.json()["results"])}, '
+                    f'запросов: {len(queries)}, {elapsed * 1000:.1f} мс, '
+                    f'{len(response.content) // 1024} КБ'
+                )
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONRenderer
+from posts.management.commands.bench_api_posts import bench_posts
+from posts.models import Tag
+from posts.serializers import PostRowSerializer, PostSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает PostSerializer с JSONRenderer и PostRowSerializer '
+        'с FastJSONRenderer на --posts постах: выборка, сериализация, '
+        'JSON и всё вместе. Созданные пользователь, посты и теги удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        self.repeat = options['repeat']
+        request = RequestFactory().get('/api/v1/posts/')
+        with bench_posts(options['posts'], options['tags']) as posts:
+            posts = posts.order_by('-pub_date', '-id')
+            models = posts.select_related('group').prefetch_related(
+                Prefetch('tag', queryset=Tag.objects.order_by('pk'))
+            )
+            rows = PostRowSerializer(request)
+
+            def serializer_data():
+                return PostSerializer(
+                    list(models.all()), many=True,
+                    context={'request': request},
+                ).data
+
+            def rows_data():
+                return rows.to_representation(list(rows.rows(posts)))
+
+            slow, fast = serializer_data(), rows_data()
+            slow_json = JSONRenderer().render(slow)
+            if slow_json != FastJSONRenderer().render(fast):
+                raise CommandError('Ответы PostSerializer и PostRowSerializer '
+                                   'различаются')
+            fetched = list(models.all())
+            fetched_rows = list(rows.rows(posts))
+            cases = (
+                ('выборка', lambda: list(models.all()),
+                 lambda: list(rows.rows(posts))),
+                ('сериализация', lambda: PostSerializer(
+                    fetched, many=True, context={'request': request}
+                ).data, lambda: rows.to_representation(fetched_rows)),
+                ('JSON', lambda: JSONRenderer().render(slow),
+                 lambda: FastJSONRenderer().render(fast)),
+                ('всё вместе',
+                 lambda: JSONRenderer().render(serializer_data()),
+                 lambda: FastJSONRenderer().render(rows_data())),
+            )
+            for name, slow_case, fast_case in cases:
+                before = self.measure(slow_case)
+                after = self.measure(fast_case)
+                self.stdout.write(
+                    f'{name}: {before * 1000:.1f} мс → '
+                    f'{after * 1000:.1f} мс (×{before / after:.1f})'
+                )
+
+    def measure(self, case):
+        """Медиана времени `case` из --repeat запусков."""
+        case()
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
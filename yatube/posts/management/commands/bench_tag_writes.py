@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post, Tag
+from posts.serializers import PostSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает запросы к базе при создании и правке поста через '
+        'PostSerializer в зависимости от числа тегов. Созданные '
+        'пользователь, посты и теги удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tags', type=int, nargs='+', default=[1, 5, 20, 50]
+        )
+
+    def handle(self, *args, **options):
+        author = User.objects.create_user(username='bench-tag-writes')
+        try:
+            for count in options['tags']:
+                names = [f'bench-{count}-{i}' for i in range(count)]
+                post, new = self.measure(
+                    PostSerializer(data=self.data(author, names))
+                )
+                _, known = self.measure(
+                    PostSerializer(data=self.data(author, names))
+                )
+                renamed = [f'{name}-x' for name in names[:count // 2]]
+                _, update = self.measure(PostSerializer(
+                    post, data={'tag': [
+                        {'name': name} for name in names[count // 2:] + renamed
+                    ]},
+                    partial=True,
+                ))
+                self.stdout.write(
+                    f'{count} тегов: новые — {new}, известные — {known}, '
+                    f'замена половины — {update}'
+                )
+        finally:
+            Post.objects.filter(author=author).delete()
+            Tag.objects.filter(name__startswith='bench-').delete()
+            author.delete()
+
+    def data(self, author, names):
+        return {
+            'text': 'Тестовый пост',
+            'author': author.pk,
+            'tag': [{'name': name} for name in names],
+        }
+
+    def measure(self, serializer):
+        serializer.is_valid(raise_exception=True)
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                post = serializer.save()
+        elapsed = time.perf_counter() - started
+        return post, f'{len(queries)} запросов, {elapsed * 1000:.1f} мс'
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает теги, группы, посты, комментарии и подписки '
+        'в JSON Lines или CSV (одна модель на файл)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Файл; - — stdout')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), default='jsonl'
+        )
+        parser.add_argument(
+            '--model', action='append', choices=list(bulk.FIELDS),
+            help='Что выгружать; по умолчанию — всё',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        models = options['model'] or list(bulk.FIELDS)
+        if options['format'] == 'csv' and len(models) != 1:
+            raise CommandError('Для CSV укажите одну модель в --model')
+        if options['output'] == '-':
+            # Переводы строк записи добавляют сами
+            self.stdout.ending = ''
+            self.export(self.stdout, models, options)
+        else:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as stream:
+                self.export(stream, models, options)
+
+    def export(self, stream, models, options):
+        for model in bulk.FIELDS:
+            if model not in models:
+                continue
+            records = bulk.export_records(model, options['batch_size'])
+            if options['format'] == 'csv':
+                bulk.write_csv(records, stream, model)
+            else:
+                bulk.write_jsonl(records, stream)
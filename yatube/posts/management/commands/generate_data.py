@@ -0,0 +1,130 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from posts.bulk import Importer
+from posts.models import Comment, Post
+
+WORDS = (
+    'утро', 'город', 'река', 'лес', 'туман', 'дорога', 'поезд', 'море',
+    'книга', 'кофе', 'снег', 'солнце', 'ветер', 'дом', 'окно', 'сад',
+    'кошка', 'собака', 'музыка', 'песня', 'ночь', 'звезда', 'гора',
+    'поле', 'мост', 'парк', 'осень', 'весна', 'лето', 'зима', 'друг',
+    'письмо', 'фото', 'прогулка', 'чай', 'вечер', 'дождь', 'облако',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу данными для нагрузочных тестов: пользователи, '
+        'группы, посты с тегами и картинками, комментарии и подписки. '
+        'При одном --seed данные одинаковые'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=500)
+        parser.add_argument(
+            '--images', type=int, default=50,
+            help='Сколько постов получат картинку',
+        )
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        prefix = f'bench{options["seed"]}'
+        users = [f'{prefix}-user-{i}' for i in range(options['users'])]
+        groups = [f'{prefix}-group-{i}' for i in range(options['groups'])]
+        tags = [f'{prefix}-tag-{i}' for i in range(options['tags'])]
+        images = [
+            self.image(f'posts/{prefix}-{i}.jpg')
+            for i in range(min(options['images'], options['posts']))
+        ]
+
+        importer = Importer(options['batch_size'])
+        importer.users.resolve(users)
+        for slug in groups:
+            importer.add({
+                'model': 'group',
+                'slug': slug,
+                'title': self.text(2).capitalize(),
+                'description': self.text(12),
+            })
+        for name in tags:
+            importer.add({'model': 'tag', 'name': name})
+
+        now = timezone.now()
+        first_post = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        post_ids = range(first_post, first_post + options['posts'])
+        image_posts = dict(zip(
+            self.random.sample(post_ids, len(images)), images
+        ))
+        for pk in post_ids:
+            importer.add({
+                'model': 'post',
+                'id': pk,
+                'pub_date': now - timedelta(
+                    minutes=self.random.randrange(365 * 24 * 60)
+                ),
+                'author': self.random.choice(users),
+                'group': self.random.choice([None, *groups]),
+                'text': self.text(self.random.randint(5, 60)),
+                'image': image_posts.get(pk, ''),
+                'tags': self.random.sample(
+                    tags, min(len(tags), self.random.randint(0, 3))
+                ),
+            })
+
+        first_comment = (
+            Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+        ) + 1
+        comments = options['comments'] if post_ids else 0
+        for pk in range(first_comment, first_comment + comments):
+            importer.add({
+                'model': 'comment',
+                'id': pk,
+                'post': self.random.choice(post_ids),
+                'author': self.random.choice(users),
+                'created': now - timedelta(
+                    minutes=self.random.randrange(30 * 24 * 60)
+                ),
+                'text': self.text(self.random.randint(3, 30)),
+            })
+
+        for _ in range(options['follows'] if len(users) > 1 else 0):
+            user, author = self.random.sample(users, 2)
+            importer.add({'model': 'follow', 'user': user, 'author': author})
+        importer.finish()
+
+        counts = ', '.join(
+            f'{model}: {count}' for model, count in importer.imported.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано ({counts}), картинок: {len(images)}'
+        ))
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def image(self, name):
+        """Картинка 1200×800 с градиентом; существующий файл не трогаем."""
+        color = tuple(self.random.randrange(256) for _ in range(3))
+        if default_storage.exists(name):
+            return name
+        image = Image.linear_gradient('L').resize((1200, 800)).convert('RGB')
+        image = Image.blend(image, Image.new('RGB', image.size, color), 0.5)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
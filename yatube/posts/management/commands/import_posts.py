@@ -0,0 +1,55 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает теги, группы, посты, комментарии и подписки '
+        'из JSON Lines или CSV, выгруженных export_posts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл; - — stdin')
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument(
+            '--model', choices=list(bulk.FIELDS),
+            help='Модель записей CSV-файла',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['input']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        if file_format == 'csv' and not options['model']:
+            raise CommandError('Для CSV укажите модель в --model')
+        importer = bulk.Importer(options['batch_size'])
+        if path == '-':
+            self.load(sys.stdin, file_format, importer, options)
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                self.load(stream, file_format, importer, options)
+        for model in bulk.FIELDS:
+            self.stdout.write(
+                f'{model}: загружено {importer.imported[model]}, '
+                f'пропущено {importer.skipped[model]}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Готово. Миниатюры картинок создаёт pregenerate_thumbnails'
+        ))
+
+    def load(self, stream, file_format, importer, options):
+        if file_format == 'csv':
+            records = bulk.read_csv(stream, options['model'])
+        else:
+            records = bulk.read_jsonl(stream)
+        try:
+            for record in records:
+                importer.add(record)
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Некорректная запись: {error}')
+        importer.finish()
@@ -0,0 +1,93 @@
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.storage import content_storage
+from posts import feed_cache, images, thumbnails
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт варианты картинок всех постов, у которых '
+        'их ещё нет, и записывает размеры картинок, загруженных до того, '
+        'как их стали записывать при загрузке'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+            help='Число процессов; 0 — создавать в текущем процессе',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only(
+            'pk', 'image', 'image_width', 'author', 'group'
+        ).iterator()
+        missing = {}
+        unmeasured = {}
+        scopes = set()
+        # Варианты ищутся пачками: одно обращение к кешу и базе на пачку
+        while True:
+            batch = list(islice(posts, BATCH_SIZE))
+            if not batch:
+                break
+            processed = images.lookup(post.image.name for post in batch)
+            for post in batch:
+                if post.image_width is None:
+                    unmeasured.setdefault(post.image.name, post)
+                    scopes.update(thumbnails.post_scopes(post))
+                if post.image.name not in processed:
+                    missing.setdefault(post.image.name, post)
+                    scopes.update(thumbnails.post_scopes(post))
+        for name in unmeasured:
+            self.measure(name)
+        names = list(missing)
+        workers = options['workers']
+        if workers:
+            with thumbnails.make_executor(workers) as executor:
+                failed = self.store(names, [
+                    executor.submit(thumbnails.process, name).result
+                    for name in names
+                ])
+        else:
+            failed = self.store(names, [
+                partial(thumbnails.process, name) for name in names
+            ])
+        feed_cache.bump(*scopes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(names) - failed}, '
+            f'с ошибкой: {failed}, измерено: {len(unmeasured)}'
+        ))
+
+    def measure(self, name):
+        try:
+            with content_storage.open(name) as file_:
+                width, height, placeholder = images.measure(file_)
+        except (OSError, SyntaxError, ValueError) as error:
+            self.stderr.write(f'{name}: {error}')
+            return
+        Post.objects.filter(image=name).update(
+            image_width=width,
+            image_height=height,
+            image_placeholder=placeholder,
+        )
+
+    def store(self, names, results):
+        """
+        Записывает варианты; картинки с ошибкой помечаются
+        (thumbnails.mark_failed), остальные обрабатываются дальше.
+        """
+        failed = 0
+        for name, result in zip(names, results):
+            try:
+                thumbnails.store_processed(name, result())
+            except Exception as error:
+                thumbnails.mark_failed(name)
+                self.stderr.write(f'{name}: {error}')
+                failed += 1
+        return failed
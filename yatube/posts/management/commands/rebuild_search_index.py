@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import search
+from posts.models import Comment, Group, Post
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс постов, комментариев и групп'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько документов записывать за раз',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        index = search.get_index()
+        total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            index.clear(cursor)
+            batch = []
+            for document in search.documents(Post, Comment, Group):
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    index.update(cursor, batch)
+                    total += len(batch)
+                    batch = []
+            index.update(cursor, batch)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'В индексе документов: {total}'
+        ))
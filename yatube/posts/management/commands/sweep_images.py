@@ -0,0 +1,65 @@
+import os
+import posixpath
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.storage import content_storage
+from posts import thumbnails
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+def stored_names(directory):
+    """Имена всех файлов каталога хранилища, с подкаталогами."""
+    directories, files = content_storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for child in directories:
+        yield from stored_names(posixpath.join(directory, child))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки, на которые не ссылается ни один пост: '
+        'thumbnails.release оставляет те, что недавно загружали снова'
+    )
+
+    def handle(self, *args, **options):
+        upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+        if not content_storage.exists(upload_to):
+            return
+        names = stored_names(upload_to)
+        deleted = 0
+        while True:
+            batch = list(islice(names, BATCH_SIZE))
+            if not batch:
+                break
+            batch = [
+                name for name in map(self.restore, batch) if name is not None
+            ]
+            referenced = set(Post.objects.filter(
+                image__in=batch
+            ).values_list('image', flat=True))
+            for name in batch:
+                if name not in referenced and thumbnails.release(name):
+                    deleted += 1
+        self.stdout.write(self.style.SUCCESS(f'Удалено картинок: {deleted}'))
+
+    def restore(self, name):
+        """
+        Возвращает имя файлу, оставшемуся переименованным после сбоя
+        в release; None — если release с ним ещё работает.
+        """
+        if not name.endswith(thumbnails.RELEASED_SUFFIX):
+            return name
+        path = content_storage.path(name)
+        # Переименование меняет st_ctime, но не st_mtime
+        if os.stat(path).st_ctime > time.time() - settings.IMAGE_RELEASE_GRACE:
+            return None
+        original = name[:-len(thumbnails.RELEASED_SUFFIX)]
+        os.replace(path, content_storage.path(original))
+        return original
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:46
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    # get_or_create без уникального индекса мог создать одинаковые теги
+    Tag = apps.get_model('posts', 'Tag')
+    TagPost = apps.get_model('posts', 'TagPost')
+    duplicates = Tag.objects.values('name').annotate(
+        first=Min('pk'), count=Count('pk')
+    ).filter(count__gt=1)
+    for row in duplicates:
+        TagPost.objects.filter(tag__name=row['name']).update(tag=row['first'])
+        Tag.objects.filter(name=row['name']).exclude(pk=row['first']).delete()
+    links = TagPost.objects.values('post', 'tag').annotate(
+        first=Min('pk'), count=Count('pk')
+    ).filter(count__gt=1)
+    for row in links:
+        TagPost.objects.filter(
+            post=row['post'], tag=row['tag']
+        ).exclude(pk=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='tagpost',
+            constraint=models.UniqueConstraint(fields=('post', 'tag'), name='unique_post_tag'),
+        ),
+    ]
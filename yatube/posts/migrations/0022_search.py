@@ -0,0 +1,31 @@
+from django.db import migrations
+
+from posts import search
+
+
+def create_index(apps, schema_editor):
+    index = search.get_index(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        index.create(cursor)
+        index.update(cursor, search.documents(
+            apps.get_model('posts', 'Post'),
+            apps.get_model('posts', 'Comment'),
+            apps.get_model('posts', 'Group'),
+        ))
+
+
+def drop_index(apps, schema_editor):
+    index = search.get_index(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        index.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_unique_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
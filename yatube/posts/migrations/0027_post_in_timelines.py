@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_direct_posts(apps, schema_editor):
+    # До сих пор посты популярных авторов подмешивались в ленты целиком,
+    # а пропущенные при публикации посты бывших популярных авторов
+    # не попадали в ленты вовсе
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    popular = AuthorStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values('user')
+    Post.objects.filter(author__in=popular).update(in_timelines=False)
+    Post.objects.filter(
+        author__in=Follow.objects.values('author')
+    ).exclude(
+        pk__in=TimelineEntry.objects.values('post')
+    ).update(in_timelines=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_post_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='in_timelines',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Разложен по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(in_timelines=False), fields=['author', '-pub_date', '-id'], name='post_direct_author_idx'),
+        ),
+        migrations.RunPython(mark_direct_posts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
+from core.storage import content_storage
 
 User = get_user_model()
 
@@ -20,6 +21,9 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Расскажите, о чём эта группа'
     )
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -30,7 +34,7 @@ class Group(models.Model):
 
 
 class Tag(models.Model):
-    name = models.CharField(max_length=32)
+    name = models.CharField(max_length=32, unique=True)
 
     def __str__(self):
         return self.name
@@ -62,18 +66,62 @@ class Post(models.Model):
         verbose_name='Группа',
         help_text='Группа, к которой относится пост. Необязательно.'
     )
+    # Файлы хранятся по хешу содержимого: одинаковые картинки разных
+    # постов — один файл; индекс нужен для подсчёта ссылок на файл
     image = models.ImageField(
         verbose_name='Картинка',
         help_text='Картинка необязательна',
         upload_to='posts/',
-        blank=True
+        storage=content_storage,
+        blank=True,
+        db_index=True,
+    )
+    # Заполняются при загрузке картинки (posts.images.measure):
+    # шаблоны не открывают файл, чтобы узнать его размеры
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False
     )
     tag = models.ManyToManyField(Tag, through='TagPost')
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False
+    )
+    # False — пост популярного автора не разложен по лентам подписчиков
+    # и подмешивается в них при чтении (posts.timeline)
+    in_timelines = models.BooleanField(
+        'Разложен по лентам', default=True, editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты выбираются по (pub_date, id) в обратном порядке,
+        # см. posts.paginator.CursorPaginator
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_direct_author_idx',
+                condition=models.Q(in_timelines=False),
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -109,6 +157,13 @@ class Comment(CreatedModel):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            # id — для страниц комментариев по ключу (created, id)
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_id_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text
@@ -138,14 +193,130 @@ class Follow(models.Model):
                 name='unique_follower'
             ),
         )
+        # Уникальный индекс (user, author) не помогает найти
+        # подписчиков автора
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.user.username}-->@{self.author.username}'
 
 
+class AuthorStats(models.Model):
+    """
+    Счётчики пользователя. Обновляются вместе с постами и подписками,
+    см. posts.counters; расхождения исправляет reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Число подписок', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts_count}'
+
+
 class TagPost(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('post', 'tag'),
+                name='unique_post_tag'
+            ),
+        )
+
     def __str__(self):
         return f'{self.tag} {self.post}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Строка материализованной ленты подписок: пост автора, попавший
+    в ленту подписчика при публикации или при оформлении подписки.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Владелец ленты'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    pub_date = models.DateTimeField('Время публикации поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class ImageVariant(models.Model):
+    """
+    Уменьшенная копия картинки поста в одном из форматов, созданная
+    при загрузке (posts.images). Связана с файлом, а не с постом.
+    """
+    source = models.CharField('Исходная картинка', max_length=255)
+    file = models.CharField('Файл варианта', max_length=255)
+    format = models.CharField('Формат', max_length=8)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    size = models.PositiveIntegerField('Размер файла, байт')
+
+    class Meta:
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('source', 'format', 'width'),
+                name='unique_image_variant'
+            ),
+        )
+
+    def __str__(self):
+        return self.file
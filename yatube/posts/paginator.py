@@ -0,0 +1,375 @@
+import base64
+import binascii
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def encode_cursor(direction, number, pub_date, pk):
+    """Упаковывает позицию в ленте в непрозрачный токен для `?cursor=`."""
+    raw = json.dumps([direction, number, pub_date.isoformat(), pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, number, pub_date, pk = json.loads(
+            base64.urlsafe_b64decode(padded.encode()).decode()
+        )
+        number = int(number)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        return None
+    return direction, number, pub_date, pk
+
+
+class PageRows:
+    """Строки страницы; выбираются из базы при первом обращении."""
+
+    def __init__(self, load):
+        self._load = load
+        self._rows = None
+        self._prepare = []
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = self._load()
+            for prepare in self._prepare:
+                prepare(self._rows)
+        return self._rows
+
+    def prepare(self, callback):
+        """
+        callback(rows) — дозагрузка данных для всей страницы сразу,
+        когда строки будут выбраны.
+        """
+        if self._rows is None:
+            self._prepare.append(callback)
+        else:
+            callback(self._rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинатор по ключу (pub_date, id): страница выбирается условием
+    WHERE по индексу вместо OFFSET, поэтому любая страница стоит
+    столько же, сколько первая.
+
+    Пагинатор создаётся на один запрос и помнит выданную страницу:
+    `num_pages` — сколько страниц известно без COUNT(*), а ссылки на
+    соседние страницы лежат в `next_cursor` и `previous_cursor`.
+    Строки страницы выбираются при первом обращении к ней, так что
+    страница, отрисованная из кеша шаблона, не стоит ни одного
+    запроса. Точный `count` остаётся доступен, но считается только
+    при явном обращении.
+
+    `key` — поля, по которым идёт выборка; их значения обязаны
+    совпадать с `pub_date` и `pk` поста (например, поля записи
+    материализованной ленты).
+    """
+    key = ('pub_date', 'id')
+
+    def __init__(self, object_list, per_page, count_limit=None, key=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_limit = count_limit
+        if key is not None:
+            self.key = key
+        self.ordering = tuple(f'-{field}' for field in self.key)
+        self._page = None
+        self._known_pages = None
+        self._next_cursor = None
+        self._previous_cursor = None
+
+    def _evaluate(self):
+        if self._page is not None:
+            len(self._page.object_list)
+
+    @property
+    def num_pages(self):
+        if self._page is None:
+            return super().num_pages
+        self._evaluate()
+        return self._known_pages
+
+    @property
+    def next_cursor(self):
+        self._evaluate()
+        return self._next_cursor
+
+    @property
+    def previous_cursor(self):
+        self._evaluate()
+        return self._previous_cursor
+
+    @cached_property
+    def approximate_count(self):
+        """Количество объектов, но не больше `count_limit`."""
+        if not self.count_limit:
+            return None
+        # Порядок не влияет на результат, а без него подойдёт любой индекс
+        unordered = self.object_list.order_by()
+        return unordered[:self.count_limit].count()
+
+    @property
+    def count_is_exact(self):
+        return (
+            self.approximate_count is not None
+            and self.approximate_count < self.count_limit
+        )
+
+    def get_page(self, number=None, cursor=None):
+        """
+        Возвращает страницу по курсору, а при его отсутствии — по
+        номеру (старые ссылки вида `?page=N`) или первую страницу.
+        """
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None:
+            direction, number, pub_date, pk = position
+            if direction == BACKWARD:
+                number = max(number, 1)
+                load = partial(self._rows_before, pub_date, pk)
+            else:
+                number = max(number, 2)
+                load = partial(self._rows_after, pub_date, pk)
+        else:
+            try:
+                number = max(int(number), 1)
+            except (TypeError, ValueError):
+                number = 1
+            load = partial(self._rows_at, number)
+        self._page = self._get_page(
+            PageRows(partial(self._load_page, load)), number, self
+        )
+        return self._page
+
+    def _keyset(self, lookup, pub_date, pk):
+        date_field, id_field = self.key
+        return (
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk})
+        )
+
+    def _rows_at(self, number):
+        bottom = (number - 1) * self.per_page
+        rows = list(
+            self.object_list.order_by(*self.ordering)[
+                bottom:bottom + self.per_page + 1
+            ]
+        )
+        return rows[:self.per_page], len(rows) > self.per_page, None
+
+    def _rows_after(self, pub_date, pk):
+        rows = list(
+            self.object_list.order_by(*self.ordering).filter(
+                self._keyset('lt', pub_date, pk)
+            )[:self.per_page + 1]
+        )
+        return rows[:self.per_page], len(rows) > self.per_page, None
+
+    def _rows_before(self, pub_date, pk):
+        rows = list(
+            self.object_list.order_by(*self.key).filter(
+                self._keyset('gt', pub_date, pk)
+            )[:self.per_page + 1]
+        )
+        # Лишняя строка означает, что перед страницей есть ещё посты
+        is_first = len(rows) <= self.per_page
+        return rows[:self.per_page][::-1], True, is_first
+
+    def _load_page(self, load):
+        rows, has_next, is_first = load()
+        page = self._page
+        if is_first:
+            page.number = 1
+        elif is_first is False:
+            page.number = max(page.number, 2)
+        number = page.number
+        self._known_pages = number + 1 if has_next else number
+        if has_next and rows:
+            last = rows[-1]
+            self._next_cursor = encode_cursor(
+                FORWARD, number + 1, last.pub_date, last.pk
+            )
+        if number > 1 and rows:
+            first = rows[0]
+            self._previous_cursor = encode_cursor(
+                BACKWARD, number - 1, first.pub_date, first.pk
+            )
+        return rows
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """
+    CursorPaginator по нескольким лентам сразу. `sources` — пары
+    (queryset, key): каждая лента выбирается по своему индексу
+    с LIMIT, а страницы сливаются по (pub_date, id) в памяти, так что
+    база не сортирует объединение лент целиком.
+    """
+
+    def __init__(self, sources, per_page, count_limit=None, **kwargs):
+        super().__init__(
+            sources[0][0], per_page, count_limit=count_limit, **kwargs
+        )
+        self.sources = sources
+
+    def _paginators(self, per_page):
+        return [
+            CursorPaginator(posts, per_page, key=key)
+            for posts, key in self.sources
+        ]
+
+    @staticmethod
+    def _sorted(rows):
+        return sorted(rows, key=lambda post: (post.pub_date, post.pk))
+
+    @cached_property
+    def approximate_count(self):
+        if not self.count_limit:
+            return None
+        return min(
+            sum(
+                posts.order_by()[:self.count_limit].count()
+                for posts, _ in self.sources
+            ),
+            self.count_limit,
+        )
+
+    @cached_property
+    def count(self):
+        return sum(posts.count() for posts, _ in self.sources)
+
+    def _rows_at(self, number):
+        # Для ?page=N из каждой ленты нужны все строки до страницы
+        top = number * self.per_page
+        rows = []
+        has_next = False
+        for paginator in self._paginators(top):
+            source_rows, source_next, _ = paginator._rows_at(1)
+            rows += source_rows
+            has_next = has_next or source_next
+        rows = self._sorted(rows)[::-1]
+        has_next = has_next or len(rows) > top
+        return rows[top - self.per_page:top], has_next, None
+
+    def _rows_after(self, pub_date, pk):
+        rows = []
+        has_next = False
+        for paginator in self._paginators(self.per_page):
+            source_rows, source_next, _ = paginator._rows_after(pub_date, pk)
+            rows += source_rows
+            has_next = has_next or source_next
+        rows = self._sorted(rows)[::-1]
+        has_next = has_next or len(rows) > self.per_page
+        return rows[:self.per_page], has_next, None
+
+    def _rows_before(self, pub_date, pk):
+        rows = []
+        is_first = True
+        for paginator in self._paginators(self.per_page):
+            source_rows, _, source_first = paginator._rows_before(
+                pub_date, pk
+            )
+            rows += source_rows
+            is_first = is_first and source_first
+        # Ближайшие к курсору строки — самые ранние
+        rows = self._sorted(rows)
+        is_first = is_first and len(rows) <= self.per_page
+        return rows[:self.per_page][::-1], True, is_first
+
+
+def paginate(request, posts, key=None):
+    """Общая пагинация для лент постов."""
+    paginator = CursorPaginator(
+        posts,
+        settings.POSTS_PER_PAGE,
+        count_limit=settings.POSTS_COUNT_LIMIT,
+        key=key,
+    )
+    return _get_page(request, paginator)
+
+
+def paginate_merged(request, sources):
+    """paginate для нескольких лент (queryset, key), слитых в одну."""
+    if len(sources) == 1:
+        return paginate(request, *sources[0])
+    paginator = MergedCursorPaginator(
+        sources,
+        settings.POSTS_PER_PAGE,
+        count_limit=settings.POSTS_COUNT_LIMIT,
+    )
+    return _get_page(request, paginator)
+
+
+def _get_page(request, paginator):
+    page_obj = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor'),
+    )
+    return paginator, page_obj
+
+
+class PostCursorPagination(BasePagination):
+    """
+    Курсорная пагинация API на CursorPaginator: `?cursor=` из ссылок
+    next/previous и `?page_size=` не больше API_MAX_PAGE_SIZE.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.API_PAGE_SIZE
+        return min(max(size, 1), settings.API_MAX_PAGE_SIZE)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.paginator = CursorPaginator(
+            queryset, self.get_page_size(request)
+        )
+        page = self.paginator.get_page(
+            cursor=request.query_params.get(self.cursor_query_param)
+        )
+        return list(page.object_list)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.paginator.next_cursor),
+            'previous': self.get_link(self.paginator.previous_cursor),
+            'results': data,
+        })
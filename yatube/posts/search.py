@@ -0,0 +1,289 @@
+"""
+Полнотекстовый поиск по постам, комментариям и названиям групп.
+
+Индекс — отдельная таблица posts_search: в PostgreSQL документы
+хранятся в колонке tsvector с GIN-индексом, в SQLite — в виртуальной
+таблице FTS5. Id документа кодирует тип и pk объекта, поэтому правка
+и удаление затрагивают одну строку по первичному ключу. Сигналы
+обновляют индекс в той же транзакции, что и сам объект, команда
+rebuild_search_index пересобирает его целиком. Другую реализацию
+индекса можно подключить настройкой SEARCH_INDEX.
+
+Результаты упорядочены по релевантности (rank: меньше — лучше)
+и листаются курсором по паре (rank, id документа).
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from posts.models import Comment, Group, Post
+
+POST = 'post'
+COMMENT = 'comment'
+GROUP = 'group'
+KINDS = (POST, COMMENT, GROUP)
+
+# Больше слов в запросе не нужно, а каждое усложняет план
+MAX_TERMS = 8
+
+
+def doc_id(kind, pk):
+    return pk * len(KINDS) + KINDS.index(kind)
+
+
+def split_doc_id(value):
+    pk, kind = divmod(value, len(KINDS))
+    return KINDS[kind], pk
+
+
+def normalize(text):
+    # Ни FTS5, ни словари PostgreSQL не считают «ё» и «е» одной буквой
+    return text.lower().replace('ё', 'е')
+
+
+def terms(query):
+    return re.findall(r'\w+', normalize(query))[:MAX_TERMS]
+
+
+class SearchIndex:
+    """Индекс в таблице `table`; методы получают курсор базы."""
+    table = 'posts_search'
+
+    def create(self, cursor):
+        raise NotImplementedError
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {self.table}')
+
+    def delete(self, cursor, doc_ids):
+        if doc_ids:
+            placeholders = ', '.join(['%s'] * len(doc_ids))
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE {self.id_column} '
+                f'IN ({placeholders})',
+                list(doc_ids),
+            )
+
+    def update(self, cursor, documents):
+        """Добавляет или заменяет документы: пары (id, текст)."""
+        raise NotImplementedError
+
+    def search(self, cursor, words, after, limit):
+        """
+        Пары (rank, id) документов со всеми словами `words`
+        (по префиксу), следующие за позицией `after`.
+        """
+        raise NotImplementedError
+
+    def keyset(self, after):
+        if after is None:
+            return '', []
+        rank, value = after
+        return (
+            'WHERE rank > %s OR (rank = %s AND doc_id > %s)',
+            [rank, rank, value],
+        )
+
+
+class SqliteIndex(SearchIndex):
+    id_column = 'rowid'
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE {self.table} USING fts5('
+            "body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def update(self, cursor, documents):
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {self.table} (rowid, body) '
+            'VALUES (%s, %s)',
+            [(value, normalize(text)) for value, text in documents],
+        )
+
+    def search(self, cursor, words, after, limit):
+        match = ' '.join(f'"{word}"*' for word in words)
+        where, params = self.keyset(after)
+        cursor.execute(
+            f'SELECT rank, doc_id FROM ('
+            f'SELECT bm25({self.table}) AS rank, rowid AS doc_id '
+            f'FROM {self.table} WHERE {self.table} MATCH %s'
+            f') {where} ORDER BY rank, doc_id LIMIT %s',
+            [match, *params, limit],
+        )
+        return cursor.fetchall()
+
+
+class PostgresIndex(SearchIndex):
+    id_column = 'id'
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE {self.table} ('
+            'id bigint PRIMARY KEY, document tsvector NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX {self.table}_document ON {self.table} '
+            'USING gin (document)'
+        )
+
+    def update(self, cursor, documents):
+        cursor.executemany(
+            f'INSERT INTO {self.table} (id, document) '
+            'VALUES (%s, to_tsvector(%s::regconfig, %s)) '
+            'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document',
+            [
+                (value, settings.SEARCH_CONFIG, normalize(text))
+                for value, text in documents
+            ],
+        )
+
+    def keyset(self, after):
+        # ts_rank возвращает float4, а в курсоре — float из Python:
+        # сравнивать их как есть нельзя, ранг приводится к float8
+        if after is None:
+            return '', []
+        rank, value = after
+        return (
+            'WHERE rank > %s::float8 '
+            'OR (rank = %s::float8 AND doc_id > %s)',
+            [rank, rank, value],
+        )
+
+    def search(self, cursor, words, after, limit):
+        query = ' & '.join(f'{word}:*' for word in words)
+        where, params = self.keyset(after)
+        cursor.execute(
+            f'SELECT rank, doc_id FROM ('
+            f'SELECT -ts_rank(document, query)::float8 AS rank, '
+            f'id AS doc_id '
+            f'FROM {self.table}, to_tsquery(%s::regconfig, %s) query '
+            f'WHERE document @@ query'
+            f') found {where} ORDER BY rank, doc_id LIMIT %s',
+            [settings.SEARCH_CONFIG, query, *params, limit],
+        )
+        return cursor.fetchall()
+
+
+INDEXES = {
+    'sqlite': SqliteIndex,
+    'postgresql': PostgresIndex,
+}
+
+
+def get_index(vendor=None):
+    if settings.SEARCH_INDEX:
+        return import_string(settings.SEARCH_INDEX)()
+    vendor = vendor or connection.vendor
+    if vendor not in INDEXES:
+        raise ImproperlyConfigured(
+            f'Нет поискового индекса для {vendor}, задайте SEARCH_INDEX'
+        )
+    return INDEXES[vendor]()
+
+
+def documents(post_model, comment_model, group_model):
+    """Все документы индекса: пары (id, текст)."""
+    sources = (
+        (POST, post_model, 'text'),
+        (COMMENT, comment_model, 'text'),
+        (GROUP, group_model, 'title'),
+    )
+    for kind, model, field in sources:
+        rows = model.objects.order_by().values_list('pk', field)
+        for pk, text in rows.iterator():
+            yield doc_id(kind, pk), text
+
+
+def index(kind, objects):
+    """Добавляет в индекс пары (pk, текст) объектов типа `kind`."""
+    with connection.cursor() as cursor:
+        get_index().update(
+            cursor, [(doc_id(kind, pk), text) for pk, text in objects]
+        )
+
+
+def unindex(kind, pks):
+    with connection.cursor() as cursor:
+        get_index().delete(cursor, [doc_id(kind, pk) for pk in pks])
+
+
+def encode_cursor(rank, value):
+    raw = json.dumps([rank, value])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Позиция (rank, id) или None для пустого и битого курсора."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rank, value = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rank), int(value)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def _load(found):
+    """Объекты найденных документов: {(тип, pk): (текст, url)}."""
+    ids = {kind: [] for kind in KINDS}
+    for _, value in found:
+        kind, pk = split_doc_id(value)
+        ids[kind].append(pk)
+    loaded = {}
+    if ids[POST]:
+        for pk, text in Post.objects.filter(
+            pk__in=ids[POST]
+        ).values_list('pk', 'text'):
+            url = reverse('posts:post_detail', kwargs={'post_id': pk})
+            loaded[POST, pk] = text, url
+    if ids[COMMENT]:
+        for pk, text, post_id in Comment.objects.filter(
+            pk__in=ids[COMMENT]
+        ).values_list('pk', 'text', 'post'):
+            url = reverse('posts:post_detail', kwargs={'post_id': post_id})
+            loaded[COMMENT, pk] = text, url
+    if ids[GROUP]:
+        for pk, title, slug in Group.objects.filter(
+            pk__in=ids[GROUP]
+        ).values_list('pk', 'title', 'slug'):
+            url = reverse('posts:group_posts', kwargs={'slug': slug})
+            loaded[GROUP, pk] = title, url
+    return loaded
+
+
+def search(query, cursor=None, limit=10):
+    """
+    Страница результатов: список словарей (type, id, text, url)
+    и курсор следующей страницы или None.
+    """
+    words = terms(query)
+    if not words:
+        return [], None
+    with connection.cursor() as db_cursor:
+        found = get_index().search(
+            db_cursor, words, decode_cursor(cursor), limit + 1
+        )
+    has_next = len(found) > limit
+    found = found[:limit]
+    loaded = _load(found)
+    hits = []
+    for _, value in found:
+        kind, pk = split_doc_id(value)
+        # Документы удалённых в обход сигналов объектов пропускаем
+        if (kind, pk) in loaded:
+            text, url = loaded[kind, pk]
+            hits.append({'type': kind, 'id': pk, 'text': text, 'url': url})
+    next_cursor = encode_cursor(*found[-1]) if has_next else None
+    return hits, next_cursor
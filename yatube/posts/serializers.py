@@ -1,14 +1,39 @@
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
-from posts.models import Post, Group, TagPost, Tag
+from posts import images, tags
+from posts.models import Comment, Post, Group, Tag, TagPost
 
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
         fields = ('name',)
+        # Существующие теги тоже можно указывать у поста
+        extra_kwargs = {'name': {'validators': []}}
+
+
+class PostImageField(serializers.ImageField):
+    """Загрузка — как у ImageField, а в ответе вариант картинки."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        variants = images.lookup([value.name]).get(value.name)
+        url = images.public_url(
+            value, variants, max(settings.IMAGE_VARIANT_WIDTHS)
+        )
+        request = self.context.get('request')
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
 
 
 class PostSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: PostImageField,
+    }
     group = serializers.SlugRelatedField(slug_field='slug',
             queryset=Group.objects.all(), required=False)
     tag = TagSerializer(many=True, required=False)
@@ -21,16 +46,141 @@ class PostSerializer(serializers.ModelSerializer):
         'character_quantity', 'publication_date')
         model = Post
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Разреженный набор полей: ?fields=id,text
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def create(self, validated_data):
-        if 'tag' not in self.initial_data:
-            post = Post.objects.create(**validated_data)
-            return post
-        tags = validated_data.pop('tag')
+        names = self.pop_tags(validated_data)
         post = Post.objects.create(**validated_data)
-        for tag in tags:
-            current_tag, status = Tag.objects.get_or_create(**tag)
-            TagPost.objects.create(tag=current_tag, post=post)
+        if names:
+            tags.set_tags(post, names)
+        return post
+
+    def update(self, instance, validated_data):
+        names = self.pop_tags(validated_data)
+        post = super().update(instance, validated_data)
+        # Без поля tag (частичное обновление) теги не меняются
+        if names is not None:
+            tags.set_tags(post, names, replace=True)
         return post
 
+    def pop_tags(self, validated_data):
+        if 'tag' not in validated_data:
+            return None
+        return [tag['name'] for tag in validated_data.pop('tag')]
+
     def get_character_quantity(self, obj):
         return len(obj.text)
+
+
+class CommentSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        fields = ('id', 'post', 'author', 'text', 'created')
+        model = Comment
+
+
+class PostRowSerializer:
+    """
+    Чтение постов без ModelSerializer: строки values_list вместо
+    моделей, теги всей страницы одним запросом. Выдаёт то же, что
+    PostSerializer с тегами в порядке id (см. PostViewSet), с учётом
+    ?fields=.
+    """
+    datetime = serializers.DateTimeField()
+    # Колонки values_list для полей ответа; pk и pub_date нужны курсору
+    columns = {
+        'text': ('text',),
+        'author': ('author',),
+        'image': ('image',),
+        'group': ('group__slug',),
+        'character_quantity': ('text',),
+    }
+
+    def __init__(self, request, fields=None):
+        self.request = request
+        self.fields = [
+            name for name in PostSerializer.Meta.fields
+            if fields is None or name in fields
+        ]
+        # ?image_width=640 — наименьший вариант не уже 640 в формате
+        # ?image_format= (по умолчанию JPEG), без него — самый широкий.
+        # Исходный файл с EXIF не отдаётся (images.capped_url)
+        params = request.query_params
+        self.image_width = max(settings.IMAGE_VARIANT_WIDTHS)
+        if params.get('image_width'):
+            try:
+                self.image_width = int(params['image_width'])
+            except ValueError:
+                self.image_width = 0
+            if self.image_width <= 0:
+                raise serializers.ValidationError(
+                    {'image_width': 'Нужно целое число больше нуля'}
+                )
+        self.image_format = params.get('image_format', images.FALLBACK)
+        if self.image_format not in images.FORMATS:
+            raise serializers.ValidationError({
+                'image_format': f'Один из: {", ".join(images.FORMATS)}'
+            })
+
+    def rows(self, queryset):
+        columns = ['pk', 'pub_date']
+        for name in self.fields:
+            for column in self.columns.get(name, ()):
+                if column not in columns:
+                    columns.append(column)
+        return queryset.select_related(None).prefetch_related(
+            None
+        ).values_list(*columns, named=True)
+
+    def tags(self, rows):
+        if 'tag' not in self.fields:
+            return {}
+        tags = {}
+        links = TagPost.objects.filter(
+            post__in=[row.pk for row in rows]
+        ).order_by('post_id', 'tag_id').values_list('post', 'tag__name')
+        for post_id, name in links:
+            tags.setdefault(post_id, []).append({'name': name})
+        return tags
+
+    def variants(self, rows):
+        if 'image' not in self.fields:
+            return {}
+        return images.lookup(row.image for row in rows)
+
+    def image(self, name, variants=None):
+        if not name:
+            return None
+        field = Post._meta.get_field('image')
+        url = images.public_url(
+            field.attr_class(None, field, name), variants,
+            self.image_width, self.image_format,
+        )
+        return self.request.build_absolute_uri(url)
+
+    def to_representation(self, rows):
+        tags = self.tags(rows)
+        variants = self.variants(rows)
+        date = self.datetime.to_representation
+        getters = {
+            'id': lambda row: row.pk,
+            'text': lambda row: row.text,
+            'author': lambda row: row.author,
+            'image': lambda row: self.image(
+                row.image, variants.get(row.image)
+            ),
+            'pub_date': lambda row: date(row.pub_date),
+            'group': lambda row: row.group__slug,
+            'tag': lambda row: tags.get(row.pk, []),
+            'character_quantity': lambda row: len(row.text),
+            'publication_date': lambda row: date(row.pub_date),
+        }
+        selected = [(name, getters[name]) for name in self.fields]
+        return [
+            {name: getter(row) for name, getter in selected} for row in rows
+        ]
@@ -0,0 +1,237 @@
+import logging
+import threading
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from posts import (
+    counters, feed_cache, images, search, tags, threads, thumbnails,
+    timeline,
+)
+from posts.models import Comment, Follow, Group, Post, Tag
+
+logger = logging.getLogger(__name__)
+
+# Посты, которые сейчас удаляются в этом потоке
+_deleting_posts = threading.local()
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, raw=False, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков."""
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    Новая картинка уходит на создание вариантов после коммита,
+    прежняя удаляется, если на неё больше никто не ссылается.
+    """
+    previous = getattr(instance, '_previous_image', None)
+    if raw or instance.image.name == previous:
+        return
+    if instance.image:
+        transaction.on_commit(partial(thumbnails.schedule, instance))
+    if previous:
+        transaction.on_commit(partial(thumbnails.release, previous))
+
+
+@receiver(post_delete, sender=Post)
+def post_image_released(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(
+            partial(thumbnails.release, instance.image.name)
+        )
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    """
+    Запоминает прежние группу и автора: их ленты и счётчики
+    тоже изменятся; и прежнюю картинку.
+    """
+    if instance.pk and not raw:
+        previous = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'author_id', 'image').first()
+        if previous is not None:
+            (instance._previous_group_id,
+             instance._previous_author_id,
+             instance._previous_image) = previous
+
+
+@receiver(pre_save, sender=Post)
+def post_image_measured(sender, instance, raw=False, **kwargs):
+    """Размеры и заглушка новой картинки — из загруженного файла."""
+    if raw:
+        return
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+    elif not instance.image._committed:
+        try:
+            (instance.image_width,
+             instance.image_height,
+             instance.image_placeholder) = images.measure(instance.image)
+        except (OSError, SyntaxError, ValueError):
+            logger.exception(
+                'Не удалось прочитать картинку %s', instance.image.name
+            )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    groups = {instance.group_id, getattr(instance, '_previous_group_id', None)}
+    authors = {
+        instance.author_id, getattr(instance, '_previous_author_id', None)
+    }
+    feed_cache.bump_on_commit(
+        feed_cache.GLOBAL,
+        (feed_cache.POST, instance.pk),
+        *((feed_cache.AUTHOR, pk) for pk in authors if pk is not None),
+        *((feed_cache.GROUP, pk) for pk in groups if pk is not None),
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_in_timelines_changed(sender, instance, raw=False, **kwargs):
+    """
+    Ленты подписок кешируются по версии подписчика: разложенный пост
+    обновляет версии подписчиков автора (в фоне, после коммита).
+    """
+    if raw or not instance.in_timelines:
+        return
+    authors = {
+        instance.author_id, getattr(instance, '_previous_author_id', None)
+    }
+    for pk in authors - {None}:
+        timeline.refresh_on_commit(pk)
+
+
+@receiver(post_save, sender=Post)
+def post_counted(sender, instance, created, **kwargs):
+    if created:
+        counters.add_to_author(instance.author_id, posts_count=1)
+        counters.add_to_group(instance.group_id, 1)
+        return
+    if not hasattr(instance, '_previous_author_id'):
+        return
+    if instance._previous_author_id != instance.author_id:
+        counters.add_to_author(instance._previous_author_id, posts_count=-1)
+        counters.add_to_author(instance.author_id, posts_count=1)
+    if instance._previous_group_id != instance.group_id:
+        counters.add_to_group(instance._previous_group_id, -1)
+        counters.add_to_group(instance.group_id, 1)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Комментарии удаляются каскадом раньше поста: счётчик поста
+    # уходит вместе с ним, вычитать их по одному незачем
+    _deleting_posts.ids = getattr(_deleting_posts, 'ids', set())
+    _deleting_posts.ids.add(instance.pk)
+    # Записи лент удаляются каскадом вместе с постом
+    if instance.in_timelines:
+        timeline.refresh_on_commit(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_uncounted(sender, instance, **kwargs):
+    _deleting_posts.ids.discard(instance.pk)
+    counters.add_to_author(instance.author_id, posts_count=-1)
+    counters.add_to_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Название группы выводится в карточках постов общей ленты
+    feed_cache.bump_on_commit(
+        feed_cache.GLOBAL, (feed_cache.GROUP, instance.pk)
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    feed_cache.bump_on_commit((feed_cache.POST, instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_threaded(sender, instance, created, raw=False, **kwargs):
+    """Новый комментарий дописывается в закешированную страницу."""
+    if raw:
+        return
+    if created:
+        transaction.on_commit(partial(threads.append, instance))
+    else:
+        threads.invalidate(instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_counted(sender, instance, created, **kwargs):
+    if created:
+        counters.add_to_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_uncounted(sender, instance, **kwargs):
+    if instance.post_id not in getattr(_deleting_posts, 'ids', ()):
+        counters.add_to_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    feed_cache.bump_on_commit(
+        (feed_cache.FOLLOWER, instance.user_id),
+        (feed_cache.FOLLOWS, instance.user_id),
+        (feed_cache.FOLLOWS, instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_counted(sender, instance, created, **kwargs):
+    if created:
+        counters.add_to_author(instance.author_id, followers_count=1)
+        counters.add_to_author(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_uncounted(sender, instance, **kwargs):
+    counters.add_to_author(instance.author_id, followers_count=-1)
+    counters.add_to_author(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, **kwargs):
+    search.index(search.POST, [(instance.pk, instance.text)])
+
+
+@receiver(post_save, sender=Comment)
+def comment_indexed(sender, instance, **kwargs):
+    search.index(search.COMMENT, [(instance.pk, instance.text)])
+
+
+@receiver(post_save, sender=Group)
+def group_indexed(sender, instance, **kwargs):
+    search.index(search.GROUP, [(instance.pk, instance.title)])
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Group)
+def unindexed(sender, instance, **kwargs):
+    search.unindex(sender._meta.model_name, [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    tags.lookup.forget(instance.name)
@@ -0,0 +1,54 @@
+"""
+Теги постов.
+
+Соответствие имени тега и его id кешируется в памяти процесса
+(последние TAG_CACHE_SIZE имён), поэтому теги поста записываются
+за постоянное число запросов при любом их количестве: один IN по
+незнакомым именам, один bulk_create недостающих тегов и один —
+недостающих связей с постом. Тег, удалённый в другом процессе,
+остаётся в кеше этого, поэтому найденные id проверяются ещё одним
+IN по первичному ключу, и устаревшие имена ищутся заново.
+"""
+from django.conf import settings
+
+from posts.bulk import Lookup
+from posts.models import Tag, TagPost
+
+lookup = Lookup(
+    Tag, 'name', lambda name: Tag(name=name),
+    max_size=settings.TAG_CACHE_SIZE,
+)
+
+
+def set_tags(post, names, replace=False):
+    """
+    Привязывает к посту теги с именами `names`, создавая недостающие.
+    При replace снимает с поста остальные теги.
+    """
+    ids = list(_resolve(set(names)).values())
+    if replace:
+        TagPost.objects.filter(post=post).exclude(tag__in=ids).delete()
+    if ids:
+        TagPost.objects.bulk_create(
+            [TagPost(post=post, tag_id=tag_id) for tag_id in ids],
+            ignore_conflicts=True,
+        )
+
+
+def _resolve(names):
+    """
+    Id тегов по именам (lookup) с проверкой одним запросом, что они
+    ещё существуют; имена удалённых тегов забываются и ищутся заново.
+    """
+    ids = lookup.resolve(names)
+    if not ids:
+        return ids
+    existing = set(
+        Tag.objects.filter(pk__in=ids.values()).values_list('pk', flat=True)
+    )
+    stale = [name for name, pk in ids.items() if pk not in existing]
+    for name in stale:
+        lookup.forget(name)
+    if stale:
+        ids.update(lookup.resolve(stale))
+    return ids
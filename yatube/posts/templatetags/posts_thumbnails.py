@@ -0,0 +1,28 @@
+from django import template
+
+from posts import images
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, sizes='100vw', css_class='', loading='lazy'):
+    """
+    <picture> со всеми вариантами картинки поста в srcset — браузер
+    выбирает ширину по `sizes`; пока вариантов нет — копия картинки
+    без метаданных (images.capped_url).
+    В лентах картинки всей страницы уже найдены (thumbnails.resolve),
+    отдельный пост ищет свои варианты сам.
+    """
+    if not post.image:
+        return {'image': None}
+    image = getattr(post, 'picture', None)
+    if image is None:
+        variants = images.lookup([post.image.name]).get(post.image.name)
+        image = images.picture(post, variants)
+    return {
+        'image': image,
+        'sizes': sizes,
+        'css_class': css_class,
+        'loading': loading,
+    }
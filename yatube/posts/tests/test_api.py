@@ -0,0 +1,176 @@
+import shutil
+import tempfile
+from collections import OrderedDict
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
+from core import renderers
+from posts.models import Group, Post, Tag, TagPost
+from posts.serializers import PostSerializer
+
+User = get_user_model()
+
+URL = '/api/v1/posts/'
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(API_PAGE_SIZE=3)
+class PostsApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.tag = Tag.objects.create(name='тег')
+        for number in range(7):
+            post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый пост {number}',
+                group=cls.group,
+            )
+            TagPost.objects.create(tag=cls.tag, post=post)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_cursor_pagination(self):
+        """Курсоры next/previous обходят все посты без пропусков."""
+        response = self.client.get(URL)
+        texts = [post['text'] for post in response.json()['results']]
+        self.assertIsNone(response.json()['previous'])
+        pages = [response.json()]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+            texts += [post['text'] for post in pages[-1]['results']]
+        self.assertEqual(
+            texts, [f'Тестовый пост {number}' for number in range(6, -1, -1)]
+        )
+        self.assertEqual(len(pages), 3)
+        previous = self.client.get(pages[-1]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+        response = self.client.get(URL, {'page_size': 100})
+        self.assertEqual(len(response.json()['results']), 7)
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только запрошенные поля."""
+        response = self.client.get(URL, {'fields': 'id,text'})
+        for post in response.json()['results']:
+            self.assertEqual(set(post), {'id', 'text'})
+        response = self.client.get(URL, {'fields': 'id,bogus'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """
+        Группы и теги выбираются для всей страницы сразу и только
+        если их поля запрошены; ещё один запрос — дата Last-Modified.
+        """
+        for fields, expected in (('', 3), ('id,text,author', 2)):
+            for size in (1, 7):
+                with self.subTest(fields=fields, size=size):
+                    with CaptureQueriesContext(connection) as queries:
+                        self.client.get(
+                            URL, {'fields': fields, 'page_size': size}
+                        )
+                    self.assertEqual(len(queries), expected)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostsApiOutputTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(
+            author=cls.author,
+            text='Без группы и тегов',
+        )
+        post = Post.objects.create(
+            author=cls.author,
+            text='Юникод 😀, "кавычки", \\, \u2028 и \t',
+            group=group,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
+        )
+        for name in ('яблоко', 'груша', 'банан'):
+            TagPost.objects.create(
+                tag=Tag.objects.create(name=name), post=post
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def expected(self, response, posts, fields=None):
+        """Ответ, который дали бы PostSerializer и JSONRenderer."""
+        posts = posts.prefetch_related(
+            Prefetch('tag', queryset=Tag.objects.order_by('pk'))
+        )
+        serializer = PostSerializer(
+            posts, many=True, fields=fields,
+            context={'request': response.wsgi_request},
+        )
+        return serializer.data
+
+    def assertSameBytes(self, url, data):
+        response = self.client.get(url)
+        if isinstance(data, list) and 'results' in response.json():
+            data = OrderedDict((
+                ('next', response.json()['next']),
+                ('previous', response.json()['previous']),
+                ('results', data),
+            ))
+        self.assertEqual(response.content, JSONRenderer().render(data))
+
+    def test_same_bytes_as_post_serializer(self):
+        """Список и пост отдаются байт в байт как PostSerializer."""
+        posts = Post.objects.order_by('-pub_date', '-id')
+        for fields in (None, {'id', 'tag', 'image'}):
+            query = f'?fields={",".join(sorted(fields))}' if fields else ''
+            with self.subTest(fields=fields):
+                response = self.client.get(URL)
+                self.assertSameBytes(
+                    URL + query, self.expected(response, posts, fields)
+                )
+                post = posts.first()
+                url = f'{URL}{post.pk}/'
+                self.assertSameBytes(
+                    url + query,
+                    self.expected(response, posts.filter(pk=post.pk),
+                                  fields)[0],
+                )
+
+    def test_renderer_fallback(self):
+        """Без orjson отдаётся тот же ответ."""
+        fast = self.client.get(URL).content
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(self.client.get(URL).content, fast)
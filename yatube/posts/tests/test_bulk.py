@@ -0,0 +1,176 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from posts import search
+from posts.models import (
+    AuthorStats, Comment, Follow, Group, Post, Tag, TagPost,
+    TimelineEntry,
+)
+
+User = get_user_model()
+
+
+class BulkTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.author = User.objects.create_user(username='author')
+        self.user = User.objects.create_user(username='follower')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        self.posts = []
+        for number in range(5):
+            post = Post.objects.create(
+                author=self.author,
+                text=f'Тестовый пост {number}',
+                group=self.group if number % 2 else None,
+            )
+            tag, _ = Tag.objects.get_or_create(name=f'тег{number % 2}')
+            TagPost.objects.create(tag=tag, post=post)
+            self.posts.append(post)
+        Comment.objects.create(
+            post=self.posts[0], author=self.user, text='Комментарий'
+        )
+
+    def export(self, **options):
+        stream = StringIO()
+        call_command('export_posts', stdout=stream, batch_size=2, **options)
+        return stream.getvalue()
+
+    def load(self, path, **options):
+        call_command('import_posts', path, stdout=StringIO(), batch_size=2,
+                     **options)
+
+    def clear(self):
+        for model in (Post, Follow, Tag, Group, AuthorStats):
+            model.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_round_trip(self):
+        """
+        Выгрузка и загрузка в пустую базу сохраняют посты, даты, теги,
+        комментарии и подписки, заполняют ленты, счётчики и поисковый
+        индекс.
+        """
+        dump = self.export()
+        expected = list(Post.objects.order_by('pk').values_list(
+            'pk', 'pub_date', 'author__username', 'group__slug', 'text'
+        ))
+        self.clear()
+        path = self.write(dump, 'dump.jsonl')
+        self.load(path)
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'pub_date', 'author__username', 'group__slug', 'text'
+            )),
+            expected,
+        )
+        self.assertEqual(
+            list(TagPost.objects.filter(
+                post=self.posts[1].pk
+            ).values_list('tag__name', flat=True)),
+            ['тег1'],
+        )
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post_id, self.posts[0].pk)
+        self.assertEqual(comment.author.username, 'follower')
+        follower = User.objects.get(username='follower')
+        self.assertTrue(Follow.objects.filter(
+            user=follower, author__username='author'
+        ).exists())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=follower).count(), 5
+        )
+        stats = AuthorStats.objects.get(user__username='author')
+        self.assertEqual(stats.posts_count, 5)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(Group.objects.get().posts_count, 2)
+        self.assertEqual(
+            Post.objects.get(pk=self.posts[0].pk).comments_count, 1
+        )
+        hits, _ = search.search('тестов', limit=10)
+        self.assertCountEqual(
+            [(hit['type'], hit['id']) for hit in hits],
+            [('post', post.pk) for post in self.posts]
+            + [('group', Group.objects.get().pk)],
+        )
+        self.assertEqual(len(search.search('комментарий')[0]), 1)
+
+        self.load(path)
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(TimelineEntry.objects.count(), 5)
+
+    def test_csv(self):
+        """Посты загружаются из CSV, выгруженного по одной модели."""
+        dump = self.export(format='csv', model=['post'])
+        self.clear()
+        self.load(self.write(dump, 'posts.csv'), model='post')
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(Group.objects.get().slug, 'test-slug')
+        with self.assertRaises(CommandError):
+            self.export(format='csv')
+
+    def test_orphan_comments_and_bad_records(self):
+        """
+        Комментарии к несуществующим постам пропускаются, записи
+        неизвестного типа останавливают загрузку.
+        """
+        orphan = {
+            'model': 'comment', 'id': 100, 'post': 999, 'author': 'author',
+            'created': '2022-01-01T00:00:00Z', 'text': 'Комментарий',
+        }
+        self.load(self.write(json.dumps(orphan), 'orphan.jsonl'))
+        self.assertFalse(Comment.objects.filter(pk=100).exists())
+        with self.assertRaises(CommandError):
+            self.load(self.write('{"model": "user"}', 'bad.jsonl'))
+
+    def test_cached_feeds_refreshed(self):
+        """
+        После загрузки закешированные ленты перерисовываются по новым
+        версиям, остальной кеш не сбрасывается.
+        """
+        cache.clear()
+        client = Client()
+        client.force_login(self.user)
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        )
+        for url in pages:
+            client.get(url)
+        cache.set('unrelated', 1)
+        post = {
+            'model': 'post', 'id': 100, 'pub_date': '2030-01-01T00:00:00Z',
+            'author': 'author', 'group': 'test-slug', 'text': 'Загруженный',
+            'image': '', 'tags': [],
+        }
+        with mock.patch('posts.bulk.transaction.on_commit',
+                        lambda callback: callback()):
+            self.load(self.write(json.dumps(post), 'post.jsonl'))
+        for url in pages:
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), 'Загруженный')
+        self.assertEqual(cache.get('unrelated'), 1)
+
+    def write(self, content, name):
+        path = Path(self.tmp, name)
+        path.write_text(content, encoding='utf-8')
+        return str(path)
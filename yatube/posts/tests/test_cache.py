@@ -1,13 +1,17 @@
-# from time import sleep
 from datetime import datetime
+from unittest import mock
+
 from django.urls import reverse
 from django.core.cache import cache
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
-from posts.models import Post
+from posts import feed_cache, timeline
+from posts.models import Comment, Group, Post
 
 User = get_user_model()
 
+BUMP_ON_COMMIT = feed_cache.bump_on_commit
+
 
 class CacheTest(TestCase):
     @classmethod
@@ -16,26 +20,47 @@ class CacheTest(TestCase):
         cls.author = User.objects.create_user(username='author')
         cls.authorized_author = Client()
         cls.authorized_author.force_login(cls.author)
+        cls.user = User.objects.create_user(username='follower')
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.user)
+        cls.guest_client = Client()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
 
         cls.post = Post.objects.create(
             author=cls.author,
             pub_date=datetime.now(),
             text='1 Тестовый пост 1',
+            group=cls.group,
         )
 
+    def setUp(self):
+        cache.clear()
+        # Тест идёт в транзакции, которая не коммитится: версии лент
+        # обновляются сразу, а не после коммита
+        for patcher in (
+            mock.patch.object(feed_cache, 'bump_on_commit', feed_cache.bump),
+            mock.patch.object(timeline, 'refresh_on_commit', timeline.refresh),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
     def test_cache_index(self):
         """
         Тест для проверки кеширования главной страницы
         """
         response_bfr = self.authorized_author.get(reverse('posts:index'))
         post2 = Post.objects.create(text='2 тест пост 2', author=self.author)
-        # sleep(20)
         response_aft = self.authorized_author.get(reverse('posts:index'))
         self.assertEqual(len(response_aft.context['page_obj']), 2,)
+        self.assertContains(response_aft, '2 тест пост 2')
 
         Post.objects.filter(id=post2.id).delete()
         response_aft_del = self.authorized_author.get(reverse('posts:index'))
-        self.assertEqual(response_aft.content, response_aft_del.content)
+        self.assertNotContains(response_aft_del, '2 тест пост 2')
 
         cache.clear()
         response_aft_clr = self.authorized_author.get(reverse('posts:index'))
@@ -43,3 +68,80 @@ class CacheTest(TestCase):
         self.assertEqual(
             response_aft_clr.context['paginator'].count,
             response_bfr.context['paginator'].count)
+
+    def test_unchanged_feed_is_served_from_cache(self):
+        """
+        Пока ленты не менялись, список постов берётся из кеша,
+        общий для гостей и авторизованных пользователей.
+        """
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Изменено в базе')
+        response = self.authorized_user.get(reverse('posts:index'))
+        self.assertContains(response, '1 Тестовый пост 1')
+        with self.assertNumQueries(3):
+            # Дата для Last-Modified, сессия и пользователь, без
+            # запросов ленты
+            self.authorized_user.get(reverse('posts:index'))
+
+    def test_changes_invalidate_only_their_feeds(self):
+        """
+        Новый пост обновляет общую ленту, ленту группы и профиль автора,
+        комментарий — страницу поста, подписка — ленту подписок.
+        """
+        pages = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_posts',
+                             kwargs={'slug': 'test-slug'}),
+            'profile': reverse('posts:profile',
+                               kwargs={'username': 'author'}),
+            'follow': reverse('posts:follow_index'),
+        }
+        for url in pages.values():
+            self.authorized_user.get(url)
+
+        self.authorized_user.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        response = self.authorized_user.get(pages['follow'])
+        self.assertContains(response, '1 Тестовый пост 1')
+
+        Post.objects.create(
+            text='Новый пост в группе',
+            author=self.author,
+            group=self.group,
+        )
+        for name, url in pages.items():
+            with self.subTest(page=name):
+                response = self.authorized_user.get(url)
+                self.assertContains(response, 'Новый пост в группе')
+
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.authorized_user.get(detail)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий'
+        )
+        self.assertContains(
+            self.authorized_user.get(detail), 'Новый комментарий'
+        )
+
+    def test_generations_bumped_after_commit(self):
+        """
+        Версии лент меняются только после коммита: до него
+        параллельный запрос не закеширует старые строки под новой
+        версией.
+        """
+        for patcher in (
+            mock.patch.object(feed_cache, 'bump_on_commit', BUMP_ON_COMMIT),
+            mock.patch.object(feed_cache.transaction, 'on_commit'),
+        ):
+            on_commit = patcher.start()
+            self.addCleanup(patcher.stop)
+        before = feed_cache.feed_version(feed_cache.GLOBAL)
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(feed_cache.feed_version(feed_cache.GLOBAL), before)
+        for (callback,), _ in on_commit.call_args_list:
+            if getattr(callback, 'func', None) is feed_cache.bump:
+                callback()
+        self.assertNotEqual(
+            feed_cache.feed_version(feed_cache.GLOBAL), before
+        )
@@ -0,0 +1,164 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from posts import feed_cache
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Тест идёт в транзакции, которая не коммитится: версии лент
+        # обновляются сразу, а не после коммита
+        patcher = mock.patch.object(
+            feed_cache, 'bump_on_commit', feed_cache.bump
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.guest_client = Client()
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+
+    def pages(self):
+        return {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_posts',
+                             kwargs={'slug': 'test-slug'}),
+            'profile': reverse('posts:profile',
+                               kwargs={'username': 'author'}),
+            'post': reverse('posts:post_detail',
+                            kwargs={'post_id': self.post.pk}),
+            'api_list': '/api/v1/posts/',
+            'api_detail': f'/api/v1/posts/{self.post.pk}/',
+        }
+
+    def revalidate(self, client, url, response):
+        return client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+
+    def test_unchanged_pages_cost_one_query(self):
+        """Повторный запрос неизменившейся страницы — 304 за один запрос."""
+        for name, url in self.pages().items():
+            with self.subTest(page=name):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(1):
+                    again = self.revalidate(self.guest_client, url, response)
+                self.assertEqual(again.status_code, 304)
+
+    def test_changes_and_users_change_validators(self):
+        """
+        Новый пост, правка, комментарий и подписка меняют ETag своих
+        страниц; HTML другого пользователя имеет другой ETag.
+        """
+        pages = self.pages()
+        etags = {
+            name: self.guest_client.get(url)['ETag']
+            for name, url in pages.items()
+        }
+        self.assertNotEqual(
+            self.authorized_user.get(pages['index'])['ETag'], etags['index']
+        )
+        self.assertEqual(
+            self.authorized_user.get(pages['api_list'])['ETag'],
+            etags['api_list'],
+        )
+        changes = (
+            (lambda: Post.objects.create(author=self.author, text='Новый'),
+             ('index', 'profile', 'api_list')),
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий'
+            ), ('post',)),
+            (lambda: Follow.objects.create(user=self.user, author=self.author),
+             ('profile',)),
+            (lambda: Post.objects.filter(pk=self.post.pk).get().save(),
+             ('group', 'post', 'api_detail')),
+        )
+        for change, changed in changes:
+            change()
+            for name in changed:
+                with self.subTest(page=name):
+                    response = self.guest_client.get(
+                        pages[name], HTTP_IF_NONE_MATCH=etags[name]
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    etags[name] = response['ETag']
+
+    def test_api_representations(self):
+        """
+        JSON и браузерный HTML одного адреса API — разные ETag
+        и Vary: Accept; ETag HTML зависит от пользователя.
+        """
+        for name in ('api_list', 'api_detail'):
+            url = self.pages()[name]
+            with self.subTest(page=name):
+                json_ = self.guest_client.get(
+                    url, HTTP_ACCEPT='application/json'
+                )
+                html = self.guest_client.get(url, HTTP_ACCEPT='text/html')
+                self.assertIn('Accept', json_['Vary'])
+                self.assertNotEqual(json_['ETag'], html['ETag'])
+                response = self.guest_client.get(
+                    url, HTTP_ACCEPT='text/html',
+                    HTTP_IF_NONE_MATCH=json_['ETag'],
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(
+                    self.authorized_user.get(
+                        url, HTTP_ACCEPT='text/html'
+                    )['ETag'],
+                    html['ETag'],
+                )
+
+    def test_last_modified_follows_edits(self):
+        """
+        Правка поста сдвигает Last-Modified, хотя дата публикации
+        не меняется.
+        """
+        url = self.pages()['api_detail']
+        response = self.guest_client.get(url)
+        with mock.patch.object(feed_cache.time, 'time',
+                               return_value=time.time() + 10):
+            self.post.save()
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_objects(self):
+        """Для несуществующих объектов валидаторов нет, ответ 404."""
+        urls = (
+            reverse('posts:group_posts', kwargs={'slug': 'missing'}),
+            reverse('posts:profile', kwargs={'username': 'missing'}),
+            reverse('posts:post_detail', kwargs={'post_id': 999}),
+            '/api/v1/posts/999/',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH='*')
+                self.assertEqual(response.status_code, 404)
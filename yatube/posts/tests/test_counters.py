@@ -0,0 +1,138 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(obj=obj, field=field):
+                self.assertEqual(getattr(obj, field), value)
+
+    def test_posts_and_comments(self):
+        """
+        Создание, перенос в другую группу и удаление поста меняют
+        счётчики автора и групп, комментарии — счётчик поста.
+        """
+        self.authorized_author.post(
+            reverse('posts:post_create'),
+            {'text': 'Тестовый пост', 'group': self.group.pk},
+        )
+        post = Post.objects.get()
+        self.assertCounters(self.author.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
+
+        self.authorized_author.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Тестовый пост', 'group': self.other_group.pk},
+        )
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=1)
+
+        for _ in range(2):
+            self.authorized_user.post(
+                reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+                {'text': 'Комментарий'},
+            )
+        self.assertCounters(post, comments_count=2)
+        Comment.objects.first().delete()
+        self.assertCounters(post, comments_count=1)
+
+        post.delete()
+        self.assertCounters(self.author.stats, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=0)
+
+    def test_follow(self):
+        """
+        Подписка и отписка меняют счётчики обоих пользователей.
+        """
+        follow = reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        )
+        self.authorized_user.get(follow)
+        self.authorized_user.get(follow)
+        self.assertCounters(self.author.stats, followers_count=1)
+        self.assertCounters(self.user.stats, following_count=1)
+
+        self.authorized_user.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}
+        ))
+        self.assertCounters(self.author.stats, followers_count=0)
+        self.assertCounters(self.user.stats, following_count=0)
+
+    def test_pages_show_counters(self):
+        """
+        Профиль и страница поста берут числа из счётчиков.
+        """
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_user.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        self.assertEqual(response.context['posts_count'], 1)
+        self.assertEqual(response.context['followers_count'], 1)
+        self.assertEqual(response.context['following_count'], 0)
+        response = self.authorized_user.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'Всего постов автора: 1')
+
+    def test_reconcile(self):
+        """
+        reconcile_counters исправляет разошедшиеся счётчики.
+        """
+        post = Post.objects.create(
+            author=self.author, text='Тестовый пост', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Follow.objects.create(user=self.user, author=self.author)
+        AuthorStats.objects.update(
+            posts_count=5, followers_count=5, following_count=5
+        )
+        Group.objects.update(posts_count=5)
+        Post.objects.update(comments_count=5)
+        AuthorStats.objects.filter(user=self.user).delete()
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('group.posts_count: исправлено строк 2', out.getvalue())
+        self.assertCounters(
+            self.author.stats,
+            posts_count=1, followers_count=1, following_count=0,
+        )
+        self.assertCounters(
+            AuthorStats.objects.get(user=self.user),
+            posts_count=0, followers_count=0, following_count=1,
+        )
+        self.assertCounters(self.group, posts_count=1)
+        self.assertCounters(self.other_group, posts_count=0)
+        self.assertCounters(post, comments_count=1)
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -35,6 +36,9 @@ class PostFormTest(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        # Картинки хранятся под хешем содержимого (core.storage)
+        digest = hashlib.sha256(cls.small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
         cls.uploaded = SimpleUploadedFile(
             name='small.gif',
             content=cls.small_gif,
@@ -72,7 +76,7 @@ class PostFormTest(TestCase):
             Post.objects.filter(
                 text='Тестовый пост',
                 group=self.group.id,
-                image='posts/small.gif'
+                image=self.image_name
             ).exists()
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
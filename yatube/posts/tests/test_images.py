@@ -0,0 +1,352 @@
+import base64
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.storage import content_storage, is_immutable
+from posts import images, thumbnails
+from posts.models import ImageVariant, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+ORIENTATION = 0x0112
+ROTATED_90 = 6
+
+
+def photo(size=(3000, 1000), mode='RGB', format='JPEG', orientation=None):
+    """Картинка как с телефона: EXIF с поворотом и координатами."""
+    image = Image.new(mode, size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Телефон'
+    if orientation is not None:
+        exif[ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_VARIANT_WIDTHS=(480, 960, 1600),
+    IMAGE_MAX_SIZE=2560,
+    IMAGE_RELEASE_GRACE=0,
+    TIMELINE_REFRESH_WORKERS=0,
+)
+class ImagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост с фотографией',
+            image=SimpleUploadedFile(
+                'photo.jpg', photo(orientation=ROTATED_90), 'image/jpeg'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_render(self):
+        """
+        Варианты повёрнуты по EXIF, без метаданных, не больше
+        IMAGE_MAX_SIZE и не шире исходной картинки.
+        """
+        variants = images.render(self.post.image.name)
+        # 3000×1000 с поворотом — 1000×3000, после ограничения 853×2560
+        self.assertEqual(
+            sorted({(variant.width, variant.height) for variant in variants}),
+            [(480, 1441), (853, 2560)],
+        )
+        self.assertEqual(
+            {variant.format for variant in variants}, set(images.formats())
+        )
+        for variant in variants:
+            with self.subTest(variant=variant.name):
+                with content_storage.open(variant.name) as file_:
+                    image = Image.open(file_)
+                    self.assertEqual(
+                        image.size, (variant.width, variant.height)
+                    )
+                    self.assertNotIn('exif', image.info)
+                self.assertEqual(
+                    content_storage.size(variant.name), variant.size
+                )
+
+    def test_measured_on_upload(self):
+        """
+        Размеры записываются при загрузке с учётом поворота по EXIF,
+        заглушка — крошечный PNG.
+        """
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (1000, 3000)
+        )
+        prefix = 'data:image/png;base64,'
+        self.assertTrue(self.post.image_placeholder.startswith(prefix))
+        placeholder = Image.open(BytesIO(base64.b64decode(
+            self.post.image_placeholder[len(prefix):]
+        )))
+        self.assertLessEqual(
+            max(placeholder.size), images.PLACEHOLDER_SIZE
+        )
+        self.assertLess(placeholder.width, placeholder.height)
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = None
+        post.save()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_feeds_do_not_touch_storage(self):
+        """
+        Карточка поста задаёт размеры, srcset и ленивую загрузку,
+        не открывая файлы; размеры старых постов дописывает
+        pregenerate_thumbnails.
+        """
+        call_command('pregenerate_thumbnails', workers=0, stdout=mock.Mock())
+        Post.objects.filter(pk=self.post.pk).update(image_width=None)
+        call_command('pregenerate_thumbnails', workers=0, stdout=mock.Mock())
+        self.assertEqual(
+            Post.objects.values_list('image_width', 'image_height').get(
+                pk=self.post.pk
+            ),
+            (1000, 3000),
+        )
+        variants = images.lookup([self.post.image.name])[self.post.image.name]
+        with mock.patch.object(content_storage, 'open') as open_, \
+                mock.patch.object(content_storage, 'exists') as exists, \
+                mock.patch.object(content_storage, 'size') as size:
+            response = self.client.get(reverse('posts:index'))
+        for method in (open_, exists, size):
+            method.assert_not_called()
+        self.assertContains(response, 'width="1000" height="3000"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'sizes="')
+        self.assertContains(response, self.post.image_placeholder)
+        self.assertContains(
+            response, f'srcset="{images.srcset(variants, images.FALLBACK)}"'
+        )
+        for variant in variants:
+            self.assertContains(
+                response, f'{images.url(variant)} {variant.width}w'
+            )
+
+    def test_transparent_image_as_jpeg(self):
+        """У прозрачной картинки в JPEG появляется белый фон."""
+        image = Image.new('RGBA', (10, 10), (0, 0, 0, 0))
+        content = images.encode(images.normalize(image), 'jpeg')
+        decoded = Image.open(BytesIO(content))
+        self.assertEqual(decoded.getpixel((5, 5)), (255, 255, 255))
+
+    def test_unsupported_formats_are_skipped(self):
+        """Форматы, которые Pillow не пишет, не создаются."""
+        with override_settings(IMAGE_VARIANT_FORMATS=('avif', 'jpeg')), \
+                mock.patch.dict(Image.SAVE, clear=True, JPEG=None):
+            self.assertEqual(images.formats(), ['jpeg'])
+
+    def test_choose(self):
+        """Наименьший вариант не уже нужного, иначе самый широкий."""
+        variants = [
+            images.Variant(f'{width}.{format}', format, width, width, size)
+            for width, format, size in (
+                (480, 'jpeg', 30), (960, 'jpeg', 90), (960, 'webp', 60),
+            )
+        ]
+        self.assertEqual(images.choose(variants, 300).name, '480.jpeg')
+        self.assertEqual(images.choose(variants, 481).name, '960.jpeg')
+        self.assertEqual(images.choose(variants, 2000).name, '960.jpeg')
+        self.assertEqual(images.choose(variants, 10, 'webp').name, '960.webp')
+        self.assertIsNone(images.choose(variants, 10, 'avif'))
+        self.assertIsNone(images.choose(None, 10))
+
+    def test_pages_and_api_use_variants(self):
+        """
+        Пока вариантов нет, страница поста и API отдают копию картинки
+        без метаданных, после обработки — подходящий вариант; исходный
+        файл не отдаётся никогда.
+        """
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        api = reverse('posts:post-detail', kwargs={'pk': self.post.pk})
+        capped = images.capped_url(self.post.image)
+        response = self.client.get(detail)
+        self.assertContains(response, capped)
+        self.assertNotContains(response, self.post.image.url)
+        for params in ({}, {'image_width': 400}):
+            with self.subTest(params=params):
+                response = self.client.get(api, params)
+                self.assertTrue(response.json()['image'].endswith(capped))
+
+        call_command('pregenerate_thumbnails', workers=0, stdout=mock.Mock())
+        self.assertEqual(
+            ImageVariant.objects.filter(source=self.post.image.name).count(),
+            2 * len(images.formats()),
+        )
+        cache.clear()
+        variants = images.lookup([self.post.image.name])[self.post.image.name]
+        wide = images.url(images.choose(variants, 960))
+        narrow = images.url(images.choose(variants, 400))
+        response = self.client.get(detail)
+        self.assertContains(response, wide)
+        self.assertNotContains(response, self.post.image.url)
+        response = self.client.get(api, {'image_width': 400})
+        self.assertTrue(response.json()['image'].endswith(narrow))
+        response = self.client.get(api)
+        self.assertTrue(response.json()['image'].endswith(wide))
+        response = self.client.get(api, {'image_width': 'много'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_capped_copy(self):
+        """
+        Копия вместо исходного файла повёрнута по EXIF, без метаданных
+        и не больше IMAGE_MAX_SIZE.
+        """
+        url = images.capped_url(self.post.image)
+        name = url[len(settings.MEDIA_URL):]
+        with Image.open(f'{TEMP_MEDIA_ROOT}/{name}') as image:
+            self.assertEqual(image.size, (853, 2560))
+            self.assertNotIn('exif', image.info)
+
+    def test_lookup_is_batched(self):
+        """Варианты страницы — один запрос к базе, дальше из кеша."""
+        # Варианты первой картинки есть только в базе
+        with mock.patch.object(images.cache, 'set'):
+            images.store('posts/a.jpg', [
+                images.Variant('variants/posts/a-480w.jpg', 'jpeg', 480, 1, 1)
+            ])
+        images.store('posts/b.jpg', [
+            images.Variant('variants/posts/b-480w.jpg', 'jpeg', 480, 1, 1)
+        ])
+        with self.assertNumQueries(1):
+            found = images.lookup(['posts/a.jpg', 'posts/b.jpg', 'posts/c'])
+        self.assertEqual(set(found), {'posts/a.jpg', 'posts/b.jpg'})
+        with self.assertNumQueries(0):
+            images.lookup(['posts/a.jpg', 'posts/b.jpg'])
+
+    def test_identical_uploads_share_file(self):
+        """
+        Одинаковые загрузки — один файл без повторной обработки;
+        файл удаляется вместе с последним постом, который на него
+        ссылается.
+        """
+        content = photo(size=(600, 400))
+        with mock.patch('posts.signals.transaction.on_commit',
+                        lambda callback: callback()), \
+                mock.patch.object(thumbnails, '_get_executor') as executor:
+            first, second = (
+                Post.objects.create(
+                    author=self.author,
+                    text=f'Пост {i}',
+                    image=SimpleUploadedFile('same.jpg', content),
+                )
+                for i in range(2)
+            )
+            self.assertEqual(first.image.name, second.image.name)
+            self.assertTrue(is_immutable(first.image.name))
+            name = first.image.name
+            executor().submit.assert_called_once()
+            thumbnails.store_processed(name, thumbnails.process(name))
+            variants = list(
+                ImageVariant.objects.values_list('file', flat=True).filter(
+                    source=name
+                )
+            )
+            self.assertTrue(variants)
+
+            first.delete()
+            self.assertTrue(content_storage.exists(name))
+            second.image = SimpleUploadedFile('other.jpg', photo())
+            second.save()
+            self.assertFalse(content_storage.exists(name))
+            for variant in variants:
+                self.assertFalse(content_storage.exists(variant))
+            self.assertFalse(ImageVariant.objects.filter(source=name))
+            self.assertEqual(images.lookup([name]), {})
+
+    def test_release_spares_reuploaded_file(self):
+        """
+        Файл, который только что загрузили снова, при удалении поста
+        остаётся: загрузка могла ещё не закоммититься. Его удаляет
+        sweep_images, когда ссылок так и не появилось.
+        """
+        content = photo(size=(500, 300))
+        with mock.patch('posts.signals.transaction.on_commit',
+                        lambda callback: callback()), \
+                mock.patch.object(thumbnails, '_get_executor'):
+            post = Post.objects.create(
+                author=self.author, text='Пост',
+                image=SimpleUploadedFile('reused.jpg', content),
+            )
+            name = post.image.name
+            path = content_storage.path(name)
+            os.utime(path, (0, 0))
+            # Такая же загрузка, ещё не закоммиченная
+            self.assertEqual(
+                content_storage.save('posts/again.jpg', ContentFile(content)),
+                name,
+            )
+            self.assertGreater(os.stat(path).st_mtime, 0)
+            with override_settings(IMAGE_RELEASE_GRACE=600):
+                post.delete()
+                self.assertTrue(content_storage.exists(name))
+                call_command('sweep_images', stdout=mock.Mock())
+                self.assertTrue(content_storage.exists(name))
+        call_command('sweep_images', stdout=mock.Mock())
+        self.assertFalse(content_storage.exists(name))
+        self.assertEqual(
+            os.listdir(os.path.dirname(path)), [],
+        )
+
+    def test_shared_variants_outlive_one_source(self):
+        """
+        Картинки, различающиеся только хвостом файла, дают одни
+        и те же варианты; удаление одной не трогает варианты другой.
+        """
+        content = photo(size=(600, 400))
+        with mock.patch('posts.signals.transaction.on_commit',
+                        lambda callback: callback()), \
+                mock.patch.object(thumbnails, '_get_executor'):
+            first, second = (
+                Post.objects.create(
+                    author=self.author,
+                    text='Пост',
+                    image=SimpleUploadedFile('same.jpg', data),
+                )
+                for data in (content, content + b'\0')
+            )
+            self.assertNotEqual(first.image.name, second.image.name)
+            for post in (first, second):
+                name = post.image.name
+                thumbnails.store_processed(name, thumbnails.process(name))
+            files = {
+                source: set(ImageVariant.objects.filter(
+                    source=source
+                ).values_list('file', flat=True))
+                for source in (first.image.name, second.image.name)
+            }
+            self.assertEqual(files[first.image.name], files[second.image.name])
+
+            first.delete()
+        self.assertFalse(content_storage.exists(first.image.name))
+        for variant in files[second.image.name]:
+            self.assertTrue(content_storage.exists(variant))
@@ -59,3 +59,66 @@ class PostViewTest(TestCase):
             reverse('posts:index') + '?page=2'
         )
         self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """
+        Тест пагинатора 3: переход по курсорам вперёд и назад возвращает
+        все посты без пропусков и повторов.
+        """
+        first = self.authorized_author.get(reverse('posts:index'))
+        first_page = first.context['page_obj']
+        next_cursor = first.context['paginator'].next_cursor
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+
+        second = self.authorized_author.get(
+            reverse('posts:index') + f'?cursor={next_cursor}'
+        )
+        second_page = second.context['page_obj']
+        previous_cursor = second.context['paginator'].previous_cursor
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        ids = [post.id for post in first_page] + [
+            post.id for post in second_page
+        ]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            ))
+        )
+
+        back = self.authorized_author.get(
+            reverse('posts:index')
+            + f'?cursor={previous_cursor}'
+        )
+        self.assertEqual(
+            [post.id for post in back.context['page_obj']],
+            [post.id for post in first_page]
+        )
+        self.assertFalse(back.context['page_obj'].has_previous())
+
+    def test_cursor_page_does_not_count(self):
+        """
+        Тест пагинатора 4: страница по курсору не выполняет COUNT(*)
+        и OFFSET.
+        """
+        first = self.authorized_author.get(
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        )
+        paginator = first.context['page_obj'].paginator
+        page = paginator.get_page(cursor=paginator.next_cursor)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(page), 3)
+        self.assertEqual(page.number, 2)
+
+    def test_broken_cursor_returns_first_page(self):
+        """
+        Тест пагинатора 5: битый курсор открывает первую страницу.
+        """
+        response = self.authorized_author.get(
+            reverse('posts:index') + '?cursor=broken!'
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertEqual(response.status_code, 200)
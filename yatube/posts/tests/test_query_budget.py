@@ -0,0 +1,145 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.urls import URLPattern, reverse
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from core.middleware import QueryBudgetExceeded, get_query_budget
+from posts import urls, views
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def url_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            yield pattern
+        else:
+            yield from url_patterns(pattern.url_patterns)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.authorized_author = Client()
+        cls.authorized_author.force_login(cls.author)
+        cls.user = User.objects.create_user(username='follower')
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.user)
+        cls.guest_client = Client()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def add_rows(self, count):
+        """Добавляет посты в каждую ленту и комментарии к посту."""
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'author-{i}')
+            Follow.objects.create(user=self.user, author=author)
+            Post.objects.create(
+                author=author,
+                text=f'Тестовый пост {i}',
+                group=Group.objects.create(
+                    title=f'Группа {i}',
+                    slug=f'group-{i}',
+                    description='Тестовое описание',
+                ),
+            )
+            Post.objects.create(
+                author=self.author,
+                text=f'Пост автора {i}',
+                group=self.group,
+            )
+            Comment.objects.create(
+                post=self.post,
+                author=author,
+                text=f'Комментарий {i}',
+            )
+
+    def pages(self):
+        """Запросы ко всем страницам posts.urls."""
+        post_id = self.post.id
+        return (
+            (self.guest_client, 'get', reverse('posts:index'), None),
+            (self.authorized_user, 'get', reverse('posts:index'), None),
+            (self.guest_client, 'get', reverse(
+                'posts:group_posts', kwargs={'slug': 'test-slug'}), None),
+            (self.authorized_user, 'get', reverse(
+                'posts:profile', kwargs={'username': 'author'}), None),
+            (self.authorized_user, 'get', reverse(
+                'posts:post_detail', kwargs={'post_id': post_id}), None),
+            (self.authorized_user, 'get', reverse('posts:follow_index'), None),
+            (self.authorized_author, 'get', reverse('posts:post_create'),
+             None),
+            (self.authorized_author, 'get', reverse(
+                'posts:post_edit', kwargs={'post_id': post_id}), None),
+            (self.authorized_user, 'post', reverse(
+                'posts:add_comment', kwargs={'post_id': post_id}),
+             {'text': 'Новый комментарий'}),
+            (self.authorized_author, 'get', reverse(
+                'posts:profile_follow', kwargs={'username': 'follower'}),
+             None),
+            (self.authorized_author, 'get', reverse(
+                'posts:profile_unfollow', kwargs={'username': 'follower'}),
+             None),
+            (self.guest_client, 'get', '/api/v1/posts/', None),
+            (self.guest_client, 'get', f'/api/v1/posts/{post_id}/', None),
+        )
+
+    def count_queries(self):
+        counts = {}
+        for client, method, url, data in self.pages():
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                getattr(client, method)(url, data)
+            counts[(client, method, url)] = len(context.captured_queries)
+        return counts
+
+    def test_posts_views_declare_budget(self):
+        """
+        Для каждой view из posts.views объявлен бюджет запросов.
+        """
+        for pattern in url_patterns(urls.urlpatterns):
+            view = getattr(pattern.callback, 'cls', pattern.callback)
+            if view.__module__ != 'posts.views':
+                continue
+            with self.subTest(pattern=str(pattern.pattern)):
+                self.assertIsNotNone(get_query_budget(pattern.callback))
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """
+        Число запросов страницы не зависит от числа постов на ней
+        и числа комментариев и укладывается в бюджет.
+        """
+        self.add_rows(2)
+        with self.settings(POSTS_PER_PAGE=1):
+            few = self.count_queries()
+        self.add_rows(settings.POSTS_PER_PAGE + 2)
+        many = self.count_queries()
+        for key, count in few.items():
+            with self.subTest(url=key[2], method=key[1]):
+                self.assertEqual(many[key], count)
+
+    def test_exceeded_budget_fails(self):
+        """
+        Превышение бюджета в строгом режиме прерывает запрос.
+        """
+        with mock.patch.object(views.index, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.guest_client.get(reverse('posts:index'))
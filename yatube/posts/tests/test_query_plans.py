@@ -0,0 +1,157 @@
+import re
+from unittest import skipUnless
+
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+SQLITE_SEQ_SCAN = re.compile(r'^SCAN (?:TABLE )?(?!subquery\b)(\w+)$')
+SQLITE_FILESORT = re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER')
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_FILESORT = re.compile(r'(?:^|->)\s*Sort\s+\(')
+
+
+def explain(sql):
+    """Возвращает строки плана запроса для текущей базы."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        # На маленьких тестовых таблицах PostgreSQL предпочтёт
+        # полный просмотр; запрещаем его, чтобы увидеть, есть ли индекс
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('SET LOCAL enable_sort = off')
+        cursor.execute('EXPLAIN ' + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def plan_problems(plan, allowed_tables=()):
+    """Находит в плане полный просмотр таблицы и сортировку без индекса."""
+    if connection.vendor == 'sqlite':
+        seq_scan, filesort = SQLITE_SEQ_SCAN, SQLITE_FILESORT
+    else:
+        seq_scan, filesort = POSTGRES_SEQ_SCAN, POSTGRES_FILESORT
+    problems = []
+    for line in plan:
+        match = seq_scan.search(line.strip())
+        if match and match.group(1) not in allowed_tables:
+            problems.append(line)
+        elif filesort.search(line):
+            problems.append(line)
+    return problems
+
+
+@skipUnless(
+    connection.vendor in ('sqlite', 'postgresql'),
+    'Планы запросов проверяются только для SQLite и PostgreSQL'
+)
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='follower')
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый пост {i}',
+                group=cls.group,
+            )
+        cls.own_post = Post.objects.create(
+            author=cls.user,
+            text='Пост подписчика',
+        )
+        Comment.objects.create(
+            post=cls.post,
+            author=cls.user,
+            text='Тестовый комментарий',
+        )
+
+    def urls(self):
+        """Страницы и таблицы, которые им разрешено читать целиком."""
+        return {
+            reverse('posts:index'): (),
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}): (),
+            reverse('posts:profile', kwargs={'username': 'author'}): (),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}): (),
+            reverse('posts:follow_index'): (),
+            # Форма выводит список всех групп
+            reverse('posts:post_create'): ('posts_group',),
+            reverse(
+                'posts:post_edit', kwargs={'post_id': self.own_post.id}
+            ): ('posts_group',),
+            '/api/v1/posts/': (),
+            f'/api/v1/posts/{self.post.id}/': (),
+            f'/api/v1/posts/{self.post.id}/comments/?page_size=1': (),
+        }
+
+    def captured_selects(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_user.get(url)
+        self.assertEqual(response.status_code, 200)
+        selects = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        ]
+        page_obj = response.context and response.context.get('page_obj')
+        # Следующая страница проверяется отдельно: там работает курсор
+        if page_obj and page_obj.paginator.next_cursor:
+            with CaptureQueriesContext(connection) as context:
+                self.authorized_user.get(
+                    f'{url}?cursor={page_obj.paginator.next_cursor}'
+                )
+            selects += [
+                query['sql'] for query in context.captured_queries
+                if query['sql'].startswith('SELECT')
+            ]
+        return selects
+
+    def test_hot_queries_use_indexes(self):
+        """
+        Запросы страниц не просматривают таблицы целиком
+        и не сортируют без индекса.
+        """
+        for url, allowed_tables in self.urls().items():
+            for sql in self.captured_selects(url):
+                with self.subTest(url=url, sql=sql):
+                    plan = explain(sql)
+                    self.assertEqual(
+                        plan_problems(plan, allowed_tables), [],
+                        '\n'.join(plan)
+                    )
+
+    def test_follow_feed_with_direct_posts(self):
+        """
+        Лента подписок с подмешанными при чтении постами тоже
+        читается по индексам.
+        """
+        popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=self.user, author=popular)
+        for i in range(15):
+            Post.objects.create(
+                author=popular, text=f'Пост популярного автора {i}',
+            )
+        Post.objects.filter(author=popular).update(in_timelines=False)
+        url = reverse('posts:follow_index')
+        response = self.authorized_user.get(url)
+        self.assertIn(
+            'Пост популярного автора 14',
+            [post.text for post in response.context['page_obj']],
+        )
+        for sql in self.captured_selects(url):
+            with self.subTest(sql=sql):
+                plan = explain(sql)
+                self.assertEqual(plan_problems(plan), [], '\n'.join(plan))
@@ -0,0 +1,151 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from posts import search
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Ёжики в тумане',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Ежи выходят из леса только в тумане, туман их прячет',
+            group=cls.group,
+        )
+        cls.other = Post.objects.create(
+            author=cls.author,
+            text='Про лес и грибы',
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.other,
+            author=cls.author,
+            text='В тумане грибов не видно',
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query, **kwargs):
+        hits, _ = search.search(query, **kwargs)
+        return [(hit['type'], hit['id']) for hit in hits]
+
+    def test_prefix_match(self):
+        """Посты, комментарии и группы находятся по началу слов."""
+        self.assertCountEqual(self.found('туман'), [
+            ('post', self.post.pk),
+            ('comment', self.comment.pk),
+            ('group', self.group.pk),
+        ])
+        self.assertEqual(self.found('гриб ЛЕС'), [('post', self.other.pk)])
+        self.assertEqual(self.found('ежики'), [('group', self.group.pk)])
+        self.assertCountEqual(self.found('ёжи'), [
+            ('post', self.post.pk), ('group', self.group.pk)
+        ])
+        self.assertEqual(self.found('кактус'), [])
+        self.assertEqual(self.found('  !  '), [])
+
+    def test_ranking(self):
+        """Чем чаще слово в документе, тем выше он в выдаче."""
+        once = Post.objects.create(
+            author=self.author, text='кактус раз два три четыре'
+        )
+        twice = Post.objects.create(
+            author=self.author, text='кактус раз кактус два три'
+        )
+        self.assertEqual(
+            self.found('кактус'), [('post', twice.pk), ('post', once.pk)]
+        )
+
+    def test_index_follows_changes(self):
+        """Правка и удаление объектов сразу видны в поиске."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Теперь про кактусы'
+        post.save()
+        self.assertEqual(self.found('кактус'), [('post', post.pk)])
+        self.assertNotIn(('post', post.pk), self.found('туман'))
+        Comment.objects.filter(pk=self.comment.pk).delete()
+        Group.objects.filter(pk=self.group.pk).delete()
+        self.assertEqual(self.found('туман'), [])
+
+    def test_cursor_pagination(self):
+        """Страницы по курсору не повторяют и не теряют результатов."""
+        for i in range(7):
+            Post.objects.create(author=self.author, text=f'Туманный пост {i}')
+        seen = []
+        cursor = None
+        while True:
+            hits, cursor = search.search('туман', cursor=cursor, limit=3)
+            seen.extend((hit['type'], hit['id']) for hit in hits)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), len(seen))
+        self.assertEqual(
+            self.found('туман', cursor='битый'), self.found('туман')
+        )
+
+    def test_postgres_rank_is_float8(self):
+        """
+        В PostgreSQL ранг из ts_rank (float4) и ранг из курсора
+        сравниваются как float8: иначе курсор теряет и повторяет
+        результаты с равной релевантностью.
+        """
+        cursor = mock.Mock()
+        search.PostgresIndex().search(cursor, ['туман'], (-0.1, 4), 3)
+        sql, _ = cursor.execute.call_args[0]
+        self.assertIn('ts_rank(document, query)::float8', sql)
+        self.assertIn('rank > %s::float8', sql)
+        self.assertIn('rank = %s::float8', sql)
+
+    def test_rebuild(self):
+        """Команда пересобирает индекс, в том числе после bulk_create."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Пост мимо сигналов')
+        ])
+        self.assertEqual(self.found('сигнал'), [])
+        call_command('rebuild_search_index', batch_size=2, stdout=mock.Mock())
+        post = Post.objects.get(text='Пост мимо сигналов')
+        self.assertEqual(self.found('сигнал'), [('post', post.pk)])
+        self.assertEqual(len(self.found('туман')), 3)
+
+    def test_pages(self):
+        """Страница поиска и API отдают результаты со ссылками."""
+        response = self.client.get(reverse('posts:search'), {'q': 'гриб'})
+        self.assertContains(
+            response,
+            reverse('posts:post_detail', kwargs={'post_id': self.other.pk}),
+        )
+        self.assertContains(response, 'Комментарий')
+
+        response = self.client.get(
+            reverse('posts:api_search'), {'q': 'туман', 'page_size': 2}
+        )
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIn(
+            {
+                'type': 'post',
+                'id': self.post.pk,
+                'text': self.post.text,
+                'url': 'http://testserver' + reverse(
+                    'posts:post_detail', kwargs={'post_id': self.post.pk}
+                ),
+            },
+            data['results'],
+        )
+        response = self.client.get(data['next'])
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNone(response.json()['next'])
@@ -0,0 +1,128 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from posts import tags
+from posts.models import Post, Tag, TagPost
+
+User = get_user_model()
+
+
+class TagsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Tag.objects.create(name='старый')
+
+    def setUp(self):
+        self.client = Client()
+        self.addCleanup(tags.lookup.cache.clear)
+
+    def create(self, names):
+        return self.client.post(
+            '/api/v1/posts/',
+            {
+                'text': 'Тестовый пост',
+                'author': self.author.pk,
+                'tag': [{'name': name} for name in names],
+            },
+            content_type='application/json',
+        )
+
+    def post_tags(self, post_id):
+        return set(TagPost.objects.filter(
+            post=post_id
+        ).values_list('tag__name', flat=True))
+
+    def test_create_and_update(self):
+        """
+        Теги создаются и привязываются без дублей, полное обновление
+        заменяет их, частичное без поля tag — не трогает.
+        """
+        response = self.create(['старый', 'новый', 'новый'])
+        self.assertEqual(response.status_code, 201)
+        post_id = response.json()['id']
+        self.assertEqual(self.post_tags(post_id), {'старый', 'новый'})
+        self.assertEqual(Tag.objects.count(), 2)
+
+        url = f'/api/v1/posts/{post_id}/'
+        response = self.client.put(
+            url,
+            {
+                'text': 'Новый текст',
+                'author': self.author.pk,
+                'tag': [{'name': 'новый'}, {'name': 'третий'}],
+            },
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {tag['name'] for tag in response.json()['tag']},
+            {'новый', 'третий'},
+        )
+        self.assertEqual(self.post_tags(post_id), {'новый', 'третий'})
+
+        self.client.patch(
+            url, {'text': 'Ещё текст'}, content_type='application/json'
+        )
+        self.assertEqual(self.post_tags(post_id), {'новый', 'третий'})
+        self.client.patch(
+            url, {'tag': []}, content_type='application/json'
+        )
+        self.assertEqual(self.post_tags(post_id), set())
+
+    def test_queries_do_not_depend_on_tag_count(self):
+        """Число запросов не растёт с числом тегов поста."""
+        self.create([])
+        queries = []
+        for count in (2, 20):
+            names = [f'тег-{count}-{i}' for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                self.create(names)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_lookup_cache(self):
+        """
+        Id тегов запоминаются после коммита и забываются при удалении
+        тега; известные теги не запрашиваются повторно.
+        """
+        with mock.patch('posts.bulk.transaction.on_commit',
+                        lambda callback: callback()):
+            post = Post.objects.create(author=self.author, text='Пост')
+            tags.set_tags(post, ['старый', 'новый'])
+        self.assertEqual(
+            set(tags.lookup.cache), {'старый', 'новый'}
+        )
+        with self.assertNumQueries(0):
+            tags.lookup.resolve(['старый', 'новый'])
+        # Известные id проверяются одним запросом, без обхода таблиц
+        with self.assertNumQueries(2):
+            tags.set_tags(post, ['старый', 'новый'])
+        Tag.objects.get(name='старый').delete()
+        self.assertNotIn('старый', tags.lookup.cache)
+        self.assertEqual(self.post_tags(post.pk), {'новый'})
+
+    def test_stale_cached_tag(self):
+        """
+        Тег, удалённый в другом процессе, забывается, и пост получает
+        заново созданный тег.
+        """
+        post = Post.objects.create(author=self.author, text='Пост')
+        tag = Tag.objects.create(name='удалённый')
+        stale_id = tag.pk
+        tag.delete()
+        # Тег удалили в другом процессе: в кеше этого остался его id
+        tags.lookup.cache['удалённый'] = stale_id
+        tags.set_tags(post, ['удалённый', 'старый'])
+        self.assertEqual(self.post_tags(post.pk), {'удалённый', 'старый'})
+        self.assertNotIn('удалённый', tags.lookup.cache)
+
+    def test_rolled_back_tags_are_not_cached(self):
+        """Теги из незавершённой транзакции не попадают в кеш."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        tags.set_tags(post, ['новый'])
+        self.assertNotIn('новый', tags.lookup.cache)
@@ -0,0 +1,123 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from posts import threads
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+def run_on_commit(callback):
+    callback()
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class ThreadsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def test_pages(self):
+        """
+        Комментарии идут от новых к старым страницами по курсору,
+        без пропусков и повторов.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(
+            self.texts(response),
+            ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'],
+        )
+        self.assertContains(response, 'Комментарий 4')
+        cursor = response.context['next_comments']
+        response = self.client.get(self.url, {'cursor': cursor})
+        self.assertEqual(
+            self.texts(response), ['Комментарий 1', 'Комментарий 0']
+        )
+        self.assertIsNone(response.context['next_comments'])
+        self.assertContains(response, 'К новым комментариям')
+
+    def test_new_comment_is_appended(self):
+        """
+        Новый комментарий дописывается в закешированную страницу,
+        и она не собирается заново.
+        """
+        self.client.get(self.url)
+        with mock.patch('posts.signals.transaction.on_commit',
+                        run_on_commit):
+            self.client.post(
+                reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+                {'text': 'Новый комментарий'},
+            )
+        with mock.patch.object(
+            threads, 'comments', wraps=threads.comments
+        ) as comments:
+            response = self.client.get(self.url)
+            comments.assert_not_called()
+        self.assertEqual(
+            self.texts(response),
+            ['Новый комментарий', 'Комментарий 4', 'Комментарий 3'],
+        )
+        response = self.client.get(
+            self.url, {'cursor': response.context['next_comments']}
+        )
+        self.assertEqual(
+            self.texts(response),
+            ['Комментарий 2', 'Комментарий 1', 'Комментарий 0'],
+        )
+
+    def test_edit_and_delete_rebuild_page(self):
+        """Правка и удаление комментария видны на странице сразу."""
+        self.client.get(self.url)
+        comment = Comment.objects.get(text='Комментарий 4')
+        comment.text = 'Исправленный комментарий'
+        comment.save()
+        self.assertEqual(
+            self.texts(self.client.get(self.url))[0],
+            'Исправленный комментарий',
+        )
+        comment.delete()
+        self.assertEqual(
+            self.texts(self.client.get(self.url)),
+            ['Комментарий 3', 'Комментарий 2', 'Комментарий 1'],
+        )
+
+    def test_api(self):
+        """API отдаёт комментарии страницами со ссылкой на следующую."""
+        url = reverse('posts:post-comments', kwargs={'pk': self.post.pk})
+        response = self.client.get(url, {'page_size': 4})
+        data = response.json()
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            [f'Комментарий {i}' for i in (4, 3, 2, 1)],
+        )
+        self.assertEqual(data['results'][0]['author'], self.author.pk)
+        data = self.client.get(data['next']).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Комментарий 0'],
+        )
+        self.assertIsNone(data['next'])
+        response = self.client.get(
+            reverse('posts:post-comments', kwargs={'pk': 0})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,224 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from core import metrics
+from posts import images, thumbnails
+from posts.models import Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, TIMELINE_REFRESH_WORKERS=0)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.authorized_author = Client()
+        cls.authorized_author.force_login(cls.author)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_capped_copy_until_thumbnail_is_ready(self):
+        """
+        Пока вариантов нет, ленты показывают копию картинки без
+        метаданных, а не исходный файл, и не создают варианты сами;
+        после фоновой обработки закешированные ленты перерисовываются
+        с вариантами.
+        """
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.authorized_author.get(url)
+                self.assertNotContains(response, self.post.image.url)
+                self.assertContains(
+                    response, images.capped_url(self.post.image)
+                )
+        self.assertEqual(
+            metrics.registry.histograms[
+                'thumbnail_seconds', 'posts:index'
+            ].count,
+            1,
+        )
+        self.assertFalse(Path(TEMP_MEDIA_ROOT, images.VARIANT_DIR).exists())
+
+        call_command('pregenerate_thumbnails', workers=0, stdout=mock.Mock())
+        variants = images.lookup([self.post.image.name])[self.post.image.name]
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.authorized_author.get(url)
+                self.assertContains(
+                    response, images.srcset(variants, images.FALLBACK)
+                )
+
+    def test_new_image_is_scheduled(self):
+        """
+        Новая картинка ставится в очередь после коммита, правка
+        текста без смены картинки — нет.
+        """
+        with mock.patch.object(thumbnails, 'schedule') as schedule, \
+                mock.patch('posts.signals.transaction.on_commit',
+                           lambda callback: callback()):
+            post = Post.objects.create(
+                author=self.author,
+                text='Пост с картинкой',
+                image=SimpleUploadedFile(
+                    name='new.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            )
+            schedule.assert_called_once_with(post)
+            schedule.reset_mock()
+            self.authorized_author.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                {'text': 'Новый текст'},
+            )
+            schedule.assert_not_called()
+
+    def test_feed_page_is_resolved_at_once(self):
+        """
+        Картинки всей страницы ленты ищутся одним обращением к кешу,
+        необработанные ставятся в очередь один раз на файл; помеченные
+        как необработанные — не ставятся.
+        """
+        for index in range(3):
+            Post.objects.create(
+                author=self.author,
+                text=f'Ещё пост {index}',
+                image=SimpleUploadedFile(
+                    name=f'{index}.gif',
+                    content=SMALL_GIF + bytes([index]),
+                    content_type='image/gif'
+                ),
+            )
+        self.addCleanup(thumbnails._pending.clear)
+        self.addCleanup(
+            shutil.rmtree, Path(TEMP_MEDIA_ROOT, images.VARIANT_DIR),
+            ignore_errors=True,
+        )
+        with mock.patch.object(
+            images.cache, 'get_many', wraps=images.cache.get_many
+        ) as get_many, \
+                mock.patch.object(thumbnails, '_get_executor') as executor, \
+                mock.patch('django.db.transaction.on_commit',
+                           lambda callback: callback()):
+            self.authorized_author.get(reverse('posts:index'))
+            lookups = [
+                list(keys) for (keys,), _ in get_many.call_args_list
+                if list(keys)[0].startswith(images.cache_key(''))
+            ]
+            self.assertEqual(len(lookups), 1)
+            self.assertEqual(len(lookups[0]), 4)
+            self.assertEqual(executor().submit.call_count, 4)
+
+            # Пока файлы в очереди, повторно они не отправляются
+            cache.clear()
+            self.authorized_author.get(reverse('posts:index'))
+            self.assertEqual(executor().submit.call_count, 4)
+
+            # Как и файлы с ошибкой обработки
+            cache.clear()
+            thumbnails._pending.clear()
+            for name in Post.objects.values_list('image', flat=True):
+                thumbnails.mark_failed(name)
+            self.authorized_author.get(reverse('posts:index'))
+            self.assertEqual(executor().submit.call_count, 4)
+
+        call_command('pregenerate_thumbnails', workers=0, stdout=mock.Mock())
+        cache.clear()
+        with mock.patch.object(
+            images, 'lookup', wraps=images.lookup
+        ) as lookup:
+            response = self.authorized_author.get(reverse('posts:index'))
+        lookup.assert_called_once()
+        for post in response.context['page_obj']:
+            with self.subTest(post=post.text):
+                self.assertIn(images.FALLBACK, {
+                    variant.format
+                    for variant in images.lookup([post.image.name])[
+                        post.image.name
+                    ]
+                })
+                self.assertContains(response, post.picture['srcset'])
+
+    def test_failed_image_is_not_resubmitted(self):
+        """
+        Картинка с ошибкой обработки помечается и в очередь больше
+        не ставится; pregenerate_thumbnails пробует её снова.
+        """
+        name = self.post.image.name
+        failed = mock.Mock()
+        failed.result.side_effect = OSError('битый файл')
+        self.addCleanup(thumbnails._pending.clear)
+        with mock.patch.object(thumbnails, '_get_executor') as executor:
+            thumbnails.schedule(self.post)
+            executor().submit.assert_called_once()
+            thumbnails._finished(name, [], failed)
+            self.assertTrue(thumbnails.has_failed(name))
+
+            executor().submit.reset_mock()
+            thumbnails.schedule(self.post)
+            executor().submit.assert_not_called()
+
+        self.addCleanup(
+            shutil.rmtree, Path(TEMP_MEDIA_ROOT, images.VARIANT_DIR),
+            ignore_errors=True,
+        )
+        with mock.patch.object(thumbnails, 'process', side_effect=OSError):
+            call_command(
+                'pregenerate_thumbnails', workers=0,
+                stdout=mock.Mock(), stderr=mock.Mock(),
+            )
+        self.assertTrue(thumbnails.has_failed(name))
+        call_command('pregenerate_thumbnails', workers=0, stdout=mock.Mock())
+        self.assertFalse(thumbnails.has_failed(name))
+        self.assertIn(name, images.lookup([name]))
@@ -1,19 +1,24 @@
+import hashlib
 import shutil
 import tempfile
 from datetime import datetime
+from unittest import mock
+
 from django.urls import reverse
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from posts.models import Group, Post, Follow
+from posts import feed_cache, timeline
+from posts.models import Group, Post, Follow, TimelineEntry
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostViewTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -30,6 +35,9 @@ class PostViewTest(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        # Картинки хранятся под хешем содержимого (core.storage)
+        digest = hashlib.sha256(cls.small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
         cls.uploaded = SimpleUploadedFile(
             name='small.gif',
             content=cls.small_gif,
@@ -88,7 +96,7 @@ class PostViewTest(TestCase):
         self.assertEqual(first_object.author, self.author)
         self.assertEqual(first_object.text, 'Тестовый пост для проверки')
         self.assertEqual(first_object.group, self.group)
-        self.assertEqual(first_object.image, 'posts/small.gif')
+        self.assertEqual(first_object.image, self.image_name)
 
     def test_index_page_show_correct_context(self):
         """
@@ -323,3 +331,113 @@ class UnFollowTest(TestCase):
             author=self.author,
             user=self.user).exists()
         )
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='follower')
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.user)
+
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def test_follow_backfills_and_unfollow_prunes_timeline(self):
+        """
+        При подписке старые посты автора попадают в ленту подписчика,
+        при отписке удаляются из неё.
+        """
+        self.authorized_user.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.old_post).exists()
+        )
+        self.authorized_user.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user).exists()
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        """
+        Новый пост записывается в ленты подписчиков автора.
+        """
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=new_post).exists()
+        )
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'].object_list)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_posts_read_on_demand(self):
+        """
+        Посты популярного автора не раскладываются по лентам,
+        но попадают в ленту подписок при чтении.
+        """
+        self.authorized_user.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.filter(post=new_post).exists())
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj'].object_list),
+            [new_post, self.old_post]
+        )
+
+    def test_direct_posts_outlive_popularity(self):
+        """
+        Пост, не разложенный, пока автор был популярным, остаётся
+        в ленте подписок и после того, как автор им быть перестал.
+        """
+        self.authorized_user.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            direct_post = Post.objects.create(
+                author=self.author, text='Пост популярного автора'
+            )
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.filter(
+            post=direct_post).exists()
+        )
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj'].object_list),
+            [new_post, direct_post, self.old_post]
+        )
+
+    def test_follow_page_cached_by_follower_version(self):
+        """
+        Лента подписок кешируется по версии подписчика: правка
+        и удаление разложенного в неё поста эту версию обновляют.
+        """
+        cache.clear()
+        for patcher in (
+            mock.patch.object(feed_cache, 'bump_on_commit', feed_cache.bump),
+            mock.patch.object(timeline, 'refresh_on_commit', timeline.refresh),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        url = reverse('posts:follow_index')
+        self.authorized_user.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.assertContains(self.authorized_user.get(url), 'Пост до подписки')
+        post = Post.objects.get(pk=self.old_post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertContains(self.authorized_user.get(url), 'Исправленный пост')
+        post.delete()
+        self.assertNotContains(
+            self.authorized_user.get(url), 'Исправленный пост'
+        )
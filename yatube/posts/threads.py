@@ -0,0 +1,119 @@
+"""
+Комментарии поста: страницы от новых к старым по ключу (created, id)
+и закешированная первая страница.
+
+Первая страница хранится в кеше уже отрисованной, вместе со значением
+счётчика Post.comments_count, для которого она собрана. Новый
+комментарий после коммита дописывается в начало страницы, а не
+сбрасывает её. Если счётчик поста не совпал со страницей (удаление,
+потерянное при гонке дописывание, bulk-загрузка), страница
+собирается заново; правка комментария удаляет её из кеша.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import feed_cache
+from posts.models import Comment
+from posts.paginator import FORWARD, decode_cursor, encode_cursor
+
+TEMPLATE = 'posts/includes/comment.html'
+
+# Отрисованный комментарий; text — для тестов и API без разбора html
+Item = namedtuple('Item', 'id created text html')
+Page = namedtuple('Page', 'items next_cursor')
+
+
+def thread_key(post_id):
+    return f'comment-thread:{post_id}'
+
+
+def render(comment):
+    html = render_to_string(TEMPLATE, {'comment': comment})
+    return Item(comment.pk, comment.created, comment.text, mark_safe(html))
+
+
+def next_cursor(items, has_next):
+    """Курсор после последнего комментария (или Item) страницы."""
+    if not has_next or not items:
+        return None
+    last = items[-1]
+    return encode_cursor(FORWARD, 0, last.created, last.id)
+
+
+def comments(post_id, cursor=None, limit=None):
+    """
+    Комментарии страницы (с авторами) и признак следующей страницы.
+    Битый курсор означает первую страницу.
+    """
+    limit = limit or settings.COMMENTS_PER_PAGE
+    queryset = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).order_by('-created', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        _, _, created, pk = position
+        queryset = queryset.filter(
+            Q(created__lt=created) | Q(created=created, id__lt=pk)
+        )
+    rows = list(queryset[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def page(post_id, cursor):
+    """Отрисованная страница старых комментариев, без кеша."""
+    rows, has_next = comments(post_id, cursor)
+    items = [render(comment) for comment in rows]
+    return Page(items, next_cursor(items, has_next))
+
+
+def first_page(post):
+    """Первая страница из кеша; собирается, если устарела."""
+    cached = cache.get(thread_key(post.pk))
+    if cached is not None and cached['count'] == post.comments_count:
+        return Page(cached['items'], cached['next_cursor'])
+    rows, has_next = comments(post.pk)
+    items = [render(comment) for comment in rows]
+    result = Page(items, next_cursor(items, has_next))
+    _store(post.pk, result, post.comments_count)
+    return result
+
+
+def _store(post_id, result, count):
+    cache.set(
+        thread_key(post_id),
+        {
+            'items': result.items,
+            'next_cursor': result.next_cursor,
+            'count': count,
+        },
+        feed_cache.timeout(),
+    )
+
+
+def append(comment):
+    """Дописывает новый комментарий в закешированную первую страницу."""
+    cached = cache.get(thread_key(comment.post_id))
+    if cached is None:
+        return
+    items = cached['items']
+    if any(item.id == comment.pk for item in items):
+        return
+    items = [render(comment), *items]
+    has_next = cached['next_cursor'] is not None
+    if len(items) > settings.COMMENTS_PER_PAGE:
+        items = items[:settings.COMMENTS_PER_PAGE]
+        has_next = True
+    _store(
+        comment.post_id,
+        Page(items, next_cursor(items, has_next)),
+        cached['count'] + 1,
+    )
+
+
+def invalidate(post_id):
+    cache.delete(thread_key(post_id))
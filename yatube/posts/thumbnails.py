@@ -0,0 +1,249 @@
+"""
+Варианты картинок постов создаются заранее, в фоне.
+
+После сохранения поста с новой картинкой файл уходит в пул процессов:
+там картинка декодируется и сохраняется в вариантах разной ширины
+и формата (posts.images). Основной процесс записывает варианты в базу
+и обновляет версии лент, чтобы закешированные страницы перерисовались.
+Ленты находят варианты всех картинок страницы сразу (resolve_page)
+и, пока вариантов нет, показывают копию без метаданных, а картинку
+ставят в очередь: так обрабатываются и картинки, загруженные, когда
+пул был выключен. Чтение ленты пул не ждёт, а картинку, которая уже
+в очереди, не отправляет повторно. Картинка, которую не удалось
+обработать, помечается в кеше и повторно в пул не отправляется
+до истечения пометки.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import close_old_connections
+
+from core.storage import content_storage
+from posts import feed_cache, images
+
+logger = logging.getLogger(__name__)
+
+# Сколько картинка с ошибкой обработки не отправляется в пул повторно
+FAILED_TIMEOUT = 24 * 60 * 60
+# Суффикс файла картинки на время проверки перед удалением (release)
+RELEASED_SUFFIX = '.released'
+
+
+def process(name):
+    """Всё, что пул делает с новой картинкой."""
+    return images.render(name)
+
+
+def store_processed(name, variants):
+    images.store(name, variants)
+    cache.delete(failed_key(name))
+
+
+def failed_key(name):
+    return f'image-failed:{name}'
+
+
+def mark_failed(name):
+    cache.set(failed_key(name), True, FAILED_TIMEOUT)
+
+
+def has_failed(name):
+    return cache.get(failed_key(name), False)
+
+
+def release(name):
+    """
+    Удаляет картинку, на которую больше не ссылается ни один пост,
+    вместе с её вариантами. Одинаковые загрузки хранятся
+    одним файлом (core.storage), поэтому число ссылок — это число
+    постов с этим именем картинки.
+
+    Пост с такой же картинкой может быть ещё не закоммичен: файл
+    сначала переименовывается, и если его недавно (IMAGE_RELEASE_GRACE)
+    загружали снова или на него появилась ссылка, возвращается
+    на место. Такие файлы потом удаляет команда sweep_images.
+    Возвращает True, если картинка удалена.
+    """
+    # Модуль импортируется в процессах пула до django.setup()
+    from posts.models import Post
+
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    try:
+        path = content_storage.path(name)
+    except SuspiciousFileOperation:
+        logger.warning('Картинка %s вне хранилища', name)
+        return False
+    released = path + RELEASED_SUFFIX
+    try:
+        os.rename(path, released)
+    except FileNotFoundError:
+        released = None
+    if released is not None and (
+        _recently_saved(released)
+        or Post.objects.filter(image=name).exists()
+    ):
+        os.replace(released, path)
+        return False
+    _delete_variants(name)
+    if released is not None:
+        _delete_file(released)
+    return True
+
+
+def _recently_saved(path):
+    grace = settings.IMAGE_RELEASE_GRACE
+    return os.stat(path).st_mtime > time.time() - grace
+
+
+def _delete_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        logger.exception('Не удалось удалить %s', path)
+
+
+def _delete_variants(name):
+    from posts.models import ImageVariant
+
+    variants = ImageVariant.objects.filter(source=name)
+    # Варианты тоже названы по содержимому: картинки, отличающиеся
+    # только метаданными, дают одни и те же файлы вариантов
+    shared = ImageVariant.objects.exclude(source=name).filter(
+        file__in=variants.values('file')
+    ).values_list('file', flat=True)
+    files = list(variants.exclude(file__in=shared).values_list(
+        'file', flat=True
+    ))
+    variants.delete()
+    cache.delete(images.cache_key(name))
+    for file_name in files:
+        try:
+            content_storage.delete(file_name)
+        except (OSError, SuspiciousFileOperation):
+            logger.exception('Не удалось удалить %s', file_name)
+
+
+def post_scopes(post):
+    """Ленты, в которых показывается картинка поста."""
+    scopes = [
+        feed_cache.GLOBAL,
+        (feed_cache.AUTHOR, post.author_id),
+        (feed_cache.POST, post.pk),
+    ]
+    if post.group_id is not None:
+        scopes.append((feed_cache.GROUP, post.group_id))
+    return scopes
+
+
+def _setup_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+
+
+def make_executor(max_workers):
+    """Пул процессов для process."""
+    # spawn: процессы пула не наследуют соединения с базой
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_setup_worker,
+    )
+
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = make_executor(settings.THUMBNAIL_WORKERS)
+    return _executor
+
+
+def _finished(name, scopes, future):
+    close_old_connections()
+    try:
+        store_processed(name, future.result())
+        feed_cache.bump(*scopes)
+    except Exception:
+        logger.exception('Не удалось создать варианты %s', name)
+        mark_failed(name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        close_old_connections()
+
+
+def schedule(post):
+    """Ставит картинку поста в очередь пула процессов."""
+    if not post.image or not settings.THUMBNAIL_WORKERS:
+        return
+    name = post.image.name
+    if images.lookup([name]):
+        # Такую же картинку уже загружали: файл тот же, он обработан
+        return
+    if has_failed(name):
+        return
+    _submit(name, post_scopes(post))
+
+
+def _submit(name, scopes):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        future = _get_executor().submit(process, name)
+    future.add_done_callback(partial(_finished, name, scopes))
+
+
+def _schedule_missing(posts):
+    """
+    Ставит в очередь картинки постов без вариантов, кроме тех, что
+    уже в очереди или помечены как необработанные; пометки ищутся
+    одним обращением к кешу.
+    """
+    with _lock:
+        missing = {
+            post.image.name: post for post in posts
+            if post.image.name not in _pending
+        }
+    if not missing:
+        return
+    failed = cache.get_many([failed_key(name) for name in missing])
+    for name, post in missing.items():
+        if failed_key(name) not in failed:
+            _submit(name, post_scopes(post))
+
+
+def resolve(posts):
+    """
+    Картинки постов страницы за одно обращение к кешу (posts.images.
+    lookup): каждому посту с картинкой — готовый для шаблона
+    post.picture. Картинки без вариантов ставятся в очередь
+    (_schedule_missing).
+    """
+    posts = [post for post in posts if post.image]
+    found = images.lookup(post.image.name for post in posts)
+    for post in posts:
+        post.picture = images.picture(post, found.get(post.image.name))
+    if settings.THUMBNAIL_WORKERS:
+        _schedule_missing(
+            post for post in posts if post.image.name not in found
+        )
+
+
+def resolve_page(page_obj):
+    """Картинки страницы ленты ищутся вместе, когда выбраны её строки."""
+    page_obj.object_list.prepare(resolve)
@@ -0,0 +1,247 @@
+"""
+Материализованная лента подписок.
+
+При публикации пост раскладывается в ленты подписчиков автора
+(fan-out on write). Посты авторов с очень большим числом подписчиков
+не раскладываем, иначе одна публикация писала бы миллионы строк:
+такой пост помечается (Post.in_timelines = False) и подмешивается
+при чтении в ленты всех, кто подписан на автора сейчас (fan-out
+on read), даже если автор с тех пор перестал быть популярным.
+
+Страница ленты подписок кешируется по версии подписчика. Версии
+всех подписчиков автора обновляются после коммита в фоновом потоке
+(refresh_on_commit), а не в запросе, который сохранил пост.
+"""
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from posts import feed_cache
+from posts.models import AuthorStats, Follow, Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+# Поля записи ленты, совпадающие с pub_date и pk поста
+TIMELINE_KEY = ('feed_date', 'feed_id')
+
+
+def _bulk_insert(entries):
+    # Память ограничивает TIMELINE_BATCH_SIZE, а строк в одном INSERT
+    # бэкенд базы выбирает сам: в SQLite больше 500 нельзя
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not chunk:
+            return
+        TimelineEntry.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def is_popular(author_id):
+    """Посты автора не раскладываются по лентам при публикации."""
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if is_popular(post.author_id):
+        post.in_timelines = False
+        Post.objects.filter(pk=post.pk).update(in_timelines=False)
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in follower_ids.iterator()
+    )
+
+
+def backfill(user, author):
+    """
+    Переносит посты автора в ленту нового подписчика; не разложенные
+    посты подмешиваются при чтении.
+    """
+    posts = Post.objects.filter(
+        author=author, in_timelines=True
+    ).values_list('pk', 'pub_date')
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user.pk,
+            post_id=post_id,
+            author_id=author.pk,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def _popular(author_ids):
+    return set(AuthorStats.objects.filter(
+        user__in=author_ids,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user', flat=True))
+
+
+def fan_out_posts(posts):
+    """
+    fan_out_post для пачки постов, добавленных в обход сигналов.
+    `posts` — тройки (pk, author_id, pub_date). Возвращает id
+    пользователей, в ленты которых добавлены посты.
+    """
+    by_author = defaultdict(list)
+    for post_id, author_id, pub_date in posts:
+        by_author[author_id].append((post_id, pub_date))
+    direct = [
+        post_id for author_id in _popular(by_author)
+        for post_id, _ in by_author.pop(author_id)
+    ]
+    if direct:
+        Post.objects.filter(pk__in=direct).update(in_timelines=False)
+    followers = list(Follow.objects.filter(
+        author_id__in=by_author
+    ).order_by().values_list('author_id', 'user_id'))
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for author_id, user_id in followers
+        for post_id, pub_date in by_author[author_id]
+    )
+    return {user_id for _, user_id in followers}
+
+
+def backfill_follows(follows):
+    """
+    backfill для пачки подписок, добавленных в обход сигналов.
+    `follows` — пары (user_id, author_id).
+    """
+    by_author = defaultdict(list)
+    for user_id, author_id in follows:
+        by_author[author_id].append(user_id)
+    posts = Post.objects.filter(
+        author_id__in=by_author, in_timelines=True
+    ).order_by().values_list('author_id', 'pk', 'pub_date')
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for author_id, post_id, pub_date in posts.iterator()
+        for user_id in by_author[author_id]
+    )
+
+
+def prune(user, author):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def refresh(author_id):
+    """
+    Обновляет версии лент подписок всех подписчиков автора
+    (posts.feed_cache): в них разложены его посты.
+    """
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+    while True:
+        chunk = list(islice(followers, settings.TIMELINE_BATCH_SIZE))
+        if not chunk:
+            return
+        feed_cache.bump(*((feed_cache.FOLLOWER, pk) for pk in chunk))
+
+
+def _refresh_in_background(author_id):
+    close_old_connections()
+    try:
+        refresh(author_id)
+    except Exception:
+        logger.exception('Не удалось обновить ленты подписчиков %s', author_id)
+    finally:
+        close_old_connections()
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TIMELINE_REFRESH_WORKERS,
+                thread_name_prefix='timeline',
+            )
+    return _executor
+
+
+def _submit_refresh(author_id):
+    if settings.TIMELINE_REFRESH_WORKERS:
+        _get_executor().submit(_refresh_in_background, author_id)
+    else:
+        refresh(author_id)
+
+
+def refresh_on_commit(author_id):
+    """
+    refresh после коммита и в фоновом потоке: запрос автора не ждёт
+    обхода всех подписчиков.
+    """
+    transaction.on_commit(partial(_submit_refresh, author_id))
+
+
+def direct_authors(user):
+    """Авторы из подписок пользователя с неразложенными постами."""
+    followed = Follow.objects.filter(user=user).values('author')
+    return list(
+        Post.objects.filter(
+            author__in=followed, in_timelines=False
+        ).order_by().values_list('author', flat=True).distinct()
+    )
+
+
+def timeline_posts(user):
+    """
+    Ленты, из которых состоит лента подписок, — пары (queryset,
+    поля для листания), — и авторы, чьи посты подмешаны при чтении.
+
+    Обычная лента читается по индексу записей ленты пользователя.
+    Неразложенные посты каждого такого автора — отдельная лента
+    по частичному индексу; ленты сливаются постранично
+    (posts.paginator.paginate_merged), без сортировки в базе.
+    """
+    posts = Post.objects.select_related('author', 'group')
+    direct = direct_authors(user)
+    sources = [(
+        posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_id=F('timeline_entries__post'),
+        ),
+        TIMELINE_KEY,
+    )]
+    sources += [
+        (posts.filter(author=pk, in_timelines=False), None)
+        for pk in sorted(direct)
+    ]
+    return sources, direct
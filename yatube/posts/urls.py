@@ -41,6 +41,7 @@ urlpatterns = [
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
     # path('api/v1/posts/', views.api_posts, name='api_posts'),
     # path('api/v1/posts/<int:post_id>/', views.get_post, name='get_post'),
     # path(
@@ -58,5 +59,6 @@ urlpatterns = [
 
     # Все зарегистрированные в router пути доступны в router.urls
     # Включим их в головной urls.py
+    path('api/v1/search/', views.SearchAPIView.as_view(), name='api_search'),
     path('api/', include(router.urls)),
 ]
@@ -1,64 +1,91 @@
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
 from django.urls import reverse
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.utils.decorators import method_decorator
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.views import APIView
 from rest_framework import generics
 from rest_framework import viewsets 
-
-from posts.serializers import PostSerializer
-from posts.models import Post, Group, User, Follow
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.utils.urls import replace_query_param
+
+from core.decorators import query_budget
+from core.renderers import FastJSONRenderer
+from posts.serializers import (
+    CommentSerializer, PostRowSerializer, PostSerializer,
+)
+from posts.models import Post, Group, Tag, User, Follow
 from posts.forms import PostForm, CommentForm
-
-
+from posts.paginator import (
+    PostCursorPagination, paginate, paginate_merged,
+)
+from posts import counters, feed_cache, threads, thumbnails, timeline
+from posts import search as search_index
+from posts.conditional import (
+    api_post_state, conditional, group_state, index_state, post_state,
+    profile_state,
+)
+
+
+@query_budget(5)
+@conditional(index_state)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.all()
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.select_related('author', 'group')
+    paginator, page_obj = paginate(request, posts)
+    thumbnails.resolve_page(page_obj)
     context = {
         'page_obj': page_obj,
         'paginator': paginator,
+        **feed_cache.cache_context(feed_cache.GLOBAL),
     }
     return render(request, template, context)
 
 
+@query_budget(6)
+@conditional(group_state)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all().select_related('group')
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author', 'group')
+    paginator, page_obj = paginate(request, posts)
+    thumbnails.resolve_page(page_obj)
     context = {
         'group': group,
         'posts': posts,
         'page_obj': page_obj,
+        **feed_cache.cache_context((feed_cache.GROUP, group.pk)),
     }
     return render(request, template, context)
 
 
+@query_budget(7)
+@conditional(profile_state)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    followers_count = author.following.all().count()
-    following_count = author.follower.all().count()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts = author.posts.select_related('group')
+    paginator, page_obj = paginate(request, posts)
+    thumbnails.resolve_page(page_obj)
+    stats = counters.author_stats(author)
     context = {
         'page_obj': page_obj,
         'author': author,
         'posts': posts,
-        'followers_count': followers_count,
-        'following_count': following_count,
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+        **feed_cache.cache_context((feed_cache.AUTHOR, author.pk)),
     }
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -71,21 +98,48 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@query_budget(6)
+@conditional(post_state)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    author = get_object_or_404(User, username=post.author)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    author = post.author
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    cursor = request.GET.get('cursor')
+    if cursor:
+        comments = threads.page(post.pk, cursor)
+    else:
+        comments = threads.first_page(post)
     context = {
         'post': post,
         'author': author,
+        'author_stats': counters.author_stats(author),
         'form': form,
-        'comments': comments,
+        'comments': comments.items,
+        'next_comments': comments.next_cursor,
+        'older_comments': bool(cursor),
+    }
+    return render(request, template, context)
+
+
+@query_budget(6)
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = search_index.search(
+        query, request.GET.get('cursor'), settings.POSTS_PER_PAGE
+    )
+    context = {
+        'query': query,
+        'hits': hits,
+        'next_cursor': next_cursor,
     }
     return render(request, template, context)
 
 
+@query_budget(11)
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -94,7 +148,8 @@ def post_create(request):
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:profile', post.author)
     context = {
         'form': form,
@@ -103,6 +158,7 @@ def post_create(request):
     return render(request, template, context)
 
 
+@query_budget(8)
 @login_required
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
@@ -115,7 +171,8 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -125,6 +182,7 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+@query_budget(6)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -133,43 +191,57 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(6)
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    sources, direct = timeline.timeline_posts(request.user)
+    paginator, page_obj = paginate_merged(request, sources)
+    thumbnails.resolve_page(page_obj)
+    # Разложенные посты обновляют версию ленты подписчика, а посты,
+    # подмешанные при чтении, — версию своего автора
     context = {
         'page_obj': page_obj,
         'paginator': paginator,
+        **feed_cache.cache_context(
+            (feed_cache.FOLLOWER, request.user.pk),
+            *((feed_cache.AUTHOR, pk) for pk in sorted(direct)),
+        ),
     }
     return render(request, template, context)
 
 
+@query_budget(9)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     current_user = request.user
 
     if current_user != author:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author
-        )
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(
+                user=request.user,
+                author=author
+            )
+            if created:
+                timeline.backfill(request.user, author)
     return redirect(reverse('posts:profile', kwargs={'username': username}))
 
 
+@query_budget(8)
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     currently_follow = Follow.objects.filter(user=request.user, author=author)
-    if currently_follow.exists():
-        currently_follow.delete()
+    with transaction.atomic():
+        deleted, _ = currently_follow.delete()
+        if deleted:
+            timeline.prune(request.user, author)
     return redirect(reverse('posts:profile', kwargs={'username': username}))
 
 # def get_post(request, post_id):
@@ -272,3 +344,115 @@ class APIPostDetail(generics.RetrieveUpdateDestroyAPIView):
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
+    pagination_class = PostCursorPagination
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    query_budget = 5
+
+    def requested_fields(self):
+        """Поля из ?fields= для чтения; None — все поля."""
+        value = self.request.query_params.get('fields')
+        if self.request.method != 'GET' or not value:
+            return None
+        fields = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = fields - set(PostSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError(
+                {'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'}
+            )
+        return fields
+
+    def get_queryset(self):
+        fields = self.requested_fields()
+        queryset = super().get_queryset()
+        # Связанные данные выбираются, только если их поля запрошены
+        if fields is None or 'group' in fields:
+            queryset = queryset.select_related('group')
+        if fields is None or 'tag' in fields:
+            # Тот же порядок тегов, что у PostRowSerializer
+            queryset = queryset.prefetch_related(
+                Prefetch('tag', queryset=Tag.objects.order_by('pk'))
+            )
+        return queryset
+
+    # Чтение идёт мимо PostSerializer, см. PostRowSerializer
+    @method_decorator(conditional(index_state, per_user=False))
+    def list(self, request, *args, **kwargs):
+        serializer = PostRowSerializer(request, self.requested_fields())
+        rows = self.paginate_queryset(
+            serializer.rows(self.filter_queryset(self.get_queryset()))
+        )
+        return self.get_paginated_response(serializer.to_representation(rows))
+
+    @method_decorator(
+        conditional(api_post_state, per_user=False)
+    )
+    def retrieve(self, request, *args, **kwargs):
+        serializer = PostRowSerializer(request, self.requested_fields())
+        row = get_object_or_404(
+            serializer.rows(self.get_queryset()),
+            pk=self.kwargs[self.lookup_url_kwarg or self.lookup_field],
+        )
+        return Response(serializer.to_representation([row])[0])
+
+    @action(detail=True)
+    def comments(self, request, pk=None):
+        """Комментарии поста от новых к старым, `?cursor=` из next."""
+        post_id = get_object_or_404(
+            Post.objects.values_list('pk', flat=True), pk=pk
+        )
+        pagination = PostCursorPagination()
+        rows, has_next = threads.comments(
+            post_id,
+            request.query_params.get(pagination.cursor_query_param),
+            pagination.get_page_size(request),
+        )
+        cursor = threads.next_cursor(rows, has_next)
+        next_link = None
+        if cursor is not None:
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                pagination.cursor_query_param,
+                cursor,
+            )
+        return Response({
+            'next': next_link,
+            'results': CommentSerializer(rows, many=True).data,
+        })
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    # Запись и счётчики из сигналов фиксируются одной транзакцией
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+
+
+class SearchAPIView(APIView):
+    """Поиск для API: `?q=`, `?cursor=` и `?page_size=` как у постов."""
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    query_budget = 6
+
+    def get(self, request):
+        hits, next_cursor = search_index.search(
+            request.query_params.get('q', ''),
+            request.query_params.get('cursor'),
+            PostCursorPagination().get_page_size(request),
+        )
+        for hit in hits:
+            hit['url'] = request.build_absolute_uri(hit['url'])
+        next_link = None
+        if next_cursor is not None:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), 'cursor', next_cursor
+            )
+        return Response({'next': next_link, 'results': hits})
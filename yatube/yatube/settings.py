@@ -68,7 +68,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.db.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -83,7 +86,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Бэкенд Django с замером времени отрисовки (core.metrics)
+        'BACKEND': 'core.metrics.DjangoTemplates',
         # Добавлено: Искать шаблоны на уровне проекта
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
@@ -101,6 +105,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Потоки для запросов под ASGI-сервером, см. yatube/asgi.py
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -124,6 +131,64 @@ else:
         }
     }
 
+# Реплики для чтения лент (core.db.routers): через запятую хосты
+# PostgreSQL или, для SQLite, пути к файлам баз
+DB_REPLICA_LOCATIONS = [
+    location for location in os.getenv('DB_REPLICAS', '').split(',')
+    if location
+]
+for number, location in enumerate(DB_REPLICA_LOCATIONS, 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME' if 'sqlite3' in DATABASES['default']['ENGINE'] else 'HOST':
+            location,
+        # В тестах реплики — та же тестовая база
+        'TEST': {'MIRROR': 'default'},
+    }
+DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# Адреса, которые GET- и HEAD-запросами читают с реплики
+DB_REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+    'posts:post-list',
+    'posts:post-detail',
+]
+# После записи браузер читает из основной базы столько секунд
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+DB_REPLICA_PIN_COOKIE = 'db_primary'
+# Реплика с большим отставанием (в секундах) не используется
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+DB_REPLICA_LAG_CHECK_INTERVAL = 5
+# Страницы лент, прочитанные с реплики, кешируются не дольше
+DB_REPLICA_CACHE_TIMEOUT = 60
+
+# Соединение с базой живёт DB_CONN_MAX_AGE секунд и перед запросом
+# проверяется не чаще раза в DB_HEALTH_CHECK_INTERVAL секунд
+# (core.db.health). DB_POOL_SIZE > 0 включает общий для потоков процесса
+# пул из стольких соединений (core.db.pool); поток ждёт свободное
+# соединение не дольше DB_POOL_TIMEOUT секунд
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', 30))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'core.db.backends.postgresql',
+    'django.db.backends.sqlite3': 'core.db.backends.sqlite3',
+}
+for database in DATABASES.values():
+    if DB_POOL_SIZE:
+        database['ENGINE'] = POOLED_ENGINES.get(
+            database['ENGINE'], database['ENGINE']
+        )
+        # Соединение возвращается в пул в конце каждого запроса
+        database['CONN_MAX_AGE'] = 0
+    else:
+        database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -170,6 +235,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static_root/')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кто отдаёт медиафайлы по адресам MEDIA_URL (core.media): '' — само
+# приложение, с Range и условными запросами; 'x-accel' — nginx
+# по X-Accel-Redirect из internal-location MEDIA_ACCEL_PREFIX;
+# 'x-sendfile' — Apache или lighttpd по X-Sendfile
+MEDIA_SERVE = os.getenv('MEDIA_SERVE', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -180,18 +252,83 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
+# Комментариев на странице поста (posts.threads)
+COMMENTS_PER_PAGE = 20
+# Размер страницы API: по умолчанию и наибольший для ?page_size=
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 1000
+# Сколько постов считать для приблизительного итога в пагинаторе
+POSTS_COUNT_LIMIT = 1000
+# Посты авторов с большим числом подписчиков подмешиваются в ленту
+# подписок при чтении, а не раскладываются по лентам при публикации
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BATCH_SIZE = 1000
+# Потоков для обновления версий лент подписчиков после публикации;
+# 0 — сразу после коммита в том же потоке
+TIMELINE_REFRESH_WORKERS = 2
+# Поисковый индекс (posts.search): путь к классу или None — по базе;
+# словарь PostgreSQL для tsvector
+SEARCH_INDEX = None
+SEARCH_CONFIG = 'russian'
+# Сколько имён тегов держать в памяти процесса (posts.tags)
+TAG_CACHE_SIZE = 10000
+
+# Превышение бюджета запросов view (core.decorators.query_budget):
+# True — ошибка, False — предупреждение в лог
+QUERY_BUDGET_STRICT = False
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Процессы для фонового создания вариантов картинок (posts.thumbnails);
+# 0 — не создавать при сохранении поста
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Варианты картинок постов (posts.images): картинка поворачивается
+# по EXIF, теряет метаданные, уменьшается до IMAGE_MAX_SIZE по большей
+# стороне и сохраняется во всех ширинах и форматах. Форматы — в порядке
+# предпочтения; те, что не поддерживает Pillow, пропускаются
+IMAGE_MAX_SIZE = 2560
+IMAGE_VARIANT_WIDTHS = (480, 960, 1600)
+IMAGE_VARIANT_FORMATS = ('avif', 'webp', 'jpeg')
+IMAGE_QUALITY = 80
+# Картинку, которую загружали снова не раньше этого числа секунд назад,
+# не удалять при удалении поста: загрузка могла ещё не закоммититься
+# (posts.thumbnails.release); её удалит команда sweep_images
+IMAGE_RELEASE_GRACE = 10 * 60
+
+# Страницы лент кешируются до изменения их версии (posts.feed_cache)
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Общий кеш для нескольких воркеров: host:port сервера Redis
+if os.getenv('CACHE_LOCATION'):
+    CACHES['default'] = {
+        'BACKEND': 'core.cache.backends.TwoTierCache',
+        'LOCATION': os.getenv('CACHE_LOCATION'),
+        'OPTIONS': {
+            'DB': int(os.getenv('CACHE_DB', 0)),
+            'PASSWORD': os.getenv('CACHE_PASSWORD'),
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+        },
+    }
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+# Доступ к /metrics/ без входа staff-пользователя: адреса через
+# запятую и токен для заголовка Authorization: Bearer. За прокси
+# REMOTE_ADDR — адрес прокси, поэтому по умолчанию закрыто
+METRICS_ALLOWED_IPS = [
+    address for address in os.getenv('METRICS_ALLOWED_IPS', '').split(',')
+    if address
+]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
 
 if USE_SENTRY:
     sentry_sdk.init(
@@ -17,7 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import media, metrics
 # from rest_framework.routers import DefaultRouter
 # from posts import views
 
@@ -36,11 +37,19 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('metrics/', metrics, name='metrics'),
 ]
 
+# Медиафайлы отдаёт приложение, если MEDIA_URL — его же адрес
+# (а не CDN); при MEDIA_SERVE файл передаётся веб-серверу
+if settings.MEDIA_URL.startswith('/'):
+    urlpatterns += (
+        path(
+            f'{settings.MEDIA_URL.strip("/")}/<path:path>', media,
+            name='media',
+        ),
+    )
+
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )